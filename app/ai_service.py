@@ -1,11 +1,16 @@
 import asyncio
 import logging
 import json
-from typing import Optional, Dict, Any
+import time
+from typing import Dict, Any
 from enum import Enum
 from pydantic import BaseModel, Field
-from openai import AsyncOpenAI
-from app.config import settings
+from app.eval_cache import eval_cache, cache_key
+from app.prompts import prompt_registry
+from app.metrics import llm_request_seconds, llm_tokens_total, llm_errors_total, llm_json_errors_total
+from app.llm_router import llm_router
+from app.resilience import CircuitOpenError, loaded_openai
+from app.streaming import FeedbackStreamParser
 
 logger = logging.getLogger(__name__)
 
@@ -25,15 +30,15 @@ class EvaluationResponse(BaseModel):
     ideal_translation: str  # Здесь мы вернем Reference или исправленный вариант
     error_type: ErrorType
 
-_client: Optional[AsyncOpenAI] = None
-
-def _get_client():
-    global _client
-    if _client: return _client
-    # Убедитесь, что ключи в .env верные для Gemini или Llama (Groq)
-    if settings.LLAMA_API_KEY:
-        _client = AsyncOpenAI(api_key=settings.LLAMA_API_KEY, base_url=settings.LLAMA_BASE_URL)
-    return _client
+def _failed_result(reference_translation: str, explanation: str = "System error during check.") -> Dict[str, Any]:
+    # Фолбэк на случай ошибки ИИ: помечаем как failed, чтобы не сохранять как оценку
+    return {
+        "score": 0,
+        "explanation": explanation,
+        "ideal_translation": reference_translation,
+        "error_type": "Critical",
+        "failed": True
+    }
 
 def clean_json(text: str) -> str:
     text = text.strip()
@@ -55,84 +60,37 @@ async def evaluate_translation(
     if not original.strip() or not user_translation.strip():
         return {"score": 0, "explanation": "Empty input", "error_type": "Critical"}
 
-    client = _get_client()
-    if not client: 
-        return {"score": 0, "explanation": "AI Config Error", "error_type": "Critical"}
+    # Одинаковые ответы берем из кэша или ждем уже идущую проверку
+    key = cache_key(reference_translation, user_translation, direction, interface_lang)
+    return await eval_cache.get_or_compute(key, lambda: _evaluate_translation(
+        original, reference_translation, user_translation, direction, interface_lang
+    ))
 
-    # Определение языков
-    lang_map = {"en": "English", "uz": "Uzbek", "ru": "Russian"}
-    try:
-        parts = direction.lower().split('-') # пример: ru-en
-        src_lang = lang_map.get(parts[0], "Russian")
-        tgt_lang = lang_map.get(parts[1], "English")
-    except: 
-        src_lang, tgt_lang = "Russian", "English"
-
-    # Настройка языка объяснения (Feedback Language)
-# Настройка языка объяснения (Feedback Language)
-    explain_instr = f"in {lang_map.get(interface_lang, 'English')}"
-    if "uz" in interface_lang.lower():
-        # Было: "Xato: ..."
-        # Стало: "Izoh: ..." (чтобы не пугать слово "Ошибка" при синонимах)
-        explain_instr = """
-        in UZBEK (Latin script).
-        Format: 
-        - If score is 100: "Barakalla! Tarjima aniq."
-        - If score is 90-99 (Synonym): "To'g'ri: [Reference]. Izoh: Sizning varianingiz ham to'g'ri (sinonim)."
-        - If score < 90: "To'g'ri: [Reference]. Xato: [Explain error]."
-        """
-
-    # Новый System Prompt для СРАВНЕНИЯ
-    system_prompt = f"""
-    You are a strict Language Examiner. 
-    Source Language: {src_lang}
-    Target Language: {tgt_lang}
-    
-    SPECIAL RULE FOR UZBEK SOURCE:
-    - The Uzbek word "U" implies both "He" and "She". 
-    - If Source is Uzbek and Reference uses "He", but Student uses "She" (or vice versa), ACCEPT IT as correct. Do not deduct points for gender mismatch unless context clearly defines it.
-    
-    TASK:
-    Compare the Student's translation against the OFFICIAL REFERENCE.
-
-    SCORING RULES:
-    1. EXACT MATCH: If Student == Reference (ignoring case/punctuation) -> Score 100.
-    2. SYNONYMS: If Student uses valid synonyms (e.g., 'car' vs 'automobile') AND grammar is perfect -> Score 95-100. Mention that the Reference uses a different word but Student is correct.
-    3. GRAMMAR ERROR: If meaning is close but grammar is wrong -> Score 60-80.
-    4. WRONG MEANING: If Student says something totally different from Reference -> Score 0-40.
-
-    OUTPUT INSTRUCTIONS:
-    - Provide feedback {explain_instr}.
-    - 'ideal_translation' field must contain the OFFICIAL REFERENCE provided below.
-    - 'deductions' field: Short summary of errors.
-
-    OUTPUT JSON FORMAT:
-    {{
-        "score": integer (0-100),
-        "deductions": "string",
-        "explanation": "string",
-        "ideal_translation": "string",
-        "error_type": "None | Grammar | Vocabulary | Spelling | Critical"
-    }}
-    """
 
-    # Данные для ИИ
-    user_prompt = f"""
-    Original Phrase ({src_lang}): "{original}"
-    OFFICIAL REFERENCE ({tgt_lang}): "{reference_translation}"
-    Student Translation: "{user_translation}"
-    """
-    
+async def _evaluate_translation(
+    original: str,
+    reference_translation: str,
+    user_translation: str,
+    direction: str,
+    interface_lang: str
+) -> Dict[str, Any]:
+    # Ключи провайдеров (Llama / Gemini) задаются в .env, см. app/llm_router.py
+    if not llm_router.providers:
+        return _failed_result(reference_translation, "AI Config Error")
+
+    messages = prompt_registry.messages(original, reference_translation, user_translation, direction, interface_lang)
+
+    started = time.perf_counter()
+    outcome = "ok"
     try:
-        response = await client.chat.completions.create(
-            model="llama-3.3-70b-versatile", # Или gemini-2.0-flash
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+        # Провайдер и модель выбирает роутер: самый быстрый здоровый, с дублем и fallback
+        response = await llm_router.call(lambda client, model: client.chat.completions.create(
+            model=model,
+            messages=messages,
             temperature=0.1, # Ставим низкую температуру для строгости
             response_format={"type": "json_object"} # Force JSON
-        )
+        ))
+        _record_usage(response.usage)
         
         content = response.choices[0].message.content
         result = json.loads(clean_json(content))
@@ -145,12 +103,116 @@ async def evaluate_translation(
 
         return result
 
+    except CircuitOpenError:
+        outcome = "circuit_open"
+        logger.warning("AI Evaluation skipped: provider circuit is open")
+        return _failed_result(reference_translation)
     except Exception as e:
+        outcome = _error_kind(e)
         logger.error(f"AI Evaluation Error: {e}")
-        # Фолбэк на случай ошибки ИИ
-        return {
-            "score": 0, 
-            "explanation": "System error during check.", 
-            "ideal_translation": reference_translation,
-            "error_type": "Critical"
-        }
+        return _failed_result(reference_translation)
+    finally:
+        _record_outcome("complete", outcome, started)
+
+
+def _error_kind(error: Exception) -> str:
+    """Вид ошибки ИИ для метрик"""
+    openai = loaded_openai()
+    if isinstance(error, asyncio.TimeoutError) or (openai and isinstance(error, openai.APITimeoutError)):
+        return "timeout"
+    if openai and isinstance(error, openai.APIStatusError):
+        return "rate_limited" if error.status_code == 429 else "api_error"
+    if openai and isinstance(error, openai.APIConnectionError):
+        return "connection"
+    if isinstance(error, ValueError):  # JSONDecodeError и ошибки валидации pydantic
+        return "bad_json"
+    return "other"
+
+
+def _record_outcome(mode: str, outcome: str, started: float):
+    llm_request_seconds.observe(time.perf_counter() - started, mode, outcome)
+    if outcome == "bad_json":
+        llm_json_errors_total.inc()
+    if outcome != "ok":
+        llm_errors_total.inc(outcome)
+
+
+def _record_usage(usage):
+    if usage is None:
+        return
+    llm_tokens_total.inc("prompt", amount=usage.prompt_tokens or 0)
+    llm_tokens_total.inc("completion", amount=usage.completion_tokens or 0)
+    # Часть промпта, взятая из кэша провайдера (prefix caching), если он ее сообщает
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached:
+        llm_tokens_total.inc("cached_prompt", amount=cached)
+
+
+# --- STREAMING ---
+async def stream_evaluation(
+    original: str,
+    reference_translation: str,
+    user_translation: str,
+    direction: str,
+    interface_lang: str
+):
+    """
+    Потоковая проверка для страницы тренировки. Отдает события:
+    ("score", int) — как только оценка разобрана; ("delta", str) — куски explanation;
+    ("result", dict) — итог, проверенный по EvaluationResponse (или с "failed": True).
+    """
+    if not original.strip() or not user_translation.strip():
+        yield ("result", {"score": 0, "explanation": "Empty input", "error_type": "Critical"})
+        return
+
+    key = cache_key(reference_translation, user_translation, direction, interface_lang)
+    cached = eval_cache.lookup(key)
+    if cached is not None:
+        yield ("score", cached["score"])
+        yield ("delta", cached["explanation"])
+        yield ("result", cached)
+        return
+
+    if not llm_router.providers:
+        yield ("result", _failed_result(reference_translation, "AI Config Error"))
+        return
+
+    messages = prompt_registry.messages(original, reference_translation, user_translation, direction, interface_lang)
+    parser = FeedbackStreamParser()
+    # response_format не передаем: JSON-режим с потоком поддерживают не все провайдеры,
+    # формат ответа задает промпт, а итог все равно проверяется целиком
+    chunks = llm_router.stream(lambda client, model: client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=0.1,
+        stream=True
+    ))
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        async for chunk in chunks:
+            # Некоторые провайдеры присылают usage в последнем фрагменте
+            _record_usage(getattr(chunk, "usage", None))
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                for event in parser.feed(delta):
+                    yield event
+
+        result = EvaluationResponse.model_validate(json.loads(clean_json(parser.text))).model_dump(mode="json")
+        if result["score"] < 100:
+            result["ideal_translation"] = reference_translation
+    except CircuitOpenError:
+        outcome = "circuit_open"
+        logger.warning("AI Evaluation skipped: provider circuit is open")
+        result = _failed_result(reference_translation)
+    except Exception as e:
+        outcome = _error_kind(e)
+        logger.error(f"AI Evaluation Stream Error: {e}")
+        result = _failed_result(reference_translation)
+    finally:
+        await chunks.aclose()
+    _record_outcome("stream", outcome, started)
+
+    eval_cache.store(key, result)
+    yield ("result", result)
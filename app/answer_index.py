@@ -0,0 +1,98 @@
+"""
+Индекс принятых ответов: для каждой пары (фраза, направление) храним
+нормализованные варианты перевода, которые уже точно засчитаны на 100 баллов.
+
+Индекс заполняется эталоном из таблицы phrases и прошлыми попытками
+с оценкой 100, и пополняется новыми такими ответами. Совпавший ответ
+оценивается локально, без запроса к ИИ. Одновременные загрузки одной
+записи объединяются: в БД идет один запрос (индекс из migrations/006).
+"""
+import logging
+import re
+from collections import OrderedDict
+
+from app import repository as repo
+from app.ai_service import EvaluationResponse, ErrorType
+from app.config import settings
+from app.single_flight import SingleFlight
+from app.translations import UI_TEXTS
+
+logger = logging.getLogger(__name__)
+
+# Апострофы убираем без пробела: в узбекской латинице O'zbek = Oʻzbek = Ozbek
+_APOSTROPHES_RE = re.compile(r"['`\u2018\u2019\u02bb\u02bc]")
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_answer(text: str) -> str:
+    """Приводит ответ к виду для точного сравнения: без регистра, пунктуации и лишних пробелов"""
+    text = _APOSTROPHES_RE.sub("", (text or "").casefold())
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+class AcceptedAnswerIndex:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # (phrase_id, direction) -> (эталон, множество нормализованных ответов); LRU
+        self._entries = OrderedDict()
+        self._loading = SingleFlight()  # (phrase_id, direction, эталон) -> загрузка записи
+
+    async def _entry(self, phrase_id: int, direction: str, reference: str):
+        key = (phrase_id, direction)
+        entry = self._entries.get(key)
+        # Если эталон фразы изменили в админке — собираем запись заново
+        if entry and entry[0] == reference:
+            self._entries.move_to_end(key)
+            return entry[1]
+        answers, _ = await self._loading.run((phrase_id, direction, reference),
+                                             lambda: self._load(phrase_id, direction, reference))
+        return answers
+
+    async def _load(self, phrase_id: int, direction: str, reference: str):
+        key = (phrase_id, direction)
+        answers = {normalize_answer(reference)}
+        try:
+            for answer in await repo.list_perfect_answers(phrase_id, direction):
+                answers.add(normalize_answer(answer))
+        except Exception as e:
+            logger.warning(f"Answer index load failed for phrase {phrase_id} {direction}: {e}")
+        answers.discard("")
+
+        self._entries[key] = (reference, answers)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return answers
+
+    async def is_accepted(self, phrase_id: int, direction: str, reference: str, answer: str) -> bool:
+        norm = normalize_answer(answer)
+        if not norm:
+            return False
+        return norm in await self._entry(phrase_id, direction, reference)
+
+    async def accepted_answers(self, phrase_id: int, direction: str, reference: str):
+        """Нормализованные принятые варианты фразы (только для чтения)"""
+        return await self._entry(phrase_id, direction, reference)
+
+    def add(self, phrase_id: int, direction: str, answer: str):
+        """Добавляет ответ, который ИИ оценил на 100 (если запись уже в индексе)"""
+        entry = self._entries.get((phrase_id, direction))
+        norm = normalize_answer(answer)
+        if entry and norm:
+            entry[1].add(norm)
+
+
+def accepted_result(reference: str, interface_lang: str) -> dict:
+    """Результат проверки для ответа из индекса — в том же формате, что отдает ИИ"""
+    ui = UI_TEXTS.get(interface_lang, UI_TEXTS["ru"])
+    return EvaluationResponse(
+        score=100,
+        deductions="",
+        explanation=ui["exact_match"],
+        ideal_translation=reference,
+        error_type=ErrorType.NONE,
+    ).model_dump(mode="json")
+
+
+answer_index = AcceptedAnswerIndex(max_entries=settings.ANSWER_INDEX_MAX_ENTRIES)
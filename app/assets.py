@@ -0,0 +1,92 @@
+"""
+Статика, собранная assets/build.py: CSS и шрифты со своего домена.
+
+static/dist/manifest.json связывает логические имена (app.css) с файлами,
+в имени которых хэш содержимого (app.3f2a9c1b04.css). Такой файл никогда
+не меняется — новая сборка дает новое имя, — поэтому браузер и CDN кэшируют
+его навсегда и не перепроверяют. Рядом лежат готовые .br/.gz: их отдаем,
+если браузер их принимает, не сжимая на каждый запрос.
+
+Без сборки (локальная разработка) манифеста нет, и base.html подключает
+Tailwind и шрифты с CDN, как раньше.
+"""
+import json
+import logging
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Нехэшированные файлы (если появятся) могут поменяться при деплое
+DEFAULT_CACHE = "public, max-age=3600"
+# Предпочтительные первыми
+_PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(headers: Headers) -> set:
+    """Кодировки из Accept-Encoding, кроме запрещенных через q=0"""
+    accepted = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        name, _, params = item.partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            pass
+        if name.strip():
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class AssetManifest:
+    def __init__(self, path: str):
+        self.files = {}
+        try:
+            with open(path) as f:
+                self.files = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"{path} not found: pages use the Tailwind and Google Fonts CDN (run assets/build.py)")
+
+    @property
+    def built(self) -> bool:
+        return bool(self.files)
+
+    def url(self, name: str) -> str:
+        """URL хэшированного файла по логическому имени (app.css)"""
+        return f"/{STATIC_DIR}/dist/{self.files[name]}"
+
+
+class StaticAssets(StaticFiles):
+    """StaticFiles с заголовками кэширования и готовыми сжатыми копиями файлов"""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code not in (200, 304):
+            return response
+        # path уже в виде пути файловой системы; manifest.json меняется с каждой сборкой
+        hashed = path.startswith("dist" + os.sep) and os.path.basename(path) != "manifest.json"
+
+        if response.status_code == 200 and isinstance(response, FileResponse):
+            variants = [(encoding, response.path + ext) for encoding, ext in _PRECOMPRESSED
+                        if os.path.isfile(response.path + ext)]
+            if variants:
+                accepted = accepted_encodings(Headers(scope=scope))
+                for encoding, compressed in variants:
+                    if encoding in accepted:
+                        response = FileResponse(compressed, media_type=response.media_type,
+                                                headers={"Content-Encoding": encoding})
+                        break
+                response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE if hashed else DEFAULT_CACHE
+        return response
+
+
+asset_manifest = AssetManifest(os.path.join(DIST_DIR, "manifest.json"))
@@ -0,0 +1,469 @@
+"""
+Отложенная запись попыток (write-behind) в user_attempts.
+
+Попытки копятся в памяти и уходят в БД пачками: когда набралось
+batch_size строк или прошло flush_interval секунд. Неудачная запись
+повторяется с экспоненциальной задержкой; если БД так и не ответила,
+пачка дописывается в локальный JSONL-файл и отправляется позже
+(в том числе после перезапуска). При остановке приложения очередь
+сбрасывается в БД или в файл. Файловые операции (с fsync) идут в отдельном
+потоке по очереди, не задерживая event loop.
+
+Строки, которые БД не примет никогда (нарушение ограничений — например,
+фразу удалили из админки, — или неверные данные), не повторяются: пачка
+делится пополам, пока такие строки не останутся поодиночке, и они уходят
+в файл отказов (ATTEMPT_DEAD_LETTER_PATH), а остальные записываются.
+
+Под gunicorn у каждого воркера свой файл: в пути есть {pid}
+(data/attempts_spill.{pid}.jsonl). Пока воркер жив, его файл заперт
+flock; файлы завершившихся воркеров забирает себе любой живой воркер.
+
+Пока попытка не записана, ее видно через pending_for(user_id) —
+сводка прогресса и очередь темы учитывают такие попытки. Другим воркерам
+свою очередь не видно: число незаписанных попыток пользователя лежит
+в общем файле, у каждого воркера свой участок (unsaved_channel), и воркер,
+который собирает очередь тренировки заново, сначала ждет их записи
+в других живых воркерах (wait_saved_elsewhere).
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from itertools import chain
+
+from app import repository as repo
+from app.config import settings
+from app.shared_state import unsaved_channel
+
+try:
+    import fcntl
+except ImportError:  # Windows: там только режим одного процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Классы SQLSTATE, с которыми строка не запишется никогда: неверные данные (22)
+# и нарушение ограничений (23, в том числе FK). Остальное — сеть, 5xx,
+# блокировки, отсутствие колонки до миграции — временное, повторяем
+_PERMANENT_SQLSTATE_CLASSES = ("22", "23")
+
+
+def _is_permanent(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and code[:2] in _PERMANENT_SQLSTATE_CLASSES
+
+
+class AttemptWriter:
+    def __init__(
+        self, batch_size: int, flush_interval: float, max_retries: int,
+        retry_base_delay: float, spill_path: str, spill_retry_interval: float, max_pending: int,
+        dead_letter_path: str
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.spill_path = spill_path.replace("{pid}", str(os.getpid()))
+        # Шаблон файлов всех воркеров (None — файл один на приложение)
+        self._spill_pattern = spill_path.replace("{pid}", "*") if "{pid}" in spill_path else None
+        self.spill_retry_interval = spill_retry_interval
+        self.max_pending = max_pending
+        self.dead_letter_path = dead_letter_path.replace("{pid}", str(os.getpid()))
+
+        self._pending = []   # ждут записи, в порядке поступления
+        self._inflight = []  # пачка, которая пишется прямо сейчас
+        self._spilled = []   # сохранены в файл после неудачных повторов
+        # id() строк, учтенных в unsaved_channel этим процессом (строки из файла после
+        # перезапуска в счетчике не учтены и при записи его не уменьшают)
+        self._counted = set()
+        self._spill_retry_at = 0.0
+        self._adopt_at = 0.0
+        self._spill_lock = None  # открытый файл блокировки своего файла
+        self._listeners = []  # вызываются с множеством user_id после успешной записи
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Один поток — файловые операции выполняются в том порядке, в каком поставлены
+        self._file_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="attempt-spill")
+
+        # Растет после каждой успешной записи — по нему читатели понимают,
+        # что часть попыток переехала из памяти в БД
+        self.generation = 0
+        self.written = 0
+        self.failed_writes = 0
+        self.dead_lettered = 0
+
+    # --- ЖИЗНЕННЫЙ ЦИКЛ ---
+
+    def start(self):
+        self._lock_spill()
+        self._load_spill()
+        # До приема запросов, поэтому прямо здесь, а не в потоке
+        self._adopt_at = time.monotonic() + self.spill_retry_interval
+        self._adopted(self._collect_orphans())
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def drain(self):
+        """Останавливает фоновую запись и сбрасывает все, что осталось (в БД или в файл)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(retry_spilled=True)
+        # Оставшееся лежит в файле: ждать его записи другим воркерам бесполезно
+        self._uncount(list(self._unsaved()))
+        if self._pending or self._spilled:
+            logger.warning(f"Attempt writer stopped with {len(self._pending) + len(self._spilled)} rows in {self.spill_path}")
+        elif self._spill_lock is not None:
+            # Файл пуст — блокировка больше не нужна
+            self._remove_file(self.spill_path + ".lock")
+            self._spill_lock.close()
+            self._spill_lock = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Attempt flush error: {e}")
+
+    # --- ЗАПИСЬ ---
+
+    def submit(self, row: dict):
+        """Ставит попытку в очередь; время попытки фиксируется сейчас, а не при записи"""
+        row = dict(row)
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        self._pending.append(row)
+        self._counted.add(id(row))
+        unsaved_channel.add(row["user_id"], 1)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        # БД долго недоступна — не копим бесконечно в памяти, старые строки в файл
+        if len(self._pending) > self.max_pending:
+            overflow = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            # Запись в файл — в фоне; порядок с остальными файловыми операциями сохраняется
+            self._spill(overflow)
+
+    def on_written(self, callback):
+        """callback(user_ids) вызывается после каждой успешной записи пачки"""
+        self._listeners.append(callback)
+
+    async def flush(self, retry_spilled: bool = False):
+        """Записывает очередь пачками; пачку, которую не удалось записать, сохраняет в файл"""
+        async with self._lock:
+            if time.monotonic() >= self._adopt_at:
+                self._adopt_at = time.monotonic() + self.spill_retry_interval
+                self._adopted(await self._file_job(self._collect_orphans))
+            if self._spilled and (retry_spilled or time.monotonic() >= self._spill_retry_at):
+                await self._flush_spilled()
+
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                self._inflight = batch
+                try:
+                    unsaved = await self._write(batch)
+                finally:
+                    self._inflight = []
+                if unsaved:
+                    await self._spill(unsaved)
+                    break
+
+    async def _flush_spilled(self):
+        while self._spilled:
+            batch = self._spilled[:self.batch_size]
+            unsaved = await self._write(batch, retries=0)
+            if len(unsaved) < len(batch):
+                self._spilled[:len(batch)] = unsaved
+                await self._rewrite_spill()
+            if unsaved:
+                self._spill_retry_at = time.monotonic() + self.spill_retry_interval
+                break
+
+    async def _write(self, rows, retries: int = None) -> list:
+        """
+        Записывает пачку. Возвращает строки, которые не записаны из-за недоступности
+        БД (пусто — все записано или отвергнутые строки ушли в файл отказов).
+        """
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                await repo.insert_attempts(rows)
+            except Exception as e:
+                self.failed_writes += 1
+                if _is_permanent(e):
+                    return await self._isolate_rejected(rows, e, retries)
+                if attempt >= retries:
+                    logger.error(f"Attempt batch of {len(rows)} failed: {e}")
+                    return rows
+                delay = random.uniform(0, self.retry_base_delay * 2 ** attempt)
+                logger.warning(f"Attempt batch write failed ({e!r}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.written += len(rows)
+            self.generation += 1
+            self._uncount(rows)
+            user_ids = {r["user_id"] for r in rows}
+            for callback in self._listeners:
+                callback(user_ids)
+            return []
+        return rows
+
+    async def _isolate_rejected(self, rows, error: Exception, retries: int) -> list:
+        """Делит пачку пополам, пока отвергнутые строки не останутся поодиночке"""
+        if len(rows) == 1:
+            logger.error(f"Attempt rejected by the database, moved to {self.dead_letter_path}: {error}")
+            self.dead_lettered += 1
+            self._uncount(rows)
+            await self._file_job(self._append_dead_letter, rows[0], str(error))
+            return []
+        middle = len(rows) // 2
+        return await self._write(rows[:middle], retries) + await self._write(rows[middle:], retries)
+
+    def _uncount(self, rows):
+        """Строки больше не ждут записи: уменьшает общий счетчик на учтенные этим процессом"""
+        by_user = {}
+        for row in rows:
+            if id(row) in self._counted:
+                self._counted.discard(id(row))
+                by_user[row["user_id"]] = by_user.get(row["user_id"], 0) + 1
+        for user_id, count in by_user.items():
+            unsaved_channel.add(user_id, -count)
+
+    # --- ФАЙЛ ДЛЯ НЕЗАПИСАННЫХ ПОПЫТОК ---
+
+    def _file_job(self, fn, *args):
+        """Выполняет fn в потоке файловых операций; результат можно не ждать"""
+        return asyncio.get_running_loop().run_in_executor(self._file_executor, partial(fn, *args))
+
+    def _spill(self, rows):
+        """Строки сразу видны в очереди файла, а на диск попадают в потоке файловых операций"""
+        self._spilled.extend(rows)
+        self._spill_retry_at = time.monotonic() + self.spill_retry_interval
+        return self._file_job(self._append_spill_file, list(rows))
+
+    def _append_spill_file(self, rows):
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Could not spill {len(rows)} attempts to {self.spill_path}: {e}")
+
+    def _rewrite_spill(self):
+        """Оставляет в файле только то, что еще не записано в БД"""
+        return self._file_job(self._write_spill_file, list(self._spilled))
+
+    def _write_spill_file(self, rows):
+        tmp_path = self.spill_path + ".tmp"
+        try:
+            if not rows:
+                if os.path.exists(self.spill_path):
+                    os.remove(self.spill_path)
+                return
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.spill_path)
+        except OSError as e:
+            logger.error(f"Could not rewrite {self.spill_path}: {e}")
+
+    def _append_dead_letter(self, row: dict, error: str):
+        record = {"row": row, "error": error, "at": datetime.now(timezone.utc).isoformat()}
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Could not write rejected attempt to {self.dead_letter_path}: {e}")
+
+    @staticmethod
+    def _read_spill(path: str):
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # Оборванная последняя строка (процесс упал во время записи)
+                    logger.warning(f"Skipping broken line in {path}")
+        return rows
+
+    def _load_spill(self):
+        if not os.path.exists(self.spill_path):
+            return
+        rows = self._read_spill(self.spill_path)
+        self._spilled = rows
+        self._spill_retry_at = 0.0
+        if rows:
+            logger.info(f"Loaded {len(rows)} unsaved attempts from {self.spill_path}")
+
+    # --- ФАЙЛЫ ДРУГИХ ВОРКЕРОВ ---
+
+    @staticmethod
+    def _try_lock(spill_path: str):
+        """Блокировка файла воркера; None — ее держит живой процесс"""
+        lock = open(spill_path + ".lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        return lock
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _lock_spill(self):
+        if self._spill_pattern is None or fcntl is None or self._spill_lock is not None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            self._spill_lock = self._try_lock(self.spill_path)
+        except OSError as e:
+            logger.error(f"Could not lock {self.spill_path}: {e}")
+
+    def _adopted(self, rows):
+        if rows:
+            self._spilled.extend(rows)
+            self._spill_retry_at = 0.0
+
+    def _collect_orphans(self):
+        """
+        Попытки из файлов завершившихся воркеров переносит в свой файл
+        и возвращает их (выполняется в потоке файловых операций)
+        """
+        adopted = []
+        if self._spill_pattern is None or fcntl is None:
+            return adopted
+        paths = set(glob.glob(self._spill_pattern))
+        paths.update(p[:-len(".lock")] for p in glob.glob(self._spill_pattern + ".lock"))
+        paths.discard(self.spill_path)
+        for path in sorted(paths):
+            try:
+                lock = self._try_lock(path)
+            except OSError as e:
+                logger.error(f"Could not lock {path}: {e}")
+                continue
+            if lock is None:
+                continue
+            try:
+                rows = self._read_spill(path) if os.path.exists(path) else []
+                if rows:
+                    # Сначала в свой файл (с fsync), потом удаляем чужой: при сбое — дубль, а не потеря
+                    self._append_spill_file(rows)
+                    adopted.extend(rows)
+                    logger.info(f"Adopted {len(rows)} unsaved attempts from {path}")
+                self._remove_file(path)
+                self._remove_file(path + ".lock")
+            except OSError as e:
+                logger.error(f"Could not adopt {path}: {e}")
+            finally:
+                lock.close()
+        return adopted
+
+    # --- ЧТЕНИЕ НЕЗАПИСАННОГО ---
+
+    def _unsaved(self):
+        return chain(self._spilled, self._inflight, self._pending)
+
+    def pending_for(self, user_id: str):
+        """Попытки пользователя, которых еще нет в БД (от старых к новым)"""
+        return [r for r in self._unsaved() if r["user_id"] == user_id]
+
+    async def wait_saved_elsewhere(self, user_id: str, timeout: float) -> bool:
+        """
+        Ждет, пока незаписанные попытки пользователя в очередях других живых воркеров
+        попадут в БД (свои видны через pending_for). False — не дождались за timeout:
+        БД недоступна или другой воркер не успевает записать очередь.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if unsaved_channel.others(user_id) <= 0:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.02)
+
+    def has_inflight(self, user_id: str) -> bool:
+        """Есть ли у пользователя попытки в пачке, которая пишется прямо сейчас"""
+        return any(r["user_id"] == user_id for r in self._inflight)
+
+    # --- ИЗМЕНЕНИЕ ИСТОРИИ ---
+
+    async def discard_user(self, user_id: str):
+        """История пользователя удаляется — незаписанные попытки тоже"""
+        # Под замком: пачка, которая сейчас пишется, успеет попасть в БД до удаления
+        async with self._lock:
+            self._uncount([r for r in chain(self._pending, self._spilled) if r["user_id"] == user_id])
+            self._pending = [r for r in self._pending if r["user_id"] != user_id]
+            spilled = [r for r in self._spilled if r["user_id"] != user_id]
+            if len(spilled) != len(self._spilled):
+                self._spilled = spilled
+                await self._rewrite_spill()
+
+    async def reassign(self, from_user_id: str, to_user_id: str):
+        """Анонимные попытки переходят к вошедшему пользователю"""
+        async with self._lock:
+            moved_rows = [r for r in chain(self._pending, self._spilled) if r["user_id"] == from_user_id]
+            moved = any(r["user_id"] == from_user_id for r in self._spilled)
+            counted = sum(1 for r in moved_rows if id(r) in self._counted)
+            if counted:
+                unsaved_channel.add(from_user_id, -counted)
+                unsaved_channel.add(to_user_id, counted)
+            for r in moved_rows:
+                r["user_id"] = to_user_id
+            if moved:
+                await self._rewrite_spill()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "inflight": len(self._inflight),
+            "spilled": len(self._spilled),
+            "written": self.written,
+            "failed_writes": self.failed_writes,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+attempt_writer = AttemptWriter(
+    batch_size=settings.ATTEMPT_BATCH_SIZE,
+    flush_interval=settings.ATTEMPT_FLUSH_INTERVAL,
+    max_retries=settings.ATTEMPT_MAX_RETRIES,
+    retry_base_delay=settings.ATTEMPT_RETRY_BASE_DELAY,
+    spill_path=settings.ATTEMPT_SPILL_PATH,
+    spill_retry_interval=settings.ATTEMPT_SPILL_RETRY_INTERVAL,
+    max_pending=settings.ATTEMPT_MAX_PENDING,
+    dead_letter_path=settings.ATTEMPT_DEAD_LETTER_PATH,
+)
@@ -0,0 +1,115 @@
+"""
+Подписанная сессия пользователя.
+
+Кука fluent_session хранит токен вида <payload>.<подпись>, где payload —
+JSON с user_id, флагом авторизации, ролью и сроком действия, а подпись —
+HMAC-SHA256 секретом сервера. Подделать или продлить токен без секрета нельзя.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+
+from app import repository as repo
+from app.config import settings
+from app.shared_state import role_channel
+
+SESSION_COOKIE = "fluent_session"
+
+
+def _secret() -> bytes:
+    if settings.SESSION_SECRET:
+        return settings.SESSION_SECRET.encode()
+    # Запасной вариант: секрет выводится из серверного ключа Supabase (без него — не из пустой строки)
+    settings.require("SUPABASE_KEY")
+    return hashlib.sha256(f"fluent-session:{settings.SUPABASE_KEY}".encode()).digest()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_secret(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user_id: str, is_auth: bool = False, is_admin: bool = False) -> str:
+    """Создает подписанный токен сессии"""
+    payload = _b64encode(json.dumps({
+        "uid": user_id,
+        "auth": is_auth,
+        "adm": is_auth and is_admin,
+        "exp": int(time.time()) + settings.SESSION_TTL,
+    }, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def read_token(token: Optional[str]) -> Optional[dict]:
+    """Проверяет подпись и срок действия; возвращает payload или None"""
+    if not token or "." not in token:
+        return None
+    payload, signature = token.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        data = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if data.get("exp", 0) < time.time() or not data.get("uid"):
+        return None
+    return data
+
+
+def set_session_cookie(response, token: str):
+    response.set_cookie(
+        SESSION_COOKIE, token,
+        max_age=settings.SESSION_TTL, httponly=True, samesite="lax",
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+class RoleCache:
+    """
+    Короткоживущий кэш флага is_admin.
+    Роль в токене нужна только для меню, доступ в админку проверяется здесь,
+    так что снятие прав вступает в силу не позже чем через ttl секунд
+    (а во всех воркерах — сразу, через set() и app/shared_state.py).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._roles = {}  # user_id -> (is_admin, время записи, поколение)
+
+    def peek(self, user_id: str) -> Optional[bool]:
+        entry = self._roles.get(user_id)
+        if entry and time.monotonic() - entry[1] < self.ttl and entry[2] == role_channel.generation(user_id):
+            return entry[0]
+        return None
+
+    def _remember(self, user_id: str, is_admin: bool, generation: int):
+        now = time.monotonic()
+        if len(self._roles) > 10000:
+            self._roles = {k: v for k, v in self._roles.items() if now - v[1] < self.ttl}
+        self._roles[user_id] = (is_admin, now, generation)
+
+    def set(self, user_id: str, is_admin: bool):
+        """Роль изменилась: запоминаем ее здесь, остальные воркеры перечитают из БД"""
+        self._remember(user_id, is_admin, role_channel.bump(user_id))
+
+    async def is_admin(self, user_id: str) -> bool:
+        cached = self.peek(user_id)
+        if cached is not None:
+            return cached
+        generation = role_channel.generation(user_id)
+        is_admin = await repo.get_is_admin(user_id)
+        self._remember(user_id, is_admin, generation)
+        return is_admin
+
+
+role_cache = RoleCache(ttl=settings.ROLE_CACHE_TTL)
@@ -0,0 +1,184 @@
+"""
+Кэш учебного контента (уровни, темы, фразы) в памяти процесса.
+
+Контент меняется только из админки, поэтому страницы ученика читают его
+отсюда, а обработчики админки явно вызывают catalog.invalidate(...).
+Инвалидация видна всем воркерам через общие счетчики (app/shared_state.py).
+Данные из кэша общие для всех запросов — их нельзя изменять на месте.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+from app import repository as repo
+from app.config import settings
+from app.shared_state import content_channel, structure_channel, topic_channel
+
+
+class ContentCatalog:
+    def __init__(self, ttl: float, max_topics: int):
+        self.ttl = ttl
+        self.max_topics = max_topics
+        self._lock = asyncio.Lock()
+
+        self._structure_loaded_at = 0.0
+        self._structure_generation = 0
+        self._levels = []
+        self._topics = []
+        self._topics_by_id = {}
+        self._topics_by_slug = {}
+        # Уровни с вложенными темами для главной; номер растет при каждой загрузке структуры
+        self._levels_with_topics = []
+        self._structure_serial = 0
+
+        # topic_id -> (время загрузки, поколение, фразы по order_index); LRU, не больше max_topics тем
+        self._phrases_by_topic = OrderedDict()
+        self._phrases_by_id = {}
+
+    @property
+    def version(self) -> int:
+        """Номер версии контента: растет при каждой инвалидации (в любом воркере)"""
+        return content_channel.generation()
+
+    # --- ЗАГРУЗКА ---
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at < self.ttl
+
+    def _structure_fresh(self) -> bool:
+        return self._fresh(self._structure_loaded_at) and self._structure_generation == structure_channel.generation()
+
+    def _topic_generation(self, topic_id: int):
+        return structure_channel.generation(), topic_channel.generation(topic_id)
+
+    def _entry_fresh(self, topic_id: int, entry) -> bool:
+        return self._fresh(entry[0]) and entry[1] == self._topic_generation(topic_id)
+
+    async def _ensure_structure(self):
+        if self._structure_fresh():
+            return
+        async with self._lock:
+            if self._structure_fresh():
+                return
+            version = self.version
+            generation = structure_channel.generation()
+            levels, topics = await asyncio.gather(repo.list_levels(), repo.list_topics())
+            # Если во время загрузки контент инвалидировали — не кэшируем устаревшие данные
+            self._set_structure(levels, topics, generation, cache=(version == self.version))
+
+    def _set_structure(self, levels, topics, generation: int, cache: bool):
+        self._levels = levels
+        self._topics = topics
+        self._topics_by_id = {t['id']: t for t in topics}
+        self._topics_by_slug = {t['slug']: t for t in topics}
+        self._levels_with_topics = self._group_topics(levels, topics)
+        self._structure_serial += 1
+        self._structure_loaded_at = time.monotonic() if cache else 0.0
+        self._structure_generation = generation
+
+    @staticmethod
+    def _group_topics(levels, topics):
+        """Темы внутри своих уровней (один проход); уровни без тем не показываем"""
+        by_level = {}
+        for t in topics:
+            by_level.setdefault(t.get('level_id'), []).append(t)
+        # Копируем словари уровней: исходные лежат в кэше и отдаются как есть
+        return [{**lvl, 'topics': by_level[lvl['id']]} for lvl in levels if lvl['id'] in by_level]
+
+    async def _load_topic_phrases(self, topic_id: int):
+        entry = self._phrases_by_topic.get(topic_id)
+        if entry and self._entry_fresh(topic_id, entry):
+            self._phrases_by_topic.move_to_end(topic_id)
+            return entry[2]
+
+        version = self.version
+        generation = self._topic_generation(topic_id)
+        phrases = await repo.list_all_topic_phrases(topic_id)
+        phrases.sort(key=lambda p: p.get('order_index') or 0)
+        if version == self.version:
+            self._store_topic_phrases(topic_id, generation, phrases)
+        return phrases
+
+    def _store_topic_phrases(self, topic_id: int, generation, phrases):
+        self._drop_topic_phrases(topic_id)
+        self._phrases_by_topic[topic_id] = (time.monotonic(), generation, phrases)
+        for p in phrases:
+            self._phrases_by_id[p['id']] = p
+        while len(self._phrases_by_topic) > self.max_topics:
+            old_topic_id = next(iter(self._phrases_by_topic))
+            self._drop_topic_phrases(old_topic_id)
+
+    def _drop_topic_phrases(self, topic_id: int):
+        entry = self._phrases_by_topic.pop(topic_id, None)
+        if entry:
+            for p in entry[2]:
+                self._phrases_by_id.pop(p['id'], None)
+
+    # --- ЧТЕНИЕ ---
+
+    async def levels(self):
+        """Уровни, отсортированные по order_index"""
+        await self._ensure_structure()
+        return self._levels
+
+    async def topics(self):
+        await self._ensure_structure()
+        return self._topics
+
+    async def levels_with_topics(self):
+        """
+        Уровни с вложенными темами: [{..., "topics": [...]}, ...].
+        Группируются один раз на загрузку структуры; structure_serial меняется вместе с ними.
+        """
+        await self._ensure_structure()
+        return self._levels_with_topics
+
+    @property
+    def structure_serial(self) -> int:
+        """Номер загрузки уровней и тем: по нему кэшируется то, что из них построено"""
+        return self._structure_serial
+
+    async def topic_by_slug(self, slug: str):
+        await self._ensure_structure()
+        return self._topics_by_slug.get(slug)
+
+    async def topic(self, topic_id: int):
+        await self._ensure_structure()
+        return self._topics_by_id.get(topic_id)
+
+    async def topic_phrases(self, topic_id: int):
+        """Фразы темы, отсортированные по order_index"""
+        return await self._load_topic_phrases(topic_id)
+
+    async def phrase(self, phrase_id: int):
+        p = self._phrases_by_id.get(phrase_id)
+        if p:
+            entry = self._phrases_by_topic.get(p['topic_id'])
+            if entry and self._entry_fresh(p['topic_id'], entry):
+                return p
+
+        # Фразы нет в кэше: узнаем ее тему и загружаем тему целиком
+        p = await repo.get_phrase(phrase_id)
+        if not p:
+            return None
+        for cached in await self._load_topic_phrases(p['topic_id']):
+            if cached['id'] == phrase_id:
+                return cached
+        return p
+
+    # --- ИНВАЛИДАЦИЯ ---
+
+    def invalidate(self, topic_id: int = None):
+        """Сбрасывает фразы одной темы или (без topic_id) весь каталог — во всех воркерах"""
+        content_channel.bump()
+        if topic_id is not None:
+            topic_channel.bump(topic_id)
+            self._drop_topic_phrases(topic_id)
+            return
+        structure_channel.bump()
+        self._structure_loaded_at = 0.0
+        self._phrases_by_topic.clear()
+        self._phrases_by_id.clear()
+
+
+catalog = ContentCatalog(ttl=settings.CATALOG_TTL, max_topics=settings.CATALOG_MAX_TOPICS)
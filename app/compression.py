@@ -0,0 +1,83 @@
+"""
+Сжатие ответов (brotli, если установлен и принимается браузером, иначе gzip).
+
+Сжимаются только ответы, пришедшие одним куском, — страницы и JSON.
+Потоковые ответы (SSE проверки ответа) идут как есть: сжатие копило бы
+события в буфере и задерживало их. Статика из static/dist отдается уже
+сжатой (app/assets.py) и сюда приходит с Content-Encoding.
+"""
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.assets import accepted_encodings
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # без brotli — только gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/html", "text/plain", "text/css", "application/json", "application/javascript")
+
+
+class CompressionMiddleware:
+    """ASGI-middleware: сжимает ответ целиком, если он текстовый и не меньше minimum_size"""
+
+    def __init__(self, app, minimum_size: int = None, gzip_level: int = None, brotli_quality: int = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.gzip_level = settings.COMPRESSION_GZIP_LEVEL if gzip_level is None else gzip_level
+        self.brotli_quality = settings.COMPRESSION_BROTLI_QUALITY if brotli_quality is None else brotli_quality
+
+    def _encoding(self, scope):
+        accepted = accepted_encodings(Headers(scope=scope))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = self._encoding(scope)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None  # заголовки ответа, который ждет первого куска тела
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            pending, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Поток или слишком маленький ответ — без сжатия
+                await send(pending)
+                await send(message)
+                return
+            compressed = self._compress(body, encoding)
+            headers = MutableHeaders(raw=pending["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(pending)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
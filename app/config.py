@@ -1,16 +1,138 @@
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
-    SUPABASE_URL: str
-    SUPABASE_KEY: str
-    GEMINI_API_KEY: str
+    # Обязательны для работы, но проверяются там, где нужны (settings.require),
+    # а не при импорте: иначе без них не поднять даже страницу входа
+    SUPABASE_URL: str = ""
+    SUPABASE_KEY: str = ""
+    GEMINI_API_KEY: str = ""
     LLAMA_API_KEY: str = ""
     LLAMA_BASE_URL: str = ""
     LLAMA_MODEL_NAME: str = "llama-3.3-70b-versatile"
+    # Gemini через OpenAI-совместимый API
+    GEMINI_BASE_URL: str = "https://generativelanguage.googleapis.com/v1beta/openai/"
+    GEMINI_MODEL_NAME: str = "gemini-2.0-flash"
+
+    # Размер пула потоков для синхронных запросов к Supabase
+    DB_POOL_SIZE: int = 16
+
+    # Кэш контента: время жизни (сек) и сколько тем с фразами держать в памяти
+    CATALOG_TTL: int = 300
+    CATALOG_MAX_TOPICS: int = 500
+
+    # Подпись сессии (если пусто — выводится из SUPABASE_KEY), срок жизни и кэш ролей (сек)
+    SESSION_SECRET: str = ""
+    SESSION_TTL: int = 60 * 60 * 24 * 30
+    ROLE_CACHE_TTL: int = 60
+    # Куки сессии только по HTTPS (в продакшене на Fly.io всегда HTTPS);
+    # для локальной разработки по http://localhost — SESSION_COOKIE_SECURE=false
+    SESSION_COOKIE_SECURE: bool = True
+
+    # Сколько пар (фраза, направление) держать в индексе принятых ответов
+    ANSWER_INDEX_MAX_ENTRIES: int = 20000
+
+    # Кэш результатов проверки ИИ: размер и время жизни (сек)
+    EVAL_CACHE_SIZE: int = 5000
+    EVAL_CACHE_TTL: int = 3600
+
+    # Локальная оценка до ИИ: включена ли, и когда ответ считается явно неверным —
+    # сходство строк с каждым принятым вариантом не выше порога, а в варианте
+    # не меньше TRIAGE_WRONG_MIN_WORDS значимых слов (и ни одного общего)
+    TRIAGE_ENABLED: bool = True
+    TRIAGE_WRONG_MAX_SIMILARITY: float = 0.35
+    TRIAGE_WRONG_MIN_WORDS: int = 3
+    # Опечатки: слово ответа считается опечаткой, только если его нет в словаре языка
+    # (файл по слову в строке; нет файла — опечатки этого языка оценивает ИИ) и в принятых
+    # вариантах. В словах от TRIAGE_TYPO_MIN_WORD букв допустима одна правка, от
+    # TRIAGE_TYPO_LONG_WORD — две. Выключено, пока пороги не сверены: bench/triage_replay.py --spelling
+    TRIAGE_SPELLING_ENABLED: bool = False
+    TRIAGE_WORDLISTS: str = "data/wordlists/{lang}.txt"
+    TRIAGE_TYPO_MIN_WORD: int = 4
+    TRIAGE_TYPO_LONG_WORD: int = 8
+
+    # Вызовы ИИ: параллельность, таймаут (сек), повторы и circuit breaker
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_TIMEOUT: float = 20.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8.0
+    LLM_BREAKER_THRESHOLD: int = 5
+    LLM_BREAKER_RESET: float = 30.0
+
+    # Выбор провайдера ИИ: порядок предпочтения (провайдеры без ключа пропускаются),
+    # окно статистики (сек), замеров для решений и доля ошибок, после которой провайдер обходится
+    LLM_PROVIDERS: str = "llama,gemini"
+    LLM_ROUTER_WINDOW: float = 300.0
+    LLM_ROUTER_MIN_SAMPLES: int = 5
+    LLM_ROUTER_MAX_ERROR_RATE: float = 0.5
+    # Дублирующий запрос к другому провайдеру, если основной отвечает дольше
+    # этого квантиля своей задержки (но не раньше LLM_HEDGE_MIN_DELAY сек); 0 — без дублей
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY: float = 1.0
+
+    # Сколько сводок прогресса пользователей держать в памяти
+    PROGRESS_MAX_USERS: int = 50000
+    # Сколько фраз с ошибками загружать в сводку за раз
+    PROGRESS_MAX_FAILING: int = 1000
+
+    # Сессии тренировки: время жизни без активности (сек) и максимум в памяти
+    TRAINING_SESSION_TTL: int = 2 * 60 * 60
+    TRAINING_MAX_SESSIONS: int = 20000
+    # Сколько ждать (сек) записи попыток пользователя из других воркеров перед пересборкой очереди
+    TRAINING_REBUILD_WAIT: float = 2.0
+
+    # Импорт фраз: строк в одной части файла и фраз в одной вставке
+    IMPORT_CHUNK_SIZE: int = 5000
+    IMPORT_BATCH_SIZE: int = 500
+
+    # Админка: строк на странице списков тем, пользователей и фраз
+    ADMIN_PAGE_SIZE: int = 50
+
+    # Экзамен: максимум ответов в одной отправке и одновременных проверок ИИ на нее
+    EXAM_MAX_ITEMS: int = 50
+    EXAM_MAX_CONCURRENCY: int = 5
+
+    # Отложенная запись попыток: размер пачки, интервал сброса (сек), повторы,
+    # файл для попыток, которые не удалось записать, и предел очереди в памяти
+    ATTEMPT_BATCH_SIZE: int = 200
+    ATTEMPT_FLUSH_INTERVAL: float = 1.0
+    ATTEMPT_MAX_RETRIES: int = 3
+    ATTEMPT_RETRY_BASE_DELAY: float = 0.5
+    ATTEMPT_SPILL_PATH: str = "data/attempts_spill.jsonl"
+    ATTEMPT_SPILL_RETRY_INTERVAL: float = 30.0
+    ATTEMPT_MAX_PENDING: int = 20000
+    # Попытки, которые БД отвергла навсегда (например, FK на удаленную фразу): не повторяются
+    ATTEMPT_DEAD_LETTER_PATH: str = "data/attempts_dead_letter.jsonl"
+
+    # Токен для /metrics (пусто — без авторизации, например во внутренней сети)
+    METRICS_TOKEN: str = ""
+    # Каталог снимков метрик воркеров (задает gunicorn.conf.py; пусто — метрики одного процесса)
+    # и как часто (сек) воркер обновляет свой снимок
+    METRICS_DIR: str = ""
+    METRICS_FLUSH_INTERVAL: float = 5.0
+
+    # Файл общих счетчиков для воркеров gunicorn (задает gunicorn.conf.py; пусто — один процесс)
+    SHARED_STATE_PATH: str = ""
+
+    # Сжатие ответов (HTML, JSON): минимальный размер в байтах и уровни gzip / brotli
+    COMPRESSION_MIN_SIZE: int = 500
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+
+    # Загрузка тяжелых модулей (supabase, openai, pandas) и клиентов в фоне сразу после старта
+    STARTUP_WARMUP: bool = True
+    # Сколько (сек) остановка ждет незаконченный прогрев
+    STARTUP_WARMUP_STOP_TIMEOUT: float = 10.0
 
 
     class Config:
         env_file = ".env"
         extra = "ignore"
 
+    def require(self, *names: str):
+        """Ошибка с понятным текстом, если обязательные настройки не заданы"""
+        missing = [name for name in names if not getattr(self, name)]
+        if missing:
+            raise RuntimeError(f"Required settings are not set: {', '.join(missing)}")
+
 settings = Settings()
\ No newline at end of file
@@ -1,5 +1,34 @@
-from supabase import create_client, Client
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from app.config import settings
 
-# Стандартное подключение
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
\ No newline at end of file
+# Клиент Supabase создается при первом запросе (или прогревом после старта):
+# сам пакет supabase грузится заметную долю секунды, а страницам без БД он не нужен
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Стандартное подключение"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                settings.require("SUPABASE_URL", "SUPABASE_KEY")
+                from supabase import create_client
+                _client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    return _client
+
+
+# Клиент supabase синхронный: каждый запрос к PostgREST блокирует поток.
+# Чтобы не останавливать event loop, выполняем их в ограниченном пуле потоков.
+_executor = ThreadPoolExecutor(max_workers=settings.DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_db(fn, *args, **kwargs):
+    """Выполняет синхронный вызов к БД в пуле потоков и ждет результат"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
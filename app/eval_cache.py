@@ -0,0 +1,97 @@
+"""
+Кэш результатов проверки ИИ с объединением одинаковых запросов (single-flight).
+
+Когда класс проходит одну тему, много учеников одновременно присылают
+одинаковые ответы. Первый запрос идет в ИИ, остальные ждут его результат,
+а следующие берут готовый ответ из LRU-кэша с ограниченным временем жизни.
+"""
+import re
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.single_flight import SingleFlight
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def cache_key(reference: str, user_translation: str, direction: str, interface_lang: str):
+    # Регистр и пунктуация влияют на оценку (ошибки Capitalization/Spelling),
+    # поэтому нормализуем только пробелы
+    answer = _SPACES_RE.sub(" ", user_translation).strip()
+    return (reference, answer, direction.lower(), interface_lang.lower())
+
+
+class EvaluationCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._results = OrderedDict()  # key -> (время записи, результат)
+        self._inflight = SingleFlight()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _get(self, key):
+        entry = self._results.get(key)
+        if not entry:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key, result: dict):
+        self._results[key] = (time.monotonic(), result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def lookup(self, key):
+        """Копия готового результата или None (для потоковой проверки)"""
+        cached = self._get(key)
+        if cached is None:
+            return None
+        self.hits += 1
+        return dict(cached)
+
+    def store(self, key, result: dict):
+        """Сохраняет результат, полученный в обход get_or_compute (потоковая проверка)"""
+        self.misses += 1
+        if not result.get("failed"):
+            self._put(key, dict(result))
+
+    async def get_or_compute(self, key, compute):
+        """Возвращает копию результата: из кэша, из уже идущего запроса или вызывая compute()"""
+        cached = self._get(key)
+        if cached is not None:
+            self.hits += 1
+            return dict(cached)
+
+        async def compute_and_store():
+            result = await compute()
+            # Ошибки ИИ не кэшируем — следующая попытка пойдет в ИИ заново
+            if not result.get("failed"):
+                self._put(key, result)
+            return result
+
+        result, shared = await self._inflight.run(key, compute_and_store)
+        if shared:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return dict(result)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._results),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+eval_cache = EvaluationCache(max_size=settings.EVAL_CACHE_SIZE, ttl=settings.EVAL_CACHE_TTL)
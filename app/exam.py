@@ -0,0 +1,92 @@
+"""
+Режим экзамена: ученик отвечает на несколько фраз и отправляет все ответы разом.
+
+Эталоны берутся из базы одним запросом, ответы проверяются параллельно
+(не больше EXAM_MAX_CONCURRENCY одновременных вызовов ИИ на одну отправку),
+все попытки уходят в БД одной пачкой. Результаты идут в порядке ответов.
+"""
+import asyncio
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from app import repository as repo
+from app.ai_service import evaluate_translation
+from app.answer_index import answer_index
+from app.attempt_writer import attempt_writer
+from app.config import settings
+from app.progress import progress_store
+from app.triage import pre_scorer, GRADED_BY_LLM
+
+
+class ExamAnswer(BaseModel):
+    phrase_id: int
+    user_translation: str
+
+
+class ExamSubmission(BaseModel):
+    answers: List[ExamAnswer] = Field(..., min_length=1, max_length=settings.EXAM_MAX_ITEMS)
+
+
+async def _grade_one(answer: ExamAnswer, phrase, source_lang: str, target_lang: str, ctx: dict, semaphore):
+    if not phrase:
+        return {"phrase_id": answer.phrase_id, "failed": True, "error": "Phrase not found"}
+
+    original = phrase.get(f"text_{source_lang}") or ""
+    reference = phrase.get(f"text_{target_lang}") or ""
+    direction = ctx["dir"]
+
+    result = await pre_scorer.grade(answer.phrase_id, direction, reference, answer.user_translation, ctx["lang"]) if reference else None
+    if result is None:
+        async with semaphore:
+            result = await evaluate_translation(
+                original=original,
+                reference_translation=reference or "Translation missing in database",
+                user_translation=answer.user_translation,
+                direction=direction,
+                interface_lang=ctx["lang"]
+            )
+        if reference and result.get("score") == 100:
+            answer_index.add(answer.phrase_id, direction, answer.user_translation)
+
+    result.setdefault("ideal_translation", reference)
+    return {"phrase_id": answer.phrase_id, **result}
+
+
+async def grade_exam(submission: ExamSubmission, ctx: dict) -> dict:
+    source_lang, target_lang = ctx["dir"].lower().split("-")
+
+    phrase_ids = {a.phrase_id for a in submission.answers}
+    phrases = {p["id"]: p for p in await repo.list_phrases_by_ids(phrase_ids)}
+
+    semaphore = asyncio.Semaphore(settings.EXAM_MAX_CONCURRENCY)
+    results = await asyncio.gather(*(
+        _grade_one(a, phrases.get(a.phrase_id), source_lang, target_lang, ctx, semaphore)
+        for a in submission.answers
+    ))
+
+    # Неудавшиеся проверки (ИИ недоступен, фразы нет) не сохраняем — их можно отправить еще раз
+    graded = [(a, r) for a, r in zip(submission.answers, results) if not r.get("failed")]
+    rows = [{
+        "user_id": ctx["user_id"],
+        "phrase_id": a.phrase_id,
+        "direction": ctx["dir"],
+        "user_translation": a.user_translation,
+        "ai_score": r["score"],
+        "ai_feedback": r["explanation"],
+        "ideal_translation": r["ideal_translation"],
+        "graded_by": r.get("graded_by", GRADED_BY_LLM)
+    } for a, r in graded]
+
+    # Попытки уходят в БД одной пачкой через очередь отложенной записи
+    for row in rows:
+        attempt_writer.submit(row)
+        progress_store.record(ctx["user_id"], row["phrase_id"], row["ai_score"])
+
+    scores = [r["score"] for _, r in graded]
+    return {
+        "results": results,
+        "graded": len(graded),
+        "failed": len(results) - len(graded),
+        "avg_score": sum(scores) // len(scores) if scores else 0,
+    }
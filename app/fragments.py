@@ -0,0 +1,33 @@
+"""
+Кэш HTML-фрагментов, одинаковых для всех пользователей.
+
+Фрагмент рендерится один раз на версию данных, из которых он построен
+(например, сетка тем — на загрузку структуры каталога и язык интерфейса),
+и вставляется в страницу готовой строкой. Ключей немного и они
+ограничены вызывающим кодом, поэтому кэш без вытеснения.
+"""
+from markupsafe import Markup
+
+
+class FragmentCache:
+    def __init__(self):
+        self._entries = {}  # key -> (версия, Markup)
+        self.hits = 0
+        self.renders = 0
+
+    def get(self, key, version, render) -> Markup:
+        """Готовый фрагмент для версии данных или render() — если версия сменилась"""
+        entry = self._entries.get(key)
+        if entry and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.renders += 1
+        html = Markup(render())
+        self._entries[key] = (version, html)
+        return html
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "renders": self.renders, "entries": len(self._entries)}
+
+
+fragment_cache = FragmentCache()
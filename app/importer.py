@@ -0,0 +1,266 @@
+"""
+Импорт фраз из CSV / Excel.
+
+Файл читается по частям (chunk_size строк), каждая часть проверяется
+и преобразуется целиком средствами pandas. Каждая строка получает отпечаток
+(content_hash) нормализованных text_ru / text_en / text_uz, по которому
+файл сравнивается с фразами темы: в БД уходят только изменения
+(новые, измененные и — в режиме синхронизации — удаленные фразы),
+пачками по batch_size. Ошибка одной пачки не отменяет остальные.
+"""
+import asyncio
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict
+
+import pandas as pd
+
+from app import repository as repo
+
+REQUIRED_COLUMNS = ['text_ru', 'text_en', 'text_uz']
+
+# append — добавить новые фразы в конец темы (совпадающие пропускаются);
+# sync   — файл считается эталоном темы: порядок из файла, лишние фразы удаляются
+IMPORT_MODES = ("append", "sync")
+
+_SPACES_RE = re.compile(r"\s+")
+# Колонки фраз темы, нужные для сравнения с файлом
+_DIFF_COLUMNS = "id, content_hash, order_index, text_ru, text_en, text_uz"
+
+
+class ImportFormatError(ValueError):
+    """Файл не подходит для импорта (нет нужных колонок, неизвестный формат)"""
+
+
+class ImportReport:
+    def __init__(self, mode: str, dry_run: bool):
+        self.mode = mode
+        self.dry_run = dry_run
+        self.total_rows = 0
+        self.skipped = 0  # строки с пустыми текстами
+        # Размер диффа с темой
+        self.to_insert = 0
+        self.to_update = 0
+        self.unchanged = 0
+        self.to_remove = 0
+        # Сколько реально записано
+        self.inserted = 0
+        self.updated = 0
+        self.removed = 0
+        self.errors = []  # [{"stage": "insert", "count": 500, "error": "..."}]
+
+    @property
+    def failed(self) -> int:
+        return sum(e["count"] for e in self.errors)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.removed)
+
+
+# --- ОТПЕЧАТКИ ---
+
+def normalize_text(text) -> str:
+    return unicodedata.normalize("NFC", _SPACES_RE.sub(" ", str(text).strip()))
+
+
+def content_hash(text_ru, text_en, text_uz) -> str:
+    key = "\x1f".join(normalize_text(t) for t in (text_ru, text_en, text_uz))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+# --- ЧТЕНИЕ ФАЙЛА ---
+
+def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [str(c).lower().strip() for c in df.columns]
+    for col in REQUIRED_COLUMNS:
+        if col not in df.columns:
+            raise ImportFormatError(f"В файле нет колонки '{col}'")
+    return df
+
+
+def _iter_xlsx(fileobj, chunk_size: int):
+    """Потоковое чтение .xlsx: openpyxl в режиме read_only не грузит лист целиком"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else "" for c in header]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_chunks(fileobj, filename: str, chunk_size: int):
+    """Возвращает генератор DataFrame по chunk_size строк"""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return pd.read_csv(fileobj, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    if name.endswith(".xlsx"):
+        return _iter_xlsx(fileobj, chunk_size)
+    if name.endswith(".xls"):
+        # Старый формат нельзя читать потоково — читаем целиком и режем на части
+        df = pd.read_excel(fileobj)
+        return (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+    raise ImportFormatError("Поддерживаются файлы .csv, .xlsx и .xls")
+
+
+def prepare_chunk(df: pd.DataFrame, topic_id: int, next_index: int):
+    """
+    Проверяет и преобразует часть файла без построчного цикла.
+    Возвращает (записи с content_hash, число пропущенных строк).
+    """
+    df = _normalize_columns(df)
+
+    texts = (
+        df[REQUIRED_COLUMNS].fillna("").astype(str)
+        .apply(lambda col: col.str.strip().str.replace(_SPACES_RE, " ", regex=True).str.normalize("NFC"))
+    )
+    valid = (texts != "").all(axis=1)
+    texts = texts[valid]
+
+    # Порядок: из колонки order_index, если она есть и заполнена, иначе — по порядку строк
+    auto_index = pd.Series(range(next_index, next_index + len(texts)), index=texts.index)
+    if 'order_index' in df.columns:
+        given = pd.to_numeric(df.loc[valid, 'order_index'], errors='coerce')
+        order_index = given.fillna(auto_index)
+    else:
+        order_index = auto_index
+
+    records = texts.assign(topic_id=topic_id, order_index=order_index.astype(int)).to_dict("records")
+    for r in records:
+        r["content_hash"] = content_hash(r["text_ru"], r["text_en"], r["text_uz"])
+    return records, int((~valid).sum())
+
+
+async def read_file(fileobj, filename: str, topic_id: int, chunk_size: int, next_index: int, report: ImportReport):
+    records = []
+    chunks = iter_chunks(fileobj, filename, chunk_size)
+    # Разбор файла — работа для CPU, выносим его из event loop
+    while True:
+        df = await asyncio.to_thread(next, chunks, None)
+        if df is None:
+            break
+        chunk_records, skipped = await asyncio.to_thread(
+            prepare_chunk, df, topic_id, next_index + len(records)
+        )
+        report.total_rows += len(df)
+        report.skipped += skipped
+        records.extend(chunk_records)
+    return records
+
+
+# --- СРАВНЕНИЕ С ТЕМОЙ ---
+
+def diff_phrases(existing, records, sync: bool):
+    """
+    Сопоставляет строки файла с фразами темы:
+    1) одинаковый content_hash — та же фраза (в режиме sync сдвинутую фразу переупорядочиваем);
+    2) в режиме sync фраза темы с тем же order_index — отредактированная (обновляем тексты);
+    3) остальные строки файла — новые; в режиме sync оставшиеся фразы темы — удаленные.
+    Возвращает (inserts, updates, backfills, unchanged_count, removed_ids);
+    backfills — неизменные фразы, которым нужно только записать content_hash.
+    """
+    by_hash = defaultdict(list)
+    for p in existing:
+        by_hash[p["content_hash"]].append(p)
+
+    inserts, updates, backfills, unmatched = [], [], [], []
+    unchanged = 0
+    matched_ids = set()
+
+    for r in records:
+        candidates = by_hash.get(r["content_hash"])
+        if not candidates:
+            unmatched.append(r)
+            continue
+        p = candidates.pop(0)
+        matched_ids.add(p["id"])
+        if sync and p.get("order_index") != r["order_index"]:
+            updates.append({**r, "id": p["id"]})
+            continue
+        unchanged += 1
+        if p.get("_hash_missing"):
+            backfills.append({**r, "id": p["id"], "order_index": p.get("order_index")})
+
+    if not sync:
+        return unmatched, updates, backfills, unchanged, []
+
+    free_by_order = {}
+    for p in existing:
+        if p["id"] not in matched_ids:
+            free_by_order.setdefault(p.get("order_index"), p)
+
+    for r in unmatched:
+        p = free_by_order.pop(r["order_index"], None)
+        if p:
+            matched_ids.add(p["id"])
+            updates.append({**r, "id": p["id"]})
+        else:
+            inserts.append(r)
+
+    removed_ids = [p["id"] for p in existing if p["id"] not in matched_ids]
+    return inserts, updates, backfills, unchanged, removed_ids
+
+
+async def _apply_in_batches(stage: str, rows, batch_size: int, write, report: ImportReport) -> int:
+    done = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        try:
+            await write(batch)
+            done += len(batch)
+        except Exception as e:
+            report.errors.append({"stage": stage, "count": len(batch), "error": str(e)})
+    return done
+
+
+async def import_phrases(
+    fileobj, filename: str, topic_id: int,
+    chunk_size: int, batch_size: int,
+    mode: str = "append", dry_run: bool = False
+) -> ImportReport:
+    if mode not in IMPORT_MODES:
+        raise ImportFormatError(f"Неизвестный режим импорта: {mode}")
+    report = ImportReport(mode, dry_run)
+
+    existing = await repo.list_all_topic_phrases(topic_id, _DIFF_COLUMNS)
+    for p in existing:
+        # Фразы, добавленные до появления content_hash, получают его при первом импорте
+        if not p.get("content_hash"):
+            p["content_hash"] = content_hash(p["text_ru"], p["text_en"], p["text_uz"])
+            p["_hash_missing"] = True
+
+    if mode == "sync":
+        next_index = 1
+    else:
+        next_index = max((p.get("order_index") or 0 for p in existing), default=0) + 1
+
+    records = await read_file(fileobj, filename, topic_id, chunk_size, next_index, report)
+    inserts, updates, backfills, unchanged, removed_ids = diff_phrases(existing, records, sync=(mode == "sync"))
+
+    report.to_insert = len(inserts)
+    report.to_update = len(updates)
+    report.unchanged = unchanged
+    report.to_remove = len(removed_ids)
+    if dry_run:
+        return report
+
+    report.inserted = await _apply_in_batches("insert", inserts, batch_size, repo.insert_phrases, report)
+    report.updated = await _apply_in_batches("update", updates, batch_size, repo.upsert_phrases, report)
+    report.removed = await _apply_in_batches("delete", removed_ids, batch_size, repo.delete_phrases, report)
+    await _apply_in_batches("content_hash", backfills, batch_size, repo.upsert_phrases, report)
+    return report
+
@@ -0,0 +1,341 @@
+"""
+Выбор ИИ-провайдера для каждой проверки.
+
+Провайдеры — OpenAI-совместимые API (Llama через LLAMA_*, Gemini через
+GEMINI_*), у каждого свои ограничения, повторы и circuit breaker
+(ResilientCaller). По каждому провайдеру копится скользящая статистика
+за LLM_ROUTER_WINDOW секунд: задержки (для потока — до первого фрагмента)
+и ошибки. Запрос уходит здоровому провайдеру с наименьшей сглаженной
+задержкой (EWMA: замедление видно сразу, а не когда сдвинется медиана окна).
+
+Если он не ответил за квантиль LLM_HEDGE_QUANTILE своей обычной задержки,
+тот же запрос дублируется следующему провайдеру, и берется ответ, пришедший
+первым (второй запрос отменяется). Если провайдер упал, запрос сразу уходит
+следующему (fallback). Для потока все это действует до первого фрагмента.
+
+Клиенты (и сам пакет openai, тяжелый при импорте) создаются при первом
+запросе или прогревом после старта (warm_up), а не при импорте модуля.
+
+Для тестов провайдеров подменяют адресами локальных заглушек
+(LLAMA_BASE_URL / GEMINI_BASE_URL, см. bench/fake_backend.py).
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from functools import partial
+from typing import Optional
+
+from app.config import settings
+from app.metrics import llm_provider_seconds, llm_hedges_total, llm_fallbacks_total
+from app.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+logger = logging.getLogger(__name__)
+
+# Поток закончился, не прислав ни одного фрагмента
+_EMPTY = object()
+# Вес нового замера в сглаженной задержке: замедление заметно уже через пару запросов
+_EWMA_WEIGHT = 0.3
+
+
+class Provider:
+    def __init__(self, name: str, make_client, model: str, caller: ResilientCaller,
+                 window: float, min_samples: int, max_error_rate: float):
+        self.name = name
+        self.make_client = make_client
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.model = model
+        self.caller = caller
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        # (время, режим, задержка в секундах или None — ошибка)
+        self._samples = deque(maxlen=1000)
+        self._ewma = {}  # режим -> сглаженная задержка
+
+    @property
+    def client(self):
+        """Клиент API; создается при первом обращении (из прогрева — в отдельном потоке)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.make_client()
+        return self._client
+
+    def _recent(self):
+        horizon = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < horizon:
+            self._samples.popleft()
+        return self._samples
+
+    def observe(self, mode: str, seconds: Optional[float]):
+        self._samples.append((time.monotonic(), mode, seconds))
+        if seconds is not None:
+            previous = self._ewma.get(mode)
+            self._ewma[mode] = seconds if previous is None else previous + _EWMA_WEIGHT * (seconds - previous)
+
+    def latency(self, mode: str, quantile: float) -> Optional[float]:
+        """Квантиль задержки за окно или None, если замеров мало"""
+        values = sorted(s for _, m, s in self._recent() if m == mode and s is not None)
+        if len(values) < self.min_samples:
+            # Первый фрагмент потока приходит не позже полного ответа
+            return self.latency("complete", quantile) if mode == "stream" else None
+        return values[min(len(values) - 1, int(quantile * len(values)))]
+
+    def expected_latency(self, mode: str) -> Optional[float]:
+        """Сглаженная задержка (свежие замеры весят больше) или None, если замеров за окно мало"""
+        if self.latency(mode, 0.5) is None:
+            return None
+        return self._ewma.get(mode) or self._ewma.get("complete")
+
+    def error_rate(self) -> float:
+        samples = self._recent()
+        if len(samples) < self.min_samples:
+            return 0.0
+        return sum(1 for *_, s in samples if s is None) / len(samples)
+
+    @property
+    def healthy(self) -> bool:
+        return self.caller.breaker.state != "open" and self.error_rate() <= self.max_error_rate
+
+    def _finish(self, mode: str, outcome: str, seconds: float):
+        llm_provider_seconds.observe(seconds, self.name, mode, outcome)
+        if outcome == "ok":
+            self.observe(mode, seconds)
+        elif outcome == "error":
+            self.observe(mode, None)
+
+    async def call(self, make_request, max_retries: int = None):
+        """make_request(client, model) — корутина запроса к этому провайдеру"""
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await self.caller.call(lambda: make_request(self.client, self.model), max_retries)
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self._finish("complete", outcome, time.perf_counter() - started)
+
+    async def stream(self, make_request, max_retries: int = None):
+        started = time.perf_counter()
+        first = True
+        chunks = self.caller.stream(lambda: make_request(self.client, self.model), max_retries)
+        try:
+            async for chunk in chunks:
+                if first:
+                    first = False
+                    self._finish("stream", "ok", time.perf_counter() - started)
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            if first:
+                self._finish("stream", "cancelled", time.perf_counter() - started)
+            raise
+        except CircuitOpenError:
+            self._finish("stream", "circuit_open", time.perf_counter() - started)
+            raise
+        except Exception:
+            # Обрыв уже начатого потока тоже ошибка провайдера
+            self._finish("stream", "error", time.perf_counter() - started)
+            raise
+        finally:
+            await chunks.aclose()
+
+    def stats(self) -> dict:
+        def ms(value):
+            return None if value is None else round(value * 1000)
+        return {
+            "provider": self.name,
+            "model": self.model,
+            "breaker": self.caller.breaker.state,
+            "healthy": self.healthy,
+            "samples": len(self._recent()),
+            "error_rate": round(self.error_rate(), 3),
+            "latency_ms": {mode: {
+                "expected": ms(self.expected_latency(mode)),
+                "p50": ms(self.latency(mode, 0.5)),
+                "p95": ms(self.latency(mode, 0.95)),
+            } for mode in ("complete", "stream")},
+        }
+
+
+class LLMRouter:
+    def __init__(self, providers, hedge_quantile: float, hedge_min_delay: float, timeout: float):
+        self.providers = providers
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.timeout = timeout
+
+    def ranked(self, mode: str):
+        """Провайдеры от лучшего: здоровые раньше, быстрые раньше, при равенстве — порядок из настроек"""
+        def key(item):
+            index, provider = item
+            latency = provider.expected_latency(mode)
+            # Без свежих замеров провайдер идет первым: иначе не узнать, что он снова быстр
+            return (not provider.healthy, -1.0 if latency is None else latency, index)
+        return [p for _, p in sorted(enumerate(self.providers), key=key)]
+
+    def _hedge_delay(self, provider: Provider, mode: str) -> float:
+        latency = provider.latency(mode, self.hedge_quantile)
+        if latency is None:
+            # О провайдере мало данных: ориентируемся на самого быстрого из известных
+            known = [x for x in (p.latency(mode, self.hedge_quantile) for p in self.providers) if x is not None]
+            latency = min(known) if known else self.timeout / 4
+        return max(self.hedge_min_delay, latency)
+
+    async def _race(self, mode: str, start, discard=None):
+        """
+        Запускает start(provider, max_retries) у лучшего провайдера, при задержке
+        дублирует на следующего, при ошибке переходит к следующему. Повторы внутри
+        провайдера — только у последнего: до него быстрее спросить другого.
+        Возвращает первый успешный результат; discard(result) освобождает лишний.
+        """
+        queue = self.ranked(mode)
+        if not queue:
+            raise CircuitOpenError("No LLM provider is configured")
+        running = {}  # task -> (провайдер, время запуска)
+        can_hedge = self.hedge_quantile > 0
+        hedge_at = None
+        hedged = False
+        error = None
+        finished = False
+
+        def launch():
+            nonlocal hedge_at
+            provider = queue.pop(0)
+            task = asyncio.ensure_future(start(provider, 0 if queue else None))
+            running[task] = (provider, time.perf_counter())
+            hedge_at = time.perf_counter() + self._hedge_delay(provider, mode) if can_hedge and queue else None
+            return provider
+
+        primary = launch()
+        try:
+            while running:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.perf_counter())
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Основной провайдер медлит: тот же запрос следующему, ждем оба
+                    can_hedge = False
+                    hedged = True
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    provider, _ = running.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        if not isinstance(error, CircuitOpenError):
+                            logger.warning(f"LLM provider {provider.name} failed: {error!r}")
+                    elif winner is None:
+                        winner = (provider, task.result())
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    finished = True
+                    if hedged:
+                        llm_hedges_total.inc("primary" if winner[0] is primary else "hedge")
+                    return winner[1]
+
+                if not running and queue:
+                    llm_fallbacks_total.inc(queue[0].name)
+                    primary = launch()
+            raise error
+        finally:
+            for task, (provider, started) in running.items():
+                task.cancel()
+                if finished:
+                    # Проигравший дублирующий запрос: его задержка не меньше прошедшего времени
+                    provider.observe(mode, time.perf_counter() - started)
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def call(self, make_request):
+        """Ответ первого успешного провайдера; make_request(client, model) — корутина запроса"""
+        return await self._race("complete", lambda provider, retries: provider.call(make_request, retries))
+
+    @staticmethod
+    async def _open_stream(provider: Provider, make_request, max_retries):
+        chunks = provider.stream(make_request, max_retries)
+        try:
+            return chunks, await chunks.__anext__()
+        except StopAsyncIteration:
+            return chunks, _EMPTY
+        except BaseException:
+            await chunks.aclose()
+            raise
+
+    async def stream(self, make_request):
+        """Фрагменты потока провайдера, первым приславшего ответ"""
+        chunks, first = await self._race(
+            "stream",
+            lambda provider, retries: self._open_stream(provider, make_request, retries),
+            discard=lambda opened: opened[0].aclose(),
+        )
+        try:
+            if first is not _EMPTY:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    def warm_up(self):
+        """Создает клиентов всех провайдеров заранее (вызывается в потоке после старта)"""
+        for provider in self.providers:
+            provider.client
+
+    def stats(self):
+        return [p.stats() for p in self.providers]
+
+
+def _openai_client(api_key: str, base_url: str):
+    from openai import AsyncOpenAI
+    # Повторы делает ResilientCaller, поэтому встроенные повторы SDK отключены
+    return AsyncOpenAI(api_key=api_key, base_url=base_url or None, timeout=settings.LLM_TIMEOUT, max_retries=0)
+
+
+def _build_providers():
+    configured = {
+        "llama": (settings.LLAMA_API_KEY, settings.LLAMA_BASE_URL, settings.LLAMA_MODEL_NAME),
+        "gemini": (settings.GEMINI_API_KEY, settings.GEMINI_BASE_URL, settings.GEMINI_MODEL_NAME),
+    }
+    providers = []
+    for name in (n.strip() for n in settings.LLM_PROVIDERS.split(",")):
+        if name not in configured:
+            logger.warning(f"Unknown LLM provider in LLM_PROVIDERS: {name!r}")
+            continue
+        api_key, base_url, model = configured[name]
+        if not api_key:
+            continue
+        caller = ResilientCaller(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            timeout=settings.LLM_TIMEOUT,
+            max_retries=settings.LLM_MAX_RETRIES,
+            breaker=CircuitBreaker(settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_RESET, name=name),
+        )
+        providers.append(Provider(
+            name, partial(_openai_client, api_key, base_url), model, caller,
+            window=settings.LLM_ROUTER_WINDOW,
+            min_samples=settings.LLM_ROUTER_MIN_SAMPLES,
+            max_error_rate=settings.LLM_ROUTER_MAX_ERROR_RATE,
+        ))
+    if not providers:
+        logger.warning("No LLM provider is configured: set GEMINI_API_KEY or LLAMA_API_KEY")
+    return providers
+
+
+llm_router = LLMRouter(
+    _build_providers(),
+    hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    timeout=settings.LLM_TIMEOUT,
+)
@@ -1,79 +1,213 @@
+import asyncio
+import hmac
+import importlib
+import time
 import uuid
 import re
-import pandas as pd
-import io
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
 from fastapi import FastAPI, Request, Form, Response, Cookie
-from fastapi.responses import HTMLResponse, RedirectResponse # <-- Вот здесь было изменение
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse # <-- Вот здесь было изменение
 from fastapi.templating import Jinja2Templates
-from app.database import supabase
-from app.ai_service import evaluate_translation
+from app import repository as repo
+from app.attempt_writer import attempt_writer
+from app.catalog import catalog
+from app.config import settings
+from app.database import get_client
+from app.eval_cache import eval_cache
+from app.fragments import fragment_cache
+from app.assets import asset_manifest, StaticAssets, STATIC_DIR
+from app.compression import CompressionMiddleware
+from app.metrics import MetricsDirectory, MetricsMiddleware, registry
+from app.llm_router import llm_router
+from app.exam import ExamSubmission, grade_exam
+from app.progress import progress_store, MISTAKE_THRESHOLD
+from app.sessions import training_sessions, TRAINING_COOKIE, PASS_SCORE
+from app.answer_index import answer_index
+from app.triage import pre_scorer, GRADED_BY_LLM
+from app.auth import SESSION_COOKIE, issue_token, read_token, set_session_cookie, role_cache
+from app.ai_service import evaluate_translation, stream_evaluation
+from app.prompts import prompt_registry
+from app.streaming import sse_event
 from app.translations import UI_TEXTS, TARGET_LANG_NAMES
 from fastapi import UploadFile, File
 from fastapi import FastAPI, Form
 from app.ai_service import evaluate_translation
 
-app = FastAPI(title="FluentEdgeAI")
+def warm_up():
+    """
+    Загружает тяжелые модули и создает клиентов в потоке, когда воркер уже
+    принимает запросы: после масштабирования с нуля первая страница не ждет
+    импорта supabase, openai и pandas.
+    """
+    for name, load in (
+        ("supabase", get_client),
+        ("llm", llm_router.warm_up),
+        ("triage", pre_scorer.warm_up),
+        ("pandas", lambda: importlib.import_module("app.importer")),
+    ):
+        started = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            print(f"⚠️ Прогрев {name} не удался: {e}")
+            continue
+        print(f"🔥 Прогрев {name}: {time.perf_counter() - started:.2f} с")
+
+
+def log_warm_up_failure(task):
+    """Ошибка прогрева видна сразу, а не предупреждением asyncio при сборке мусора"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Прогрев упал: {task.exception()!r}")
+
+
+# Метрики всех воркеров gunicorn (app/metrics.py); без METRICS_DIR — только этого процесса
+metrics_directory = MetricsDirectory(settings.METRICS_DIR, registry) if settings.METRICS_DIR else None
+
+
+async def flush_metrics():
+    """Периодически сохраняет снимок метрик воркера: /metrics может отвечать другой воркер"""
+    while True:
+        await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(metrics_directory.write, registry.snapshot())
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить метрики: {e}")
+
+
+async def finish_warm_up(task):
+    """
+    Остановка: ждем прогрев (поток не прервать, и он не должен импортировать
+    модули параллельно с финальной записью попыток), но не дольше STARTUP_WARMUP_STOP_TIMEOUT.
+    """
+    done, _ = await asyncio.wait({task}, timeout=settings.STARTUP_WARMUP_STOP_TIMEOUT)
+    if not done:
+        print("⚠️ Прогрев не закончился к остановке, не ждем его")
+        task.cancel()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    attempt_writer.start()
+    # Ссылка на задачу нужна, чтобы ее не собрал сборщик мусора до завершения
+    warm_up_task = None
+    if settings.STARTUP_WARMUP:
+        warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+        warm_up_task.add_done_callback(log_warm_up_failure)
+    metrics_task = asyncio.create_task(flush_metrics()) if metrics_directory else None
+    yield
+    if warm_up_task is not None:
+        await finish_warm_up(warm_up_task)
+    if metrics_task is not None:
+        metrics_task.cancel()
+    # Незаписанные попытки уходят в БД (или в файл) до остановки процесса
+    await attempt_writer.drain()
+    if metrics_directory:
+        # Итог воркера (в том числе записанные при остановке попытки) остается в сумме
+        try:
+            metrics_directory.write(registry.snapshot())
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить метрики: {e}")
+
+app = FastAPI(title="FluentEdgeAI", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(CompressionMiddleware)
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["assets"] = asset_manifest
+# Собранные CSS и шрифты (assets/build.py); без сборки страницы берут их с CDN
+if asset_manifest.built:
+    app.mount("/static", StaticAssets(directory=STATIC_DIR), name="static")
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 
-def get_user_context(request: Request):
-    # ... (старый код получения user_id, lang, dir) ...
-    user_id = request.cookies.get("fluent_user_id")
-    if not user_id:
+async def get_user_context(request: Request):
+    # Личность и роль берем из подписанного токена — без запросов к БД
+    session = read_token(request.cookies.get(SESSION_COOKIE))
+    new_session = None
+    if session:
+        user_id = session["uid"]
+        is_auth = bool(session.get("auth"))
+        is_admin = bool(session.get("adm"))
+    else:
+        # Старой неподписанной куке fluent_user_id не доверяем: новый анонимный ID
         user_id = str(uuid.uuid4())
+        is_auth = is_admin = False
+        new_session = issue_token(user_id)
+
+    # Если роль недавно менялась в админке, кэш ролей свежее токена
+    if is_auth:
+        cached_role = role_cache.peek(user_id)
+        if cached_role is not None:
+            is_admin = cached_role
+
     lang = request.cookies.get("fluent_lang", "ru")
     direction = request.cookies.get("fluent_dir", "RU-EN")
-    is_auth = request.cookies.get("fluent_is_auth") == "true"
-    
-    # --- ДОБАВЛЕНО: Проверка админа (упрощенная) ---
-    # Чтобы не делать запрос к БД при каждом клике, можно пока просто вернуть False,
-    # а в /admin мы проверяем строго. Но для кнопки в меню сделаем запрос:
-    is_admin = False
-    if user_id and is_auth:
-         try:
-            # В реальном проекте лучше кэшировать это в куки, чтобы не нагружать базу
-            res = supabase.table("profiles").select("is_admin").eq("id", user_id).execute()
-            if res.data and res.data[0]['is_admin']:
-                is_admin = True
-         except:
-             pass
-    # -----------------------------------------------
 
     return {
         "user_id": user_id,
         "lang": lang,
         "dir": direction,
         "is_auth": is_auth,
-        "is_admin": is_admin, # <--- Не забудь добавить это в return
+        "is_admin": is_admin,
+        "new_session": new_session,
         "ui": UI_TEXTS.get(lang, UI_TEXTS["ru"])
     }
 
-def get_error_phrases(user_id):
+async def get_training_session(request: Request, ctx, key: str, build_queue):
     """
-    Возвращает список ID фраз, где ПОСЛЕДНЯЯ попытка была < 90 баллов.
-    Если пользователь исправил ошибку (сдал на 95), фраза сюда не попадет.
+    Возвращает (сессия, создана ли заново). Очередь фраз собирается через
+    build_queue() только при входе в тему или после изменения контента.
+
+    Сессия живет в памяти воркера. Если запрос попал в другой воркер, очередь
+    собирается заново — но сначала ждем, пока попытки пользователя из очередей
+    записи других воркеров дойдут до БД, иначе засчитанные фразы вернутся в очередь.
     """
-    # 1. Берем ВСЕ попытки пользователя, от новых к старым
-    attempts = supabase.table("user_attempts")\
-        .select("phrase_id, ai_score")\
-        .eq("user_id", user_id)\
-        .order("created_at", desc=True)\
-        .execute().data
-    
-    bad_phrase_ids = []
-    seen_phrases = set()
-
-    for a in attempts:
-        pid = a['phrase_id']
-        # Если мы эту фразу еще не проверяли (это самая свежая попытка)
-        if pid not in seen_phrases:
-            seen_phrases.add(pid)
-            # Если оценка ниже 90 - это ошибка
-            if a['ai_score'] < 90:
-                bad_phrase_ids.append(pid)
-    
-    return bad_phrase_ids
+    session = training_sessions.get(request.cookies.get(TRAINING_COOKIE))
+    if session and session.matches(ctx["user_id"], key, catalog.version):
+        return session, False
+
+    if not await attempt_writer.wait_saved_elsewhere(ctx["user_id"], settings.TRAINING_REBUILD_WAIT):
+        print(f"⚠️ Попытки {ctx['user_id']} из других воркеров еще не записаны, очередь собирается без них")
+    version = catalog.version
+    phrases = await build_queue()
+    if phrases is None:
+        return None, False
+    return training_sessions.create(ctx["user_id"], key, version, phrases), True
+
+def with_training_cookie(response, session, created: bool):
+    if created:
+        response.set_cookie(TRAINING_COOKIE, session.id, httponly=True, samesite="lax",
+                            secure=settings.SESSION_COOKIE_SECURE)
+    return response
+
+async def build_topic_queue(ctx, topic_slug: str):
+    """Очередь непройденных фраз темы по порядку (None, если темы нет)"""
+    topic = await catalog.topic_by_slug(topic_slug)
+    if not topic:
+        return None
+    completed_ids = set(await repo.list_completed_phrase_ids(ctx["user_id"], topic['id'], min_score=PASS_SCORE))
+    # Попытки, еще не записанные в БД, тоже считаются
+    completed_ids.update(r['phrase_id'] for r in attempt_writer.pending_for(ctx["user_id"]) if r['ai_score'] > PASS_SCORE)
+    return [p for p in await catalog.topic_phrases(topic['id']) if p['id'] not in completed_ids]
+
+async def build_mistakes_queue(ctx):
+    """Очередь ошибок; фразы, удаленные из базы, просто пропускаем"""
+    progress = await progress_store.get(ctx["user_id"])
+    phrases = [await catalog.phrase(pid) for pid in progress.failing_ids()]
+    return [p for p in phrases if p]
+
+async def prefetch_training_session(request: Request, ctx, topic_slug: str):
+    """
+    Сессия для следующего шага тренировки — собирается, пока идет проверка ответа.
+    Возвращает (сессия или None, создана ли заново).
+    """
+    try:
+        if topic_slug == "mistakes":
+            return await get_training_session(request, ctx, "mistakes", lambda: build_mistakes_queue(ctx))
+        return await get_training_session(request, ctx, f"topic:{topic_slug}", lambda: build_topic_queue(ctx, topic_slug))
+    except Exception as e:
+        print(f"Prefetch error: {e}")
+        return None, False
 
 # --- НАСТРОЙКИ И СБРОС ---
 
@@ -94,10 +228,12 @@ async def set_settings(request: Request, lang: str = None, direction: str = None
 @app.get("/reset_progress")
 async def reset_progress(request: Request):
     """Удаляет историю ответов пользователя"""
-    ctx = get_user_context(request)
+    ctx = await get_user_context(request)
     try:
-        # Удаляем записи из БД
-        supabase.table("user_attempts").delete().eq("user_id", ctx["user_id"]).execute()
+        # Удаляем записи из очереди записи и из БД
+        await attempt_writer.discard_user(ctx["user_id"])
+        await repo.delete_user_attempts(ctx["user_id"])
+        progress_store.reset(ctx["user_id"])
     except Exception as e:
         print(f"Reset error: {e}")
         
@@ -107,7 +243,7 @@ async def reset_progress(request: Request):
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
-    ctx = get_user_context(request)
+    ctx = await get_user_context(request)
     return templates.TemplateResponse("login.html", {"request": request, "ctx": ctx})
 
 @app.post("/auth_action")
@@ -124,7 +260,7 @@ async def auth_action(request: Request, email: str = Form(...), password: str =
     if len(password) < 6:
         return HTMLResponse("<h3>Ошибка: Пароль должен быть не менее 6 символов!</h3><a href='/login'>Назад</a>")
 
-    anon_id = request.cookies.get("fluent_user_id")
+    anon_id = (await get_user_context(request))["user_id"]
     
     # --- ИНИЦИАЛИЗАЦИЯ ПЕРЕМЕННЫХ (ВАЖНО!) ---
     user = None
@@ -135,7 +271,7 @@ async def auth_action(request: Request, email: str = Form(...), password: str =
 
     # 3. Попытка ВХОДА (Login)
     try:
-        res = supabase.auth.sign_in_with_password({"email": email, "password": password})
+        res = await repo.sign_in(email, password)
         if res.user:
             user = res.user
             print("✅ Успешный вход!")
@@ -157,11 +293,7 @@ async def auth_action(request: Request, email: str = Form(...), password: str =
     # 4. Попытка РЕГИСТРАЦИИ (Sign Up), если вход не удался
     if not user:
         try:
-            res = supabase.auth.sign_up({
-                "email": email, 
-                "password": password,
-                "options": {"data": {"full_name": "User"}} 
-            })
+            res = await repo.sign_up(email, password)
             
             if res.user and res.user.identities and len(res.user.identities) > 0:
                 user = res.user
@@ -180,101 +312,93 @@ async def auth_action(request: Request, email: str = Form(...), password: str =
 
     # 5. Профиль и Статистика
     try:
-        supabase.table("profiles").upsert({"id": user.id, "email": email}).execute()
+        await repo.upsert_profile(user.id, email)
         if anon_id and anon_id != user.id:
-            supabase.table("user_attempts").update({"user_id": user.id}).eq("user_id", anon_id).execute()
+            await attempt_writer.reassign(anon_id, user.id)
+            await repo.reassign_attempts(anon_id, user.id)
+            progress_store.forget(anon_id)
+            progress_store.forget(user.id)
     except Exception as e:
         print(f"⚠️ Ошибка БД (не критично): {e}")
 
-    # 6. Успех
+    # 6. Успех: выдаем подписанную сессию с ролью
+    try:
+        is_admin = await role_cache.is_admin(user.id)
+    except Exception as e:
+        print(f"⚠️ Не удалось получить роль: {e}")
+        is_admin = False
+
     response = RedirectResponse(url="/", status_code=302)
-    response.set_cookie("fluent_user_id", user.id)
-    response.set_cookie("fluent_is_auth", "true")
+    set_session_cookie(response, issue_token(user.id, is_auth=True, is_admin=is_admin))
+    response.delete_cookie("fluent_user_id")
+    response.delete_cookie("fluent_is_auth")
     
     return response
 
 @app.get("/logout")
 async def logout():
     response = RedirectResponse(url="/")
-    response.delete_cookie("fluent_is_auth")
     # Генерируем новый анонимный ID
-    response.set_cookie("fluent_user_id", str(uuid.uuid4()))
+    set_session_cookie(response, issue_token(str(uuid.uuid4())))
     return response
 
 # --- ОСНОВНЫЕ СТРАНИЦЫ ---
 
+async def render_topic_grid(lang: str):
+    """HTML сетки тем: рендерится один раз на загрузку структуры каталога и язык"""
+    levels = await catalog.levels_with_topics()
+    # Неизвестный язык из куки выглядит как английские названия с русским интерфейсом
+    lang = lang if lang in UI_TEXTS else ""
+    return fragment_cache.get(("topic_grid", lang), catalog.structure_serial, lambda: templates.get_template(
+        "topic_grid.html"
+    ).render(levels=levels, lang=lang, ui=UI_TEXTS.get(lang, UI_TEXTS["ru"])))
+
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
-    ctx = get_user_context(request)
-    
-    # 1. Загружаем Уровни (сортируем по порядку)
-    levels = supabase.table("levels").select("*").order("order_index").execute().data
+    ctx = await get_user_context(request)
     
-    # 2. Загружаем Темы
-    topics = supabase.table("topics").select("*").execute().data
-
-    # 3. Группировка: Вкладываем темы внутрь уровней
-    # Структура будет: levels = [ {..., "topics": [t1, t2]}, ... ]
-    levels_with_topics = []
-    for lvl in levels:
-        # Находим темы, которые принадлежат этому уровню
-        lvl_topics = [t for t in topics if t.get('level_id') == lvl['id']]
-        
-        # Добавляем уровень в список, только если в нем есть темы (чтобы не показывать пустые)
-        if lvl_topics:
-            lvl['topics'] = lvl_topics
-            levels_with_topics.append(lvl)
+    # 1. Сетка уровней и тем: общая для всех с этим языком, из кэша фрагментов
+    topic_grid = await render_topic_grid(ctx["lang"])
 
-    # 4. Статистика (без изменений)
-    attempts = supabase.table("user_attempts").select("ai_score").eq("user_id", ctx["user_id"]).execute().data
-    total = len(attempts)
-    avg = sum(a['ai_score'] for a in attempts) // total if total > 0 else 0
-    mistakes_count = len(get_error_phrases(ctx["user_id"]))
+    # 2. Статистика — единственное, что рендерится для каждого пользователя
+    progress = await progress_store.get(ctx["user_id"])
+    total = progress.count
+    avg = progress.avg
+    mistakes_count = progress.mistakes_count
 
     response = templates.TemplateResponse("base.html", {
         "request": request, 
-        "levels": levels_with_topics, # <--- ПЕРЕДАЕМ СГРУППИРОВАННЫЕ ДАННЫЕ
+        "topic_grid": topic_grid,
         "stats": {"total": total, "avg": avg},
         "mistakes_count": mistakes_count,
         "ctx": ctx
     })
     
-    if not request.cookies.get("fluent_user_id"):
-        response.set_cookie(key="fluent_user_id", value=ctx["user_id"])
+    if ctx["new_session"]:
+        set_session_cookie(response, ctx["new_session"])
         
     return response
 
 @app.get("/training/{topic_slug}", response_class=HTMLResponse)
 async def start_training(request: Request, topic_slug: str):
-    ctx = get_user_context(request)
+    ctx = await get_user_context(request)
     
     # Определяем направление (Source -> Target)
     # Например RU-EN: source='ru', target='en'
     source_lang, target_lang = ctx["dir"].split("-")
     
-    # 1. Тема
-    topic_res = supabase.table("topics").select("id").eq("slug", topic_slug).execute()
-    if not topic_res.data:
+    # Очередь фраз живет в сессии: следующие шаги не ходят в БД
+    session, created = await get_training_session(
+        request, ctx, f"topic:{topic_slug}", lambda: build_topic_queue(ctx, topic_slug)
+    )
+    if not session:
         return "Topic not found"
-    topic_id = topic_res.data[0]['id']
 
-    # 2. Пройденные фразы
-    completed_ids = [
-        x['phrase_id'] for x in 
-        supabase.table("user_attempts").select("phrase_id").eq("user_id", ctx["user_id"]).gt("ai_score", 40).execute().data
-    ]
-
-    # 3. Ищем следующую
-    phrases = supabase.table("phrases").select("*").eq("topic_id", topic_id).order("order_index").execute().data
-    
-    next_phrase = None
-    for p in phrases:
-        if p['id'] not in completed_ids:
-            next_phrase = p
-            break
+    next_phrase = session.peek()
     
     if not next_phrase:
-        return templates.TemplateResponse("congrats.html", {"request": request, "topic_slug": topic_slug, "ctx": ctx})
+        response = templates.TemplateResponse("congrats.html", {"request": request, "topic_slug": topic_slug, "ctx": ctx})
+        return with_training_cookie(response, session, created)
 
     # Выбираем текст вопроса в зависимости от направления
     # Если RU->EN, показываем text_ru. Если EN->UZ, показываем text_en
@@ -283,7 +407,7 @@ async def start_training(request: Request, topic_slug: str):
     # Красивое название целевого языка для заголовка
     target_lang_name = TARGET_LANG_NAMES[ctx["lang"]].get(target_lang, target_lang)
 
-    return templates.TemplateResponse("training.html", {
+    response = templates.TemplateResponse("training.html", {
         "request": request,
         "phrase": next_phrase,
         "question_text": question_text,
@@ -293,6 +417,75 @@ async def start_training(request: Request, topic_slug: str):
         "topic_slug": topic_slug,
         "ctx": ctx
     })
+    return with_training_cookie(response, session, created)
+
+async def get_reference(phrase_id: int, target_lang_code: str):
+    """
+    Эталонный перевод фразы на целевой язык: (текст, есть ли он в базе).
+    Бросает ValueError, если фразы нет.
+    """
+    # Нам нужно достать "эталонный" перевод, которого нет в форме
+    phrase_data = await catalog.phrase(phrase_id)
+    if not phrase_data:
+        raise ValueError("Phrase not found")
+
+    # ctx["dir"] выглядит как "ru-en", "en-uz" и т.д.
+    # Нам нужно понять, на какой язык переводим, чтобы взять нужное поле из базы.
+    target = target_lang_code.lower() # en, ru, или uz
+    reference_text = ""
+    if target in ("en", "ru", "uz"):
+        reference_text = phrase_data.get(f"text_{target}", "")
+
+    # Страховка, если вдруг поле пустое
+    if not reference_text:
+        return "Translation missing in database", False
+    return reference_text, True
+
+
+def next_mistake(session, progress):
+    """Первая фраза очереди ошибок, которая все еще ошибка (исправленные убираются)"""
+    next_phrase = session.peek()
+    while next_phrase and not progress.is_failing(next_phrase['id']):
+        session.complete(next_phrase['id'])
+        next_phrase = session.peek()
+    return next_phrase
+
+
+def question_text_for(phrase, ctx) -> str:
+    """Текст вопроса на исходном языке направления (RU-EN -> text_ru)"""
+    source_lang = ctx["dir"].split("-")[0]
+    return phrase.get(f"text_{source_lang.lower()}", "Error text")
+
+
+async def finish_check(ctx: dict, session, phrase_id: int, user_translation: str, topic_slug: str, ai_result: dict):
+    """
+    Учитывает попытку и продвигает очередь сессии. Запись в БД идет через
+    очередь отложенной записи, чтобы не задерживать ответ. Возвращает следующую фразу (или None).
+    """
+    progress_store.record(ctx["user_id"], phrase_id, ai_result['score'])
+    attempt_writer.submit({
+        "user_id": ctx["user_id"], 
+        "phrase_id": phrase_id,
+        "direction": ctx["dir"],
+        "user_translation": user_translation,
+        "ai_score": ai_result['score'],
+        "ai_feedback": ai_result['explanation'],
+        "ideal_translation": ai_result.get('ideal_translation', ''),
+        "graded_by": ai_result.get('graded_by', GRADED_BY_LLM)
+    })
+
+    if session is None:
+        return None
+    # Засчитанная фраза уходит из очереди сессии тренировки
+    if topic_slug == "mistakes":
+        if ai_result['score'] >= MISTAKE_THRESHOLD:
+            session.complete(phrase_id)
+        progress = await progress_store.get(ctx["user_id"])
+        return next_mistake(session, progress)
+    if ai_result['score'] > PASS_SCORE:
+        session.complete(phrase_id)
+    return session.peek()
+
 
 @app.post("/check", response_class=HTMLResponse)
 async def check_answer(
@@ -303,107 +496,175 @@ async def check_answer(
     target_lang_code: str = Form(...),
     topic_slug: str = Form(...)
 ):
-    ctx = get_user_context(request)
-    
-    # 1. ПОЛУЧАЕМ ФРАЗУ ИЗ БАЗЫ ДАННЫХ
-    # Нам нужно достать "эталонный" перевод, которого нет в форме
+    ctx = await get_user_context(request)
+
+    # Сессию для следующего шага готовим параллельно с проверкой
+    prefetch = asyncio.create_task(prefetch_training_session(request, ctx, topic_slug))
+
+    # 1. ПОЛУЧАЕМ ФРАЗУ И ЭТАЛОН (Reference)
     try:
-        response = supabase.table("phrases").select("*").eq("id", phrase_id).execute()
-        if not response.data:
-            raise ValueError("Phrase not found")
-        phrase_data = response.data[0]
+        reference_text, has_reference = await get_reference(phrase_id, target_lang_code)
     except Exception as e:
         print(f"DB Error: {e}")
+        prefetch.cancel()
         return HTMLResponse("Error fetching phrase", status_code=500)
 
-    # 2. ОПРЕДЕЛЯЕМ ЭТАЛОН (Reference)
-    # ctx["dir"] выглядит как "ru-en", "en-uz" и т.д.
-    # Нам нужно понять, на какой язык переводим, чтобы взять нужное поле из базы.
-    
-    target = target_lang_code.lower() # en, ru, или uz
-    reference_text = ""
-
-    if target == "en":
-        reference_text = phrase_data.get("text_en", "")
-    elif target == "ru":
-        reference_text = phrase_data.get("text_ru", "")
-    elif target == "uz":
-        reference_text = phrase_data.get("text_uz", "")
-    
-    # Страховка, если вдруг поле пустое
-    if not reference_text:
-        reference_text = "Translation missing in database"
-
-    # 3. ПРОВЕРКА AI (С НОВЫМ АРГУМЕНТОМ)
-    ai_result = await evaluate_translation(
-        original=original_text,
-        reference_translation=reference_text, # <--- ПЕРЕДАЕМ ЭТАЛОН
-        user_translation=user_translation,
-        direction=ctx["dir"], # Лучше передавать короткий код, например "ru-en"
-        interface_lang=ctx["lang"]
-    )
-
-    # Сохранение (без изменений)
-    try:
-        supabase.table("user_attempts").insert({
-            "user_id": ctx["user_id"], 
-            "phrase_id": phrase_id,
-            "direction": ctx["dir"],
-            "user_translation": user_translation,
-            "ai_score": ai_result['score'],
-            "ai_feedback": ai_result['explanation'],
-            "ideal_translation": ai_result['ideal_translation']
-        }).execute()
-    except Exception as e:
-        print(f"Save error: {e}")
+    # 2. ПРОВЕРКА: сначала локально (индекс принятых ответов, опечатки, явно неверный ответ),
+    # ИИ — только для неоднозначных ответов
+    direction = ctx["dir"]
+    ai_result = await pre_scorer.grade(phrase_id, direction, reference_text, user_translation, ctx["lang"]) if has_reference else None
+    if ai_result is None:
+        ai_result = await evaluate_translation(
+            original=original_text,
+            reference_translation=reference_text, # <--- ПЕРЕДАЕМ ЭТАЛОН
+            user_translation=user_translation,
+            direction=ctx["dir"], # Лучше передавать короткий код, например "ru-en"
+            interface_lang=ctx["lang"]
+        )
+        if has_reference and ai_result.get('score') == 100:
+            answer_index.add(phrase_id, direction, user_translation)
 
     # Для повторного отображения вопроса
     target_lang_name = TARGET_LANG_NAMES.get(ctx["lang"], {}).get(target_lang_code, target_lang_code)
-
-    return templates.TemplateResponse("training.html", {
+    session, created = await prefetch
+
+    # Проверка не удалась (ИИ недоступен) — это не ошибка ученика:
+    # ничего не сохраняем и предлагаем отправить ответ еще раз
+    if ai_result.get('failed'):
+        response = templates.TemplateResponse("training.html", {
+            "request": request,
+            "phrase": {"id": phrase_id},
+            "question_text": original_text,
+            "target_lang_code": target_lang_code,
+            "target_lang_name": target_lang_name,
+            "result": None,
+            "check_error": ctx["ui"]["check_failed"],
+            "user_input": user_translation,
+            "topic_slug": topic_slug,
+            "ctx": ctx
+        })
+        return with_training_cookie(response, session, created) if session else response
+
+    # 3. Учет попытки (запись в БД — в фоне) и следующая фраза из уже готовой сессии
+    next_phrase = await finish_check(ctx, session, phrase_id, user_translation, topic_slug, ai_result)
+
+    response = templates.TemplateResponse("training.html", {
         "request": request,
         "phrase": {"id": phrase_id},
         "question_text": original_text,
         "target_lang_code": target_lang_code,
         "target_lang_name": target_lang_name,
         "result": ai_result,
+        "next_question": question_text_for(next_phrase, ctx) if next_phrase else None,
         "user_input": user_translation,
         "topic_slug": topic_slug,
         "ctx": ctx
     })
+    return with_training_cookie(response, session, created) if session else response
+
+@app.post("/check_stream")
+async def check_answer_stream(
+    request: Request,
+    phrase_id: int = Form(...),
+    original_text: str = Form(...),
+    user_translation: str = Form(...),
+    target_lang_code: str = Form(...),
+    topic_slug: str = Form(...)
+):
+    """
+    Та же проверка, что и /check, но ответ идет потоком Server-Sent Events:
+    score — оценка, delta — куски объяснения, result — итог и текст следующего вопроса,
+    error — проверка не удалась, ответ не засчитан.
+    """
+    ctx = await get_user_context(request)
+    # Cookie сессии нужно отдать в заголовках, поэтому сессию дожидаемся до начала потока
+    try:
+        (reference_text, has_reference), (session, created) = await asyncio.gather(
+            get_reference(phrase_id, target_lang_code),
+            prefetch_training_session(request, ctx, topic_slug),
+        )
+    except Exception as e:
+        print(f"DB Error: {e}")
+        return HTMLResponse("Error fetching phrase", status_code=500)
+
+    direction = ctx["dir"]
+
+    async def events():
+        ai_result = await pre_scorer.grade(phrase_id, direction, reference_text, user_translation, ctx["lang"]) if has_reference else None
+        if ai_result is not None:
+            yield sse_event("score", {"score": ai_result["score"]})
+            yield sse_event("delta", {"text": ai_result["explanation"]})
+        else:
+            evaluation = stream_evaluation(
+                original=original_text,
+                reference_translation=reference_text,
+                user_translation=user_translation,
+                direction=direction,
+                interface_lang=ctx["lang"]
+            )
+            try:
+                async for kind, value in evaluation:
+                    if kind == "score":
+                        yield sse_event("score", {"score": value})
+                    elif kind == "delta":
+                        yield sse_event("delta", {"text": value})
+                    else:
+                        ai_result = value
+            finally:
+                await evaluation.aclose()
+            if has_reference and ai_result.get('score') == 100:
+                answer_index.add(phrase_id, direction, user_translation)
+
+        if ai_result.get('failed'):
+            yield sse_event("error", {"message": ctx["ui"]["check_failed"]})
+            return
+
+        next_phrase = await finish_check(ctx, session, phrase_id, user_translation, topic_slug, ai_result)
+        yield sse_event("result", {
+            **ai_result,
+            "next_question": question_text_for(next_phrase, ctx) if next_phrase else None
+        })
+
+    response = StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # чтобы прокси не копил поток
+    })
+    return with_training_cookie(response, session, created) if session else response
+
+@app.post("/api/exam/grade")
+async def grade_exam_answers(request: Request, submission: ExamSubmission):
+    """Проверка всех ответов экзамена за один запрос; результаты в порядке ответов"""
+    ctx = await get_user_context(request)
+    return await grade_exam(submission, ctx)
 
 @app.get("/mistakes", response_class=HTMLResponse)
 async def start_mistakes(request: Request):
     """Режим работы над ошибками"""
-    ctx = get_user_context(request)
+    ctx = await get_user_context(request)
     source_lang, target_lang = ctx["dir"].split("-")
 
-    # 1. Получаем список ID ошибок
-    error_ids = get_error_phrases(ctx["user_id"])
+    session, created = await get_training_session(request, ctx, "mistakes", lambda: build_mistakes_queue(ctx))
+    # После возможной пересборки: сводка уже с попытками из других воркеров
+    progress = await progress_store.get(ctx["user_id"])
 
-    # --- ИСПРАВЛЕНИЕ ЗДЕСЬ ---
-    if not error_ids:
-        # Если ошибок нет (или закончились), показываем страницу поздравления
-        return templates.TemplateResponse("congrats_mistakes.html", {"request": request, "ctx": ctx})
-    # -------------------------
+    # Ошибки, исправленные где-то еще, убираем из начала очереди
+    next_phrase = next_mistake(session, progress)
 
-    # 2. Берем первую ошибку
-    next_phrase_id = error_ids[0]
-    
-    # 3. Загружаем фразу
-    phrase_res = supabase.table("phrases").select("*").eq("id", next_phrase_id).execute()
-    
-    # Защита от случая, если фразу удалили из базы
-    if not phrase_res.data:
-        # Если фраза не найдена, рекурсивно пробуем следующую или выходим
-        return RedirectResponse("/mistakes")
+    # Очередь кончилась, но появились новые ошибки — собираем заново
+    if not next_phrase and progress.mistakes_count:
+        session = training_sessions.create(ctx["user_id"], "mistakes", catalog.version, await build_mistakes_queue(ctx))
+        created = True
+        next_phrase = session.peek()
 
-    next_phrase = phrase_res.data[0]
+    if not next_phrase:
+        # Если ошибок нет (или закончились), показываем страницу поздравления
+        response = templates.TemplateResponse("congrats_mistakes.html", {"request": request, "ctx": ctx})
+        return with_training_cookie(response, session, created)
 
     question_text = next_phrase.get(f"text_{source_lang.lower()}", "Error text")
     target_lang_name = TARGET_LANG_NAMES[ctx["lang"]].get(target_lang, target_lang)
 
-    return templates.TemplateResponse("training.html", {
+    response = templates.TemplateResponse("training.html", {
         "request": request,
         "phrase": next_phrase,
         "question_text": question_text,
@@ -413,59 +674,172 @@ async def start_mistakes(request: Request):
         "topic_slug": "mistakes", # Важно: маркер, что мы в режиме ошибок
         "ctx": ctx
     })
+    return with_training_cookie(response, session, created)
 
 # --- ADMIN PANEL ---
 
 async def check_admin(request: Request):
     """Проверяем, является ли текущий пользователь админом"""
-    user_id = request.cookies.get("fluent_user_id")
-    if not user_id:
+    session = read_token(request.cookies.get(SESSION_COOKIE))
+    if not session or not session.get("auth"):
         return False
     
     try:
-        # Запрашиваем поле is_admin из таблицы profiles
-        res = supabase.table("profiles").select("is_admin").eq("id", user_id).execute()
-        if res.data and res.data[0]['is_admin'] == True:
+        # Роль берется из короткоживущего кэша, в БД идем только при промахе
+        if await role_cache.is_admin(session["uid"]):
             return True
     except Exception as e:
         print(f"Admin check error: {e}")
     
     return False
 
+def _split_cursor(value: str):
+    """Курсор страницы вида "<поле>|<id>" -> (поле, id) или None"""
+    if not value or "|" not in value:
+        return None
+    first, last = value.rsplit("|", 1)
+    return first, last
+
+
+def _int_cursor(value: str):
+    """Курсор из двух целых "<order_index>|<id>"; испорченный вручную — None (первая страница)"""
+    parts = _split_cursor(value)
+    try:
+        return (int(parts[0]), int(parts[1])) if parts else None
+    except ValueError:
+        return None
+
+
+def _missing_column(error: Exception) -> bool:
+    """Ошибка PostgREST «нет такой колонки» (undefined_column), а не сбой БД"""
+    return getattr(error, "code", None) == "42703"
+
+
+def _page(rows, limit: int):
+    """Отрезает лишнюю строку запроса limit + 1: (строки страницы, есть ли следующая)"""
+    return rows[:limit], len(rows) > limit
+
+
+async def load_topics_page(limit: int, after_id: int = None, search: str = None):
+    try:
+        return await repo.list_topics_page(limit, after_id=after_id, search=search)
+    except Exception as e:
+        if not _missing_column(e):
+            raise
+        # Миграция 003 еще не применена — считаем фразы только для тем на странице
+        print(f"⚠️ topics.phrase_count недоступен, считаем через COUNT: {e}")
+        rows = await repo.list_topics_page(limit, after_id=after_id, search=search, with_counts=False)
+        counts = await asyncio.gather(*(repo.count_topic_phrases(t['id']) for t in rows[:limit]))
+        for t, count in zip(rows, counts):
+            t['phrase_count'] = count
+        return rows
+
+
 @app.get("/admin", response_class=HTMLResponse)
-@app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard(request: Request):
+async def admin_dashboard(
+    request: Request,
+    topic_q: str = "",
+    topics_after: int = None,
+    user_q: str = "",
+    users_after: str = ""
+):
     if not await check_admin(request): return RedirectResponse("/", status_code=302)
-    ctx = get_user_context(request)
-
-    # Загружаем данные
-    topics = supabase.table("topics").select("*").order("id").execute().data
-    levels = supabase.table("levels").select("id, slug").execute().data
-    phrases = supabase.table("phrases").select("topic_id").execute().data
-    
-    # НОВОЕ: Загружаем пользователей (последние 50)
-    users = supabase.table("profiles").select("*").order("created_at", desc=True).limit(50).execute().data
+    ctx = await get_user_context(request)
+    limit = settings.ADMIN_PAGE_SIZE
+    topic_q, user_q = topic_q.strip(), user_q.strip()
+
+    # Списки постраничные (keyset), числа фраз — из счетчика в topics;
+    # полный список тем для выпадающих меню берем из кэша каталога
+    levels, all_topics, topic_rows, user_rows = await asyncio.gather(
+        catalog.levels(),
+        catalog.topics(),
+        load_topics_page(limit, after_id=topics_after, search=topic_q or None),
+        repo.list_profiles_page(limit, after=_split_cursor(users_after), search=user_q or None),
+    )
+    topics, topics_more = _page(topic_rows, limit)
+    users, users_more = _page(user_rows, limit)
 
-    # ... (код с lvl_map и enriched_topics остается тем же) ...
-    # Просто скопируй старую логику обогащения тем сюда
     lvl_map = {l['id']: l['slug'].upper() for l in levels}
-    phrase_counts = {}
-    for p in phrases:
-        tid = p['topic_id']
-        phrase_counts[tid] = phrase_counts.get(tid, 0) + 1
-    enriched_topics = []
     for t in topics:
         t['level_slug'] = lvl_map.get(t.get('level_id'), '??')
-        t['count'] = phrase_counts.get(t['id'], 0)
-        enriched_topics.append(t)
+        t['count'] = t.get('phrase_count') or 0
+    topic_options = [
+        {"id": t['id'], "title_ru": t['title_ru'], "level_slug": lvl_map.get(t.get('level_id'), '??')}
+        for t in sorted(all_topics, key=lambda t: t['id'])
+    ]
+
+    # Ссылки "Далее" сохраняют состояние второго списка
+    state = {"topic_q": topic_q, "topics_after": topics_after or "", "user_q": user_q, "users_after": users_after}
+    def admin_url(**changes):
+        params = {k: v for k, v in {**state, **changes}.items() if v not in ("", None)}
+        return "/admin" + ("?" + urlencode(params) if params else "")
 
     return templates.TemplateResponse("admin.html", {
         "request": request,
         "ctx": ctx,
-        "topics": enriched_topics,
-        "users": users # <--- Передаем пользователей в шаблон
+        "topics": topics,
+        "topic_options": topic_options,
+        "users": users,
+        "topic_q": topic_q,
+        "user_q": user_q,
+        "topics_first_url": admin_url(topics_after="") if topics_after else None,
+        "topics_next_url": admin_url(topics_after=topics[-1]['id']) if topics_more else None,
+        "users_first_url": admin_url(users_after="") if users_after else None,
+        "users_next_url": admin_url(users_after=f"{users[-1]['created_at']}|{users[-1]['id']}") if users_more else None,
     })
 
+@app.get("/admin/eval_cache")
+async def admin_eval_cache_stats(request: Request):
+    """Счетчики кэша проверок ИИ: попадания, промахи и объединенные запросы"""
+    if not await check_admin(request): return RedirectResponse("/", status_code=302)
+    return eval_cache.stats()
+
+@app.get("/admin/prompts")
+async def admin_prompt_templates(request: Request):
+    """Шаблоны промптов проверки и оценка их размера в токенах"""
+    if not await check_admin(request): return RedirectResponse("/", status_code=302)
+    return prompt_registry.report()
+
+@app.get("/admin/llm")
+async def admin_llm_providers(request: Request):
+    """Провайдеры ИИ: состояние breaker, доля ошибок и задержки за окно статистики"""
+    if not await check_admin(request): return RedirectResponse("/", status_code=302)
+    return llm_router.stats()
+
+@app.get("/admin/triage")
+async def admin_triage_stats(request: Request):
+    """Сколько ответов оценено без ИИ: по решениям и доля от всех проверок"""
+    if not await check_admin(request): return RedirectResponse("/", status_code=302)
+    return pre_scorer.stats()
+
+# --- МЕТРИКИ ---
+
+registry.gauge("fluent_eval_cache", "Evaluation cache counters", lambda: {
+    (k,): v for k, v in eval_cache.stats().items()
+}, ("stat",))
+registry.gauge("fluent_fragment_cache", "Shared HTML fragment cache counters", lambda: {
+    (k,): v for k, v in fragment_cache.stats().items()
+}, ("stat",))
+registry.gauge("fluent_attempt_writer", "Attempt write-behind queue", lambda: {
+    (k,): v for k, v in attempt_writer.stats().items()
+}, ("stat",))
+registry.gauge("fluent_llm_breaker_open", "1 if the provider's circuit breaker is not closed", lambda: {
+    (p.name,): int(p.caller.breaker.state != "closed") for p in llm_router.providers
+}, ("provider",))
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Метрики в формате Prometheus; если задан METRICS_TOKEN — только с Bearer-токеном"""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get("authorization", ""), expected):
+            return Response(status_code=401)
+    if metrics_directory:
+        body = await asyncio.to_thread(metrics_directory.render, registry.snapshot())
+    else:
+        body = registry.render()
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/admin/add_phrase")
 async def admin_add_phrase(
     request: Request,
@@ -481,15 +855,16 @@ async def admin_add_phrase(
         return "Access Denied"
 
     try:
-        supabase.table("phrases").insert({
+        await repo.insert_phrases({
             "topic_id": topic_id,
             "text_ru": text_ru,
             "text_en": text_en,
             "text_uz": text_uz,
             "order_index": order_index
-        }).execute()
+        })
     except Exception as e:
         return f"Error adding phrase: {e}"
+    catalog.invalidate(topic_id)
 
     # Возвращаемся в админку
     return RedirectResponse("/admin", status_code=302)
@@ -514,10 +889,11 @@ async def admin_toggle_user(request: Request, user_id: str = Form(...), is_admin
     print(f"🔄 Смена прав для {user_id}: {current_status} -> {new_status}")
 
     try:
-        supabase.table("profiles").update({"is_admin": new_status}).eq("id", user_id).execute()
+        await repo.set_admin(user_id, new_status)
     except Exception as e:
         print(f"❌ Ошибка смены прав: {e}")
         return f"Error: {e}"
+    role_cache.set(user_id, new_status)
 
     return RedirectResponse("/admin", status_code=302)
 
@@ -526,7 +902,8 @@ async def admin_delete_user(request: Request, user_id: str = Form(...)):
     if not await check_admin(request): return "Access Denied"
     
     # Удаляем профиль (авторизация Supabase останется, но вход на сайт перестанет работать)
-    supabase.table("profiles").delete().eq("id", user_id).execute()
+    await repo.delete_profile(user_id)
+    role_cache.set(user_id, False)
     return RedirectResponse("/admin", status_code=302)
 
 # --- УПРАВЛЕНИЕ КОНТЕНТОМ (УДАЛЕНИЕ) ---
@@ -539,36 +916,53 @@ async def admin_delete_topic(request: Request, topic_id: int = Form(...)):
     
     try:
         # Благодаря SQL скрипту выше, это удалит и тему, и фразы
-        supabase.table("topics").delete().eq("id", topic_id).execute()
+        await repo.delete_topic(topic_id)
     except Exception as e:
         print(f"❌ Ошибка удаления темы: {e}")
         return f"Database Error: {e}"
+    catalog.invalidate()
 
     return RedirectResponse("/admin", status_code=302)
 
 @app.get("/admin/topic/{topic_id}", response_class=HTMLResponse)
-async def admin_topic_details(request: Request, topic_id: int):
-    """Страница управления фразами конкретной темы"""
+async def admin_topic_details(request: Request, topic_id: int, after: str = ""):
+    """Страница управления фразами конкретной темы (постранично)"""
     if not await check_admin(request): return RedirectResponse("/", status_code=302)
     
-    ctx = get_user_context(request)
-    
-    # Получаем тему и фразы
-    topic = supabase.table("topics").select("*").eq("id", topic_id).single().execute().data
-    phrases = supabase.table("phrases").select("*").eq("topic_id", topic_id).order("order_index").execute().data
+    ctx = await get_user_context(request)
+    limit = settings.ADMIN_PAGE_SIZE
+
+    # Получаем тему и одну страницу фраз
+    topic, rows = await asyncio.gather(
+        repo.get_topic(topic_id),
+        repo.list_topic_phrases_page(topic_id, limit, after=_int_cursor(after)),
+    )
+    if not topic:
+        return RedirectResponse("/admin", status_code=302)
+    phrases, more = _page(rows, limit)
+    if 'phrase_count' not in topic:
+        topic['phrase_count'] = await repo.count_topic_phrases(topic_id)
+
+    next_url = None
+    if more:
+        last = phrases[-1]
+        next_url = f"/admin/topic/{topic_id}?" + urlencode({"after": f"{last['order_index']}|{last['id']}"})
 
     return templates.TemplateResponse("admin_topic.html", {
         "request": request,
         "ctx": ctx,
         "topic": topic,
-        "phrases": phrases
+        "phrases": phrases,
+        "first_url": f"/admin/topic/{topic_id}" if after else None,
+        "next_url": next_url
     })
 
 @app.post("/admin/delete_phrase")
 async def admin_delete_phrase(request: Request, phrase_id: int = Form(...), topic_id: int = Form(...)):
     if not await check_admin(request): return "Access Denied"
     
-    supabase.table("phrases").delete().eq("id", phrase_id).execute()
+    await repo.delete_phrase(phrase_id)
+    catalog.invalidate(topic_id)
     # Возвращаем обратно на страницу темы
     return RedirectResponse(f"/admin/topic/{topic_id}", status_code=302)
 
@@ -576,59 +970,45 @@ async def admin_delete_phrase(request: Request, phrase_id: int = Form(...), topi
 async def admin_import_excel(
     request: Request,
     topic_id: int = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    mode: str = Form("append"),
+    dry_run: bool = Form(False)
 ):
-    """Импорт фраз из Excel файла"""
+    """Импорт фраз из Excel / CSV файла (в БД пишутся только изменения)"""
     
     # 1. Проверка админа
     if not await check_admin(request): 
         return "Access Denied"
 
+    # pandas грузится при первом импорте (обычно его уже загрузил прогрев), не блокируя event loop
+    importer = await asyncio.to_thread(importlib.import_module, "app.importer")
     try:
-        # 2. Читаем файл в Pandas DataFrame
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents))
-        
-        # 3. Приводим названия колонок к нижнему регистру (на всякий случай)
-        df.columns = [c.lower().strip() for c in df.columns]
-
-        # 4. Проверяем, есть ли нужные колонки
-        required_cols = ['text_ru', 'text_en', 'text_uz']
-        for col in required_cols:
-            if col not in df.columns:
-                return f"Ошибка: В Excel файле нет колонки '{col}'"
-
-        # 5. Подготовка данных для Supabase
-        phrases_to_insert = []
-        
-        # Определяем начальный order_index (чтобы добавлять в конец)
-        # Если в Excel есть колонка order_index, используем её, иначе авто
-        has_order = 'order_index' in df.columns
-        
-        current_index = 1
-        # Можно сделать запрос к БД, чтобы узнать последний индекс, но для простоты начнем с 1
-        
-        for _, row in df.iterrows():
-            phrase_data = {
-                "topic_id": topic_id,
-                "text_ru": str(row['text_ru']),
-                "text_en": str(row['text_en']),
-                "text_uz": str(row['text_uz']),
-                "order_index": int(row['order_index']) if has_order else current_index
-            }
-            phrases_to_insert.append(phrase_data)
-            current_index += 1
-
-        # 6. Массовая вставка в базу (Bulk Insert)
-        if phrases_to_insert:
-            supabase.table("phrases").insert(phrases_to_insert).execute()
-            print(f"✅ Успешно импортировано {len(phrases_to_insert)} фраз.")
-
+        # 2. Читаем файл по частям, сравниваем с темой и записываем дифф пачками
+        report = await importer.import_phrases(
+            file.file, file.filename, topic_id,
+            chunk_size=settings.IMPORT_CHUNK_SIZE,
+            batch_size=settings.IMPORT_BATCH_SIZE,
+            mode=mode,
+            dry_run=dry_run
+        )
+    except importer.ImportFormatError as e:
+        return f"Ошибка: {e}"
     except Exception as e:
         print(f"❌ Ошибка импорта: {e}")
         return f"Error importing file: {e}"
 
-    return RedirectResponse("/admin", status_code=302)
+    if report.changed:
+        catalog.invalidate(topic_id)
+    print(f"✅ Импорт ({mode}{', dry run' if dry_run else ''}): +{report.inserted} ~{report.updated} -{report.removed}, "
+          f"без изменений {report.unchanged}, ошибок {report.failed}.")
+
+    ctx = await get_user_context(request)
+    return templates.TemplateResponse("admin_import_report.html", {
+        "request": request,
+        "ctx": ctx,
+        "topic_id": topic_id,
+        "report": report
+    })
 
 #uvicorn app.main:app --reload
 #venv\Scripts\Activate.ps1
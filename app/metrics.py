@@ -0,0 +1,285 @@
+"""
+Метрики в текстовом формате Prometheus (/metrics).
+
+Счетчики и гистограммы живут в памяти процесса, обновление — несколько
+операций со словарем, поэтому сбор можно не выключать. Сторонних
+зависимостей нет: формат вывода простой, его генерирует render().
+
+Под gunicorn /metrics отвечает случайный воркер, поэтому каждый воркер
+сохраняет снимок своих метрик в общий каталог (METRICS_DIR, задает
+gunicorn.conf.py), а ответ складывает снимки всех воркеров. Снимки
+завершившихся воркеров остаются: счетчики суммы не убывают. Текущие
+значения (gauge) — только живых воркеров, с меткой pid.
+"""
+import bisect
+import glob
+import json
+import os
+import time
+
+# Границы гистограмм задержки (сек): от быстрых запросов к кэшу до долгих ответов ИИ
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}  # значения меток -> число
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        return [[list(values), count] for values, count in self._values.items()]
+
+    @staticmethod
+    def merge(total: dict, snapshot):
+        for values, count in snapshot:
+            key = tuple(values)
+            total[key] = total.get(key, 0) + count
+
+    def render(self, values=None):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, count in (self._values if values is None else values).items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {count}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счетчики по корзинам..., сумма, количество]
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        # Счетчик корзины, куда попало значение; накопительные суммы считаются при выводе
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def snapshot(self):
+        return [[list(values), series] for values, series in self._series.items()]
+
+    @staticmethod
+    def merge(total: dict, snapshot):
+        for values, series in snapshot:
+            key = tuple(values)
+            current = total.get(key)
+            total[key] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, series_by_labels=None):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, series in (self._series if series_by_labels is None else series_by_labels).items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _labels(self.label_names, values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _labels(self.label_names, values, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, values)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.label_names, values)} {series[-1]}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram: Histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []  # (имя, описание, функция -> {значения меток: число}, имена меток)
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, collect, labels=()):
+        """Значение считается в момент запроса /metrics: collect() -> {значения меток: число}"""
+        self._gauges.append((name, help_text, collect, tuple(labels)))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, collect, label_names in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for values, value in collect().items():
+                lines.append(f"{name}{_labels(label_names, values)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Метрики процесса в виде, пригодном для JSON (для MetricsDirectory)"""
+        return {
+            "metrics": {m.name: m.snapshot() for m in self._metrics},
+            "gauges": {
+                name: [[list(values), value] for values, value in collect().items()]
+                for name, _, collect, _ in self._gauges
+            },
+        }
+
+    def render_merged(self, snapshots) -> str:
+        """Сумма снимков нескольких процессов; snapshots — [(pid, снимок, жив ли процесс)]"""
+        lines = []
+        for metric in self._metrics:
+            total = {}
+            for _, snapshot, _ in snapshots:
+                metric.merge(total, snapshot["metrics"].get(metric.name, []))
+            lines.extend(metric.render(total))
+        for name, help_text, _, label_names in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for pid, snapshot, alive in snapshots:
+                if not alive:
+                    continue
+                for values, value in snapshot["gauges"].get(name, []):
+                    labels = _labels(label_names + ("pid",), tuple(values) + (pid,))
+                    lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsDirectory:
+    """
+    Снимки метрик воркеров: файл <pid>.json на воркер в общем каталоге.
+    Снимок (registry.snapshot()) берется в event loop, а write/render
+    работают с файлами и могут идти в потоке.
+    """
+
+    def __init__(self, path: str, registry: Registry):
+        self.path = path
+        self.registry = registry
+
+    def write(self, snapshot: dict):
+        """Сохраняет снимок этого процесса (атомарно: читатель не увидит половину файла)"""
+        target = os.path.join(self.path, f"{os.getpid()}.json")
+        tmp = f"{target}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, target)
+
+    def render(self, snapshot: dict) -> str:
+        """Свежий снимок своего процесса плюс последние снимки остальных"""
+        self.write(snapshot)
+        snapshots = []
+        for path in glob.glob(os.path.join(self.path, "*.json")):
+            pid = int(os.path.basename(path)[:-len(".json")])
+            try:
+                with open(path) as f:
+                    snapshots.append((pid, json.load(f), _alive(pid)))
+            except (OSError, ValueError):
+                continue  # файл удалили или перезаписывают — возьмем в следующий раз
+        return self.registry.render_merged(snapshots)
+
+
+registry = Registry()
+
+# --- HTTP ---
+http_request_seconds = registry.histogram(
+    "fluent_http_request_seconds", "Request latency by route", ("method", "route", "status"))
+
+# --- SUPABASE ---
+db_query_seconds = registry.histogram(
+    "fluent_db_query_seconds", "Supabase call latency by table and operation", ("table", "operation"))
+db_errors_total = registry.counter(
+    "fluent_db_errors_total", "Failed Supabase calls by table and operation", ("table", "operation"))
+
+# --- LLM ---
+llm_request_seconds = registry.histogram(
+    "fluent_llm_request_seconds", "LLM evaluation latency including retries", ("mode", "outcome"))
+llm_tokens_total = registry.counter(
+    "fluent_llm_tokens_total", "Tokens reported in response.usage", ("kind",))
+llm_errors_total = registry.counter(
+    "fluent_llm_errors_total", "LLM evaluation failures by kind", ("kind",))
+llm_retries_total = registry.counter(
+    "fluent_llm_retries_total", "LLM calls retried after a transient error")
+llm_json_errors_total = registry.counter(
+    "fluent_llm_json_parse_failures_total", "LLM answers that were not valid evaluation JSON")
+llm_provider_seconds = registry.histogram(
+    "fluent_llm_provider_seconds", "LLM call latency per provider (stream: time to first chunk)",
+    ("provider", "mode", "outcome"))
+llm_hedges_total = registry.counter(
+    "fluent_llm_hedges_total", "Hedged LLM requests by which request answered first", ("winner",))
+llm_fallbacks_total = registry.counter(
+    "fluent_llm_fallbacks_total", "LLM requests moved to the next provider after a failure", ("provider",))
+triage_total = registry.counter(
+    "fluent_triage_total", "Answers by local grading decision (llm = sent to the model)", ("decision",))
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время ответа по шаблону маршрута (/training/{topic_slug}), а не по URL"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Время до конца ответа — для потоковых ответов тоже
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.observe(time.perf_counter() - started, scope["method"], path, status[0])
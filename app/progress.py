@@ -0,0 +1,195 @@
+"""
+Сводка прогресса пользователя: число попыток, сумма баллов и фразы,
+последняя попытка по которым ниже порога (они идут в "Работу над ошибками").
+
+Сводка строится по истории один раз, дальше обновляется при каждой
+новой попытке — главная страница не перечитывает всю историю.
+Если история пользователя менялась в другом воркере (app/shared_state.py),
+сводка перечитывается.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+
+from app import repository as repo
+from app.attempt_writer import attempt_writer
+from app.config import settings
+from app.shared_state import progress_channel
+from app.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Оценка ниже порога считается ошибкой
+MISTAKE_THRESHOLD = 90
+
+
+class UserProgress:
+    __slots__ = ("count", "score_sum", "failing_count", "_failing")
+
+    def __init__(self):
+        self.count = 0
+        self.score_sum = 0
+        # Всего фраз с ошибкой; в _failing из них не больше PROGRESS_MAX_FAILING самых свежих
+        self.failing_count = 0
+        # phrase_id -> None; порядок вставки = порядок последних ошибок
+        self._failing = {}
+
+    @property
+    def avg(self) -> int:
+        return self.score_sum // self.count if self.count > 0 else 0
+
+    @property
+    def mistakes_count(self) -> int:
+        return self.failing_count
+
+    @property
+    def needs_reload(self) -> bool:
+        """Загруженные ошибки исправлены, но в БД есть еще — нужна следующая порция"""
+        return not self._failing and self.failing_count > 0
+
+    def is_failing(self, phrase_id: int) -> bool:
+        return phrase_id in self._failing
+
+    def failing_ids(self):
+        """ID фраз с ошибкой, от самой свежей к самой старой"""
+        return list(reversed(self._failing))
+
+    def apply(self, phrase_id: int, score: int):
+        self.count += 1
+        self.score_sum += score
+        # Про фразы вне загруженного списка неизвестно, были ли они ошибкой:
+        # считаем, что не были (счетчик уточнится при следующей загрузке)
+        listed = phrase_id in self._failing
+        self._failing.pop(phrase_id, None)
+        if score < MISTAKE_THRESHOLD:
+            self._failing[phrase_id] = None
+            if not listed:
+                self.failing_count += 1
+        elif listed:
+            self.failing_count -= 1
+
+    @classmethod
+    def from_stats(cls, stats: dict, failing_ids):
+        """Сводка из агрегатов БД; failing_ids — от свежих ошибок к старым"""
+        summary = cls()
+        summary.count = stats['attempts_count']
+        summary.score_sum = stats['score_sum']
+        summary._failing = dict.fromkeys(reversed(failing_ids))
+        # Список ограничен PROGRESS_MAX_FAILING, число — нет
+        summary.failing_count = max(stats['failing_count'], len(summary._failing))
+        return summary
+
+    @classmethod
+    def from_history(cls, attempts):
+        """attempts — попытки от новых к старым (phrase_id, ai_score)"""
+        summary = cls()
+        for a in reversed(attempts):
+            summary.apply(a['phrase_id'], a['ai_score'])
+        return summary
+
+
+class ProgressStore:
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._summaries = OrderedDict()  # user_id -> [UserProgress, поколение]; LRU
+        self._loading = SingleFlight()  # user_id -> загрузка сводки
+        self._dirty = set()  # пользователи, у которых были попытки во время загрузки
+
+    async def get(self, user_id: str) -> UserProgress:
+        entry = self._summaries.get(user_id)
+        if entry is not None:
+            if entry[1] == progress_channel.generation(user_id) and not entry[0].needs_reload:
+                self._summaries.move_to_end(user_id)
+                return entry[0]
+            # Попытки пользователя менялись в другом воркере (или пора загрузить следующие ошибки)
+            del self._summaries[user_id]
+
+        summary, _ = await self._loading.run(user_id, lambda: self._load_and_store(user_id))
+        return summary
+
+    async def _load_and_store(self, user_id: str) -> UserProgress:
+        self._dirty.discard(user_id)
+        generation = attempt_writer.generation
+        shared_generation = progress_channel.generation(user_id)
+        summary = await self._load(user_id)
+
+        # Если во время загрузки появились новые попытки или очередь записи
+        # что-то сбросила в БД, неясно, попали ли они в прочитанную историю —
+        # такую сводку не кэшируем
+        if attempt_writer.generation != generation or attempt_writer.has_inflight(user_id):
+            self._dirty.add(user_id)
+        if user_id not in self._dirty:
+            self._store(user_id, summary, shared_generation)
+        self._dirty.discard(user_id)
+        return summary
+
+    async def _load(self, user_id: str) -> UserProgress:
+        summary = await self._load_saved(user_id)
+        # Попытки, которые еще ждут записи в БД (app/attempt_writer.py)
+        for row in attempt_writer.pending_for(user_id):
+            summary.apply(row['phrase_id'], row['ai_score'])
+        return summary
+
+    async def _load_saved(self, user_id: str) -> UserProgress:
+        # Последняя попытка по каждой фразе считается в Postgres (migrations/001)
+        try:
+            stats, failing_ids = await asyncio.gather(
+                repo.get_progress_stats(user_id),
+                repo.list_failing_phrase_ids(user_id, limit=settings.PROGRESS_MAX_FAILING),
+            )
+            return UserProgress.from_stats(stats, failing_ids)
+        except Exception as e:
+            # Миграция еще не применена — считаем по полной истории, как раньше
+            logger.warning(f"Progress RPC failed, falling back to history scan: {e}")
+            return UserProgress.from_history(await repo.list_user_history(user_id))
+
+    def _store(self, user_id: str, summary: UserProgress, generation: int):
+        self._summaries[user_id] = [summary, generation]
+        self._summaries.move_to_end(user_id)
+        while len(self._summaries) > self.max_users:
+            self._summaries.popitem(last=False)
+
+    def _changed(self, user_id: str):
+        """
+        Сообщает другим воркерам, что история пользователя изменилась.
+        Своя сводка остается актуальной, если между делом ее не менял никто другой.
+        """
+        generation = progress_channel.bump(user_id)
+        entry = self._summaries.get(user_id)
+        if entry is None:
+            return
+        if entry[1] == generation - 1:
+            entry[1] = generation
+        else:
+            del self._summaries[user_id]
+
+    def record(self, user_id: str, phrase_id: int, score: int):
+        """Учитывает сохраненную попытку"""
+        if user_id in self._loading:
+            self._dirty.add(user_id)
+        entry = self._summaries.get(user_id)
+        if entry is not None:
+            entry[0].apply(phrase_id, score)
+        self._changed(user_id)
+
+    def written(self, user_ids):
+        """Очередь записи сохранила попытки в БД — другие воркеры теперь могут их прочитать"""
+        for user_id in user_ids:
+            self._changed(user_id)
+
+    def reset(self, user_id: str):
+        """История пользователя удалена"""
+        if user_id in self._loading:
+            self._dirty.add(user_id)
+        self._store(user_id, UserProgress(), progress_channel.bump(user_id))
+
+    def forget(self, user_id: str):
+        """История изменилась извне (например, перенесена при входе) — перечитать при следующем запросе"""
+        if user_id in self._loading:
+            self._dirty.add(user_id)
+        progress_channel.bump(user_id)
+        self._summaries.pop(user_id, None)
+
+
+progress_store = ProgressStore(max_users=settings.PROGRESS_MAX_USERS)
+attempt_writer.on_written(progress_store.written)
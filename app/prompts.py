@@ -0,0 +1,125 @@
+"""
+Промпты проверки перевода, собранные заранее для каждой пары
+(направление, язык интерфейса).
+
+Системный промпт статичен: сначала общая для всех пар часть (правила
+оценки и формат ответа), затем языки и язык объяснения. Данные ученика
+идут только в сообщение пользователя, поэтому у провайдера кэшируется
+весь системный промпт (prefix caching), а общая часть — между парами.
+
+Число токенов шаблона оценивается без токенизатора модели (для отчета
+и сравнения); точный расход виден в метрике fluent_llm_tokens_total.
+"""
+import re
+
+LANG_NAMES = {"en": "English", "uz": "Uzbek", "ru": "Russian"}
+
+# Направления из настроек (/set_settings) и языки интерфейса собираются при старте
+DIRECTIONS = ("RU-EN", "EN-RU", "UZ-EN", "EN-UZ")
+INTERFACE_LANGS = ("ru", "en", "uz")
+
+_COMMON = """You are a strict Language Examiner. Compare the Student's translation against the OFFICIAL REFERENCE from the user message.
+
+SCORING RULES:
+1. EXACT MATCH: Student == Reference (ignoring case/punctuation) -> score 100.
+2. SYNONYMS: valid synonyms (e.g. 'car' vs 'automobile') AND perfect grammar -> score 95-100. Mention that the Reference uses a different word but the Student is correct.
+3. GRAMMAR ERROR: meaning is close but grammar is wrong -> score 60-80.
+4. WRONG MEANING: Student says something totally different from the Reference -> score 0-40.
+
+Answer with one JSON object:
+{"score": integer 0-100, "deductions": "short summary of errors", "explanation": "string", "ideal_translation": "the OFFICIAL REFERENCE", "error_type": "None | Grammar | Vocabulary | Spelling | Critical"}
+"""
+
+_UZBEK_SOURCE_RULE = """The Uzbek word "U" means both "He" and "She". If the Reference uses "He" but the Student uses "She" (or vice versa), ACCEPT it as correct unless the context clearly defines the gender.
+"""
+
+_EXPLAIN = "Write 'explanation' in {language}.\n"
+
+_EXPLAIN_UZ = """Write 'explanation' in UZBEK (Latin script):
+- score 100: "Barakalla! Tarjima aniq."
+- score 90-99 (synonym): "To'g'ri: [Reference]. Izoh: Sizning varianingiz ham to'g'ri (sinonim)."
+- score < 90: "To'g'ri: [Reference]. Xato: [Explain error]."
+"""
+
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (BPE в среднем ~4 символа слова на токен)"""
+    return len(_TOKEN_RE.findall(text))
+
+
+class PromptTemplate:
+    __slots__ = ("direction", "interface_lang", "system", "user_template", "system_tokens")
+
+    def __init__(self, src: str, tgt: str, interface_lang: str):
+        self.direction = f"{src}-{tgt}".upper()
+        self.interface_lang = interface_lang
+        src_name, tgt_name = LANG_NAMES[src], LANG_NAMES[tgt]
+
+        parts = [_COMMON, f"\nSource language: {src_name}. Target language: {tgt_name}.\n"]
+        if src == "uz":
+            parts.append(_UZBEK_SOURCE_RULE)
+        parts.append(_EXPLAIN_UZ if interface_lang == "uz" else _EXPLAIN.format(language=LANG_NAMES[interface_lang]))
+        self.system = "".join(parts)
+        self.system_tokens = estimate_tokens(self.system)
+
+        # Подстановка через format: фигурные скобки в ответе ученика не разбираются
+        self.user_template = (
+            f'Original ({src_name}): "{{original}}"\n'
+            f'OFFICIAL REFERENCE ({tgt_name}): "{{reference}}"\n'
+            f'Student translation: "{{answer}}"'
+        )
+
+    def messages(self, original: str, reference_translation: str, user_translation: str):
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user_template.format(
+                original=original, reference=reference_translation, answer=user_translation
+            )},
+        ]
+
+
+class PromptRegistry:
+    def __init__(self):
+        self._exact = {}
+        self._templates = {}
+        # Точные значения из настроек — без разбора строки на каждом вызове
+        for direction in DIRECTIONS:
+            for interface_lang in INTERFACE_LANGS:
+                self._exact[direction, interface_lang] = self.get(direction, interface_lang)
+
+    @staticmethod
+    def _key(direction: str, interface_lang: str):
+        # Неизвестные значения (кука fluent_dir подделана) сводятся к известным:
+        # ключей не больше 3 * 3 * 3
+        parts = direction.lower().split("-")
+        src = parts[0] if parts[0] in LANG_NAMES else "ru"
+        tgt = parts[1] if len(parts) > 1 and parts[1] in LANG_NAMES else "en"
+        interface_lang = (interface_lang or "").lower()
+        return src, tgt, interface_lang if interface_lang in LANG_NAMES else "en"
+
+    def get(self, direction: str, interface_lang: str) -> PromptTemplate:
+        template = self._exact.get((direction, interface_lang))
+        if template is not None:
+            return template
+        key = self._key(direction, interface_lang)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = PromptTemplate(*key)
+        return template
+
+    def messages(self, original: str, reference_translation: str, user_translation: str, direction: str, interface_lang: str):
+        return self.get(direction, interface_lang).messages(original, reference_translation, user_translation)
+
+    def report(self):
+        """Размер системного промпта каждого шаблона"""
+        return [{
+            "direction": t.direction,
+            "interface_lang": t.interface_lang,
+            "chars": len(t.system),
+            "tokens_estimate": t.system_tokens,
+        } for t in self._templates.values()]
+
+
+prompt_registry = PromptRegistry()
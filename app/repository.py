@@ -0,0 +1,292 @@
+"""
+Асинхронный слой доступа к данным.
+Все запросы к Supabase из роутов идут через эти функции,
+сами запросы выполняются в пуле потоков (см. app.database.run_db),
+время и ошибки каждого запроса попадают в метрики (app/metrics.py).
+"""
+import time
+
+from app.database import get_client, run_db
+from app.metrics import db_query_seconds, db_errors_total
+
+# Строк на страницу при выгрузке всей темы: не больше max-rows PostgREST
+_PAGE_SIZE = 1000
+
+_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def _describe(query):
+    """(таблица, операция) запроса PostgREST — для метрик"""
+    request = getattr(query, "request", None)
+    http_method = getattr(request, "http_method", None)
+    path = getattr(getattr(request, "path", None), "path", None)
+    if http_method is None or not isinstance(path, str):
+        # Не построитель postgrest (например, заглушка в бенчмарке) — без разбивки в метриках
+        return "unknown", "unknown"
+    method = str(getattr(http_method, "value", http_method))
+    table = path.rsplit("/", 1)[-1]
+    if "/rpc/" in path:
+        return table, "rpc"
+    if method == "POST" and "resolution=" in request.headers.get("prefer", ""):
+        return table, "upsert"
+    return table, _OPERATIONS.get(method, method.lower())
+
+
+async def _timed(table: str, operation: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        return await run_db(fn, *args)
+    except Exception:
+        db_errors_total.inc(table, operation)
+        raise
+    finally:
+        db_query_seconds.observe(time.perf_counter() - started, table, operation)
+
+
+async def _run(query):
+    """Выполняет собранный запрос PostgREST (с учетом в метриках) и возвращает ответ"""
+    table, operation = _describe(query)
+    return await _timed(table, operation, query.execute)
+
+
+async def _execute(query):
+    """Выполняет собранный запрос PostgREST и возвращает data"""
+    res = await _run(query)
+    return res.data
+
+
+def _contains_pattern(text: str) -> str:
+    """Шаблон ilike для поиска подстроки (спецсимволы LIKE экранируются)"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _quote(value) -> str:
+    """Значение для фильтра or_(...) PostgREST в двойных кавычках"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+# --- ПРОФИЛИ ---
+
+async def get_is_admin(user_id: str) -> bool:
+    data = await _execute(get_client().table("profiles").select("is_admin").eq("id", user_id))
+    return bool(data and data[0]['is_admin'])
+
+
+async def upsert_profile(user_id: str, email: str):
+    return await _execute(get_client().table("profiles").upsert({"id": user_id, "email": email}))
+
+
+async def list_profiles_page(limit: int, after=None, search: str = None):
+    """
+    Страница пользователей от новых к старым (keyset по created_at, id).
+    after — (created_at, id) последней строки предыдущей страницы.
+    Возвращает до limit + 1 строк: лишняя строка означает, что есть следующая страница.
+    """
+    query = get_client().table("profiles").select("id, email, is_admin, created_at")
+    if search:
+        query = query.ilike("email", _contains_pattern(search))
+    if after:
+        created_at, user_id = (_quote(v) for v in after)
+        query = query.or_(f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{user_id})")
+    return await _execute(
+        query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+    )
+
+
+async def set_admin(user_id: str, is_admin: bool):
+    return await _execute(get_client().table("profiles").update({"is_admin": is_admin}).eq("id", user_id))
+
+
+async def delete_profile(user_id: str):
+    return await _execute(get_client().table("profiles").delete().eq("id", user_id))
+
+
+# --- АВТОРИЗАЦИЯ ---
+
+async def sign_in(email: str, password: str):
+    return await _timed("auth", "sign_in", get_client().auth.sign_in_with_password, {"email": email, "password": password})
+
+
+async def sign_up(email: str, password: str):
+    return await _timed("auth", "sign_up", get_client().auth.sign_up, {
+        "email": email,
+        "password": password,
+        "options": {"data": {"full_name": "User"}}
+    })
+
+
+# --- КОНТЕНТ ---
+
+async def list_levels():
+    return await _execute(get_client().table("levels").select("*").order("order_index"))
+
+
+async def list_topics(order_by: str = None):
+    query = get_client().table("topics").select("*")
+    if order_by:
+        query = query.order(order_by)
+    return await _execute(query)
+
+
+async def list_topics_page(limit: int, after_id: int = None, search: str = None, with_counts: bool = True):
+    """
+    Страница тем по id (keyset). Число фраз берется из topics.phrase_count (миграция 003).
+    Возвращает до limit + 1 строк: лишняя строка означает, что есть следующая страница.
+    """
+    columns = "id, slug, title_ru, level_id" + (", phrase_count" if with_counts else "")
+    query = get_client().table("topics").select(columns)
+    if search:
+        query = query.ilike("title_ru", _contains_pattern(search))
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    return await _execute(query.order("id").limit(limit + 1))
+
+
+async def get_topic(topic_id: int):
+    data = await _execute(get_client().table("topics").select("*").eq("id", topic_id))
+    return data[0] if data else None
+
+
+async def delete_topic(topic_id: int):
+    # Фразы удаляются каскадно на стороне БД
+    return await _execute(get_client().table("topics").delete().eq("id", topic_id))
+
+
+async def get_phrase(phrase_id: int):
+    data = await _execute(get_client().table("phrases").select("*").eq("id", phrase_id))
+    return data[0] if data else None
+
+
+async def list_phrases_by_ids(phrase_ids):
+    """Фразы по списку id одним запросом"""
+    return await _execute(get_client().table("phrases").select("*").in_("id", list(phrase_ids)))
+
+
+async def list_topic_phrases_page(topic_id: int, limit: int, after=None, columns: str = "*"):
+    """
+    Страница фраз темы (keyset по order_index, id), до limit + 1 строки.
+    after — (order_index, id) последней строки предыдущей страницы.
+    """
+    query = get_client().table("phrases").select(columns).eq("topic_id", topic_id)
+    if after:
+        order_index, phrase_id = after
+        query = query.or_(f"order_index.gt.{order_index},and(order_index.eq.{order_index},id.gt.{phrase_id})")
+    return await _execute(query.order("order_index").order("id").limit(limit + 1))
+
+
+async def list_all_topic_phrases(topic_id: int, columns: str = "*"):
+    """
+    Все фразы темы, страницами по keyset: один select PostgREST обрезает
+    до max-rows (на Supabase 1000 строк), и остаток темы был бы не виден.
+    """
+    rows, after = [], None
+    while True:
+        # limit + 1 = _PAGE_SIZE: страница не больше max-rows, иначе неполную не отличить от последней
+        page = await list_topic_phrases_page(topic_id, _PAGE_SIZE - 1, after, columns)
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        last = page[-1]
+        after = (last["order_index"], last["id"])
+
+
+async def count_topic_phrases(topic_id: int) -> int:
+    """Число фраз в теме через COUNT на стороне БД (без выгрузки строк)"""
+    query = get_client().table("phrases").select("id", count="exact", head=True).eq("topic_id", topic_id)
+    res = await _run(query)
+    return res.count or 0
+
+
+async def insert_phrases(rows):
+    return await _execute(get_client().table("phrases").insert(rows))
+
+
+async def delete_phrase(phrase_id: int):
+    return await _execute(get_client().table("phrases").delete().eq("id", phrase_id))
+
+
+async def upsert_phrases(rows):
+    """Обновляет фразы по id (строки должны содержать все обязательные колонки)"""
+    return await _execute(get_client().table("phrases").upsert(rows))
+
+
+async def delete_phrases(phrase_ids):
+    return await _execute(get_client().table("phrases").delete().in_("id", phrase_ids))
+
+
+# --- ПОПЫТКИ ПОЛЬЗОВАТЕЛЯ ---
+
+async def get_progress_stats(user_id: str):
+    """Число попыток, сумма баллов и число фраз с ошибкой (RPC user_progress_stats, миграция 001)"""
+    data = await _execute(get_client().rpc("user_progress_stats", {"p_user_id": user_id}))
+    return data[0] if data else {"attempts_count": 0, "score_sum": 0, "failing_count": 0}
+
+
+async def list_failing_phrase_ids(user_id: str, limit: int = 1000, offset: int = 0):
+    """ID фраз, где последняя попытка ниже порога, от свежих к старым (RPC failing_phrase_ids)"""
+    data = await _execute(get_client().rpc("failing_phrase_ids", {
+        "p_user_id": user_id, "p_limit": limit, "p_offset": offset
+    }))
+    return [x['phrase_id'] for x in data]
+
+
+async def list_user_history(user_id: str):
+    """Все попытки пользователя (phrase_id, ai_score), от новых к старым"""
+    return await _execute(
+        get_client().table("user_attempts")
+        .select("phrase_id, ai_score")
+        .eq("user_id", user_id)
+        .order("created_at", desc=True)
+    )
+
+
+async def list_completed_phrase_ids(user_id: str, topic_id: int, min_score: int = 40):
+    """ID фраз темы с попыткой выше min_score, без повторов (RPC completed_phrase_ids, миграция 005)"""
+    data = await _execute(get_client().rpc("completed_phrase_ids", {
+        "p_user_id": user_id, "p_topic_id": topic_id, "p_min_score": min_score
+    }))
+    return data or []
+
+
+async def list_perfect_answers(phrase_id: int, direction: str, limit: int = 500):
+    """Ответы, которые ИИ оценил на 100 баллов (для индекса принятых ответов)"""
+    data = await _execute(
+        get_client().table("user_attempts")
+        .select("user_translation")
+        .eq("phrase_id", phrase_id)
+        .eq("direction", direction)
+        .eq("ai_score", 100)
+        .limit(limit)
+    )
+    return [x['user_translation'] for x in data]
+
+
+async def list_recent_attempts(limit: int, direction: str = None, graded_by: str = None):
+    """Последние попытки с оценкой и текстом ответа (для сверки локальной оценки с ИИ)"""
+    query = (
+        get_client().table("user_attempts")
+        .select("phrase_id, direction, user_translation, ai_score, ai_feedback, graded_by")
+        .order("created_at", desc=True)
+        .limit(limit)
+    )
+    if direction:
+        query = query.eq("direction", direction)
+    if graded_by:
+        query = query.eq("graded_by", graded_by)
+    return await _execute(query)
+
+
+async def insert_attempts(rows):
+    """Несколько попыток одной вставкой"""
+    return await _execute(get_client().table("user_attempts").insert(rows))
+
+
+async def delete_user_attempts(user_id: str):
+    return await _execute(get_client().table("user_attempts").delete().eq("user_id", user_id))
+
+
+async def reassign_attempts(from_user_id: str, to_user_id: str):
+    return await _execute(
+        get_client().table("user_attempts").update({"user_id": to_user_id}).eq("user_id", from_user_id)
+    )
@@ -0,0 +1,213 @@
+"""
+Защита вызовов к ИИ-провайдеру: ограничение параллельных запросов,
+таймаут на вызов, повторы с экспоненциальной задержкой и circuit breaker.
+У каждого провайдера свои ограничения и breaker (см. app/llm_router.py).
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+
+from app.config import settings
+from app.metrics import llm_retries_total
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Провайдер недоступен: breaker открыт, запрос не отправляется"""
+
+
+class CircuitBreaker:
+    """
+    closed    — запросы идут как обычно;
+    open      — после failure_threshold ошибок подряд сразу отказываем;
+    half-open — через reset_timeout пропускаем один пробный запрос.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, name: str = "LLM"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release_probe(self):
+        """Пробный запрос отменен, не дав ответа"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"{self.name} circuit breaker opened")
+            self.opened_at = time.monotonic()
+
+
+def loaded_openai():
+    """
+    Модуль openai, если он уже загружен, иначе None. Грузится он вместе с клиентом
+    провайдера (app/llm_router.py), поэтому без него и ошибок openai быть не может,
+    а импортировать его ради isinstance — лишние доли секунды при старте.
+    """
+    return sys.modules.get("openai")
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    openai = loaded_openai()
+    if openai is None:
+        return False
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _provider_answered(error: Exception) -> bool:
+    """Ошибка — ответ провайдера (например, 4xx), а не сбой на нашей стороне"""
+    openai = loaded_openai()
+    return openai is not None and isinstance(error, openai.APIStatusError)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Пауза перед повтором: Retry-After от провайдера или экспонента с jitter"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), settings.LLM_RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    ceiling = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+class ResilientCaller:
+    def __init__(self, max_concurrency: int, timeout: float, max_retries: int, breaker: CircuitBreaker):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.breaker = breaker
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def call(self, make_request, max_retries: int = None):
+        """
+        Выполняет make_request() (корутину-фабрику) с ограничениями.
+        Бросает CircuitOpenError, если провайдер признан недоступным,
+        или последнюю ошибку, если повторы не помогли.
+        max_retries заменяет настройку (0 — есть другой провайдер, повторять незачем).
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM provider is unavailable")
+            try:
+                async with self._semaphore:
+                    result = await asyncio.wait_for(make_request(), timeout=self.timeout)
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    # Ответ с ошибкой запроса (4xx) значит, что провайдер жив; ошибка
+                    # в нашем коде (TypeError, разбор ответа) о нем ничего не говорит
+                    if _provider_answered(e):
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.release_probe()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                llm_retries_total.inc()
+                logger.warning(f"LLM call failed ({e!r}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def stream(self, make_request, max_retries: int = None):
+        """
+        Потоковый вариант call(): make_request() открывает поток ответа,
+        фрагменты отдаются по мере прихода. Повтор возможен только до первого
+        фрагмента; слот семафора занят, пока поток читается, а таймаут
+        действует на ожидание каждого следующего фрагмента.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM provider is unavailable")
+            started = False
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(make_request(), timeout=self.timeout)
+                    chunks = response.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                        except StopAsyncIteration:
+                            break
+                        started = True
+                        yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                # Читатель ушел: если ответ уже шел, провайдер здоров
+                if started:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    if started or _provider_answered(e):
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.release_probe()
+                    raise
+                self.breaker.record_failure()
+                if started or attempt >= max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                llm_retries_total.inc()
+                logger.warning(f"LLM stream failed ({e!r}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                if response is not None:
+                    await response.close()
+            self.breaker.record_success()
+            return
+
@@ -0,0 +1,79 @@
+"""
+Сессии тренировки: очередь оставшихся фраз темы (или ошибок) хранится на сервере.
+
+Очередь собирается один раз при входе в тему, дальше каждый шаг берет
+фразу из ее начала без запросов к БД. Сессия пересобирается, если
+контент поменялся (сменилась версия каталога) или она устарела.
+
+Сессии живут в памяти воркера, поэтому при нескольких воркерах нужна
+липкая маршрутизация (запросы пользователя — в один воркер). Без нее
+очередь пересобирается в другом воркере; перед этим он ждет записи
+незаписанных попыток пользователя из очередей других живых воркеров
+(не дольше TRAINING_REBUILD_WAIT; счетчики упавшего воркера не учитываются).
+"""
+import secrets
+import time
+from collections import OrderedDict
+
+from app.config import settings
+
+TRAINING_COOKIE = "fluent_training"
+
+# Фраза темы считается пройденной при оценке выше этого значения
+PASS_SCORE = 40
+
+
+class TrainingSession:
+    def __init__(self, session_id: str, user_id: str, key: str, catalog_version: int, phrases):
+        self.id = session_id
+        self.user_id = user_id
+        # "topic:<slug>" или "mistakes"
+        self.key = key
+        self.catalog_version = catalog_version
+        self._queue = OrderedDict((p['id'], p) for p in phrases)
+        self.touched_at = time.monotonic()
+
+    def peek(self):
+        """Следующая фраза или None, если очередь пуста"""
+        return next(iter(self._queue.values()), None)
+
+    def complete(self, phrase_id: int):
+        """Убирает фразу из очереди (ответ засчитан)"""
+        self._queue.pop(phrase_id, None)
+
+    def matches(self, user_id: str, key: str, catalog_version: int) -> bool:
+        return self.user_id == user_id and self.key == key and self.catalog_version == catalog_version
+
+
+class TrainingSessionStore:
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> TrainingSession; LRU
+
+    def get(self, session_id: str):
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            return None
+        if time.monotonic() - session.touched_at > self.ttl:
+            del self._sessions[session_id]
+            return None
+        session.touched_at = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def create(self, user_id: str, key: str, catalog_version: int, phrases, session_id: str = None) -> TrainingSession:
+        """Создает сессию (или заменяет существующую с тем же id)"""
+        session_id = session_id or secrets.token_urlsafe(16)
+        session = TrainingSession(session_id, user_id, key, catalog_version, phrases)
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+
+training_sessions = TrainingSessionStore(
+    ttl=settings.TRAINING_SESSION_TTL,
+    max_sessions=settings.TRAINING_MAX_SESSIONS,
+)
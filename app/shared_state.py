@@ -0,0 +1,224 @@
+"""
+Счетчики поколений, общие для всех воркеров gunicorn (инвалидация кэшей).
+
+Каждый воркер держит свои кэши в памяти: каталог контента, роли,
+сводки прогресса. Кэш запоминает поколение своего ключа при загрузке,
+а изменение увеличивает это поколение в общем файле (mmap, обычно
+в /dev/shm). Перед использованием записи кэш сравнивает номера —
+это одно чтение из памяти, без запросов по сети.
+
+Ключи раскладываются по фиксированному числу ячеек (crc32 % size):
+совпадение ячеек у разных ключей дает лишнюю перезагрузку, но не
+устаревшие данные. Без SHARED_STATE_PATH (один процесс, uvicorn --reload)
+счетчики живут в памяти процесса.
+
+Кроме поколений здесь же лежат счетчики с участком на каждый воркер
+(WorkerChannel): то, что воркер держит у себя в памяти, и что пропадает
+вместе с ним, если он упал.
+"""
+import logging
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: там только режим одного процесса
+    fcntl = None
+
+_COUNTER = struct.Struct("<Q")
+_MODULO = 1 << 64
+
+# Всего ячеек в файле; раскладка каналов одинакова во всех воркерах
+SLOTS = 32768
+# Сколько процессов одновременно могут держать свой участок WorkerChannel
+# (при HUP старые воркеры доживают рядом с новыми)
+MAX_WORKERS = 32
+
+
+def _signed(value: int) -> int:
+    return value - _MODULO if value >= _MODULO // 2 else value
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Channel:
+    """Группа ячеек для одного вида ключей (темы, пользователи...)"""
+
+    def __init__(self, state: "SharedState", offset: int, size: int):
+        self._state = state
+        self._offset = offset
+        self._size = size
+
+    def _slot(self, key) -> int:
+        if key is None:
+            return self._offset
+        if isinstance(key, int):
+            return self._offset + key % self._size
+        # hash() строк в каждом процессе свой, crc32 — одинаковый
+        return self._offset + zlib.crc32(str(key).encode()) % self._size
+
+    def generation(self, key=None) -> int:
+        return self._state.get(self._slot(key))
+
+    def bump(self, key=None) -> int:
+        """Отмечает изменение ключа; возвращает новое поколение его ячейки"""
+        return self._state.bump(self._slot(key))
+
+
+
+class WorkerChannel:
+    """
+    Счетчики по ключам, у каждого процесса — свой участок ячеек. Процесс
+    занимает участок при первой записи (свободный или оставшийся от умершего
+    процесса). Участки умерших процессов читатели пропускают, а мастер
+    gunicorn очищает их, когда воркер завершился (release).
+    """
+
+    def __init__(self, state: "SharedState", offset: int, size: int, max_workers: int):
+        self._state = state
+        self._owners = offset  # pid владельца каждого участка (0 — свободен)
+        self._regions = offset + max_workers
+        self._size = size
+        self._max_workers = max_workers
+        self._index = None
+        self._index_pid = None  # после fork участок родителя не наш
+
+    def _slot(self, index: int, key) -> int:
+        return self._regions + index * self._size + zlib.crc32(str(key).encode()) % self._size
+
+    def _clear(self, index: int):
+        self._state.set(self._owners + index, 0)
+        for slot in range(self._regions + index * self._size, self._regions + (index + 1) * self._size):
+            self._state.set(slot, 0)
+
+    def _own_index(self):
+        pid = os.getpid()
+        if self._index_pid == pid:
+            return self._index
+        with self._state.locked():
+            for index in range(self._max_workers):
+                owner = self._state.get(self._owners + index)
+                if owner == pid:
+                    break
+                if owner == 0 or not _alive(owner):
+                    self._clear(index)
+                    self._state.set(self._owners + index, pid)
+                    break
+            else:
+                index = None
+                logger.warning(f"No free worker slot in shared state (MAX_WORKERS={self._max_workers})")
+        self._index, self._index_pid = index, pid
+        return index
+
+    def add(self, key, delta: int):
+        """Прибавляет delta (может быть отрицательным) к счетчику ключа этого процесса"""
+        index = self._own_index()
+        if index is not None:
+            self._state.add(self._slot(index, key), delta)
+
+    def others(self, key) -> int:
+        """Сумма счетчиков ключа в других живых процессах"""
+        own = self._own_index()
+        total = 0
+        for index in range(self._max_workers):
+            owner = self._state.get(self._owners + index)
+            if index == own or owner == 0 or not _alive(owner):
+                continue
+            total += _signed(self._state.get(self._slot(index, key)))
+        return total
+
+    def release(self, pid: int):
+        """Процесс завершился: его счетчики больше не действуют"""
+        with self._state.locked():
+            for index in range(self._max_workers):
+                if self._state.get(self._owners + index) == pid:
+                    self._clear(index)
+
+
+class SharedState:
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.slots = slots
+        self._allocated = 0
+        self._fd = None
+        length = slots * _COUNTER.size
+        if path:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(self._fd).st_size < length:
+                os.ftruncate(self._fd, length)
+            self._buf = mmap.mmap(self._fd, length)
+        else:
+            self._buf = bytearray(length)
+
+    def channel(self, size: int = 1) -> Channel:
+        if self._allocated + size > self.slots:
+            raise ValueError("Shared state is full: increase SLOTS")
+        channel = Channel(self, self._allocated, size)
+        self._allocated += size
+        return channel
+
+    def worker_channel(self, size: int, max_workers: int = MAX_WORKERS) -> WorkerChannel:
+        if self._allocated + max_workers * (size + 1) > self.slots:
+            raise ValueError("Shared state is full: increase SLOTS")
+        channel = WorkerChannel(self, self._allocated, size, max_workers)
+        self._allocated += max_workers * (size + 1)
+        return channel
+
+    def get(self, slot: int) -> int:
+        return _COUNTER.unpack_from(self._buf, slot * _COUNTER.size)[0]
+
+    def bump(self, slot: int) -> int:
+        return self.add(slot, 1)
+
+    def set(self, slot: int, value: int):
+        """Запись без блокировки: только внутри locked()"""
+        _COUNTER.pack_into(self._buf, slot * _COUNTER.size, value % _MODULO)
+
+    @contextmanager
+    def locked(self):
+        # flock: два воркера не потеряют изменения друг друга
+        locked = self._fd is not None and fcntl is not None
+        if locked:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if locked:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def add(self, slot: int, delta: int) -> int:
+        with self.locked():
+            value = (self.get(slot) + delta) % _MODULO
+            self.set(slot, value)
+            return value
+
+
+shared_state = SharedState(settings.SHARED_STATE_PATH, SLOTS)
+
+# Любое изменение контента (версия каталога для сессий тренировки)
+content_channel = shared_state.channel()
+# Уровни и список тем
+structure_channel = shared_state.channel()
+# Фразы темы
+topic_channel = shared_state.channel(1024)
+# Роль пользователя
+role_channel = shared_state.channel(1024)
+# История попыток пользователя (сводка прогресса)
+progress_channel = shared_state.channel(8192)
+# Число незаписанных попыток пользователя в очереди каждого воркера
+unsaved_channel = shared_state.worker_channel(256)
@@ -0,0 +1,54 @@
+"""
+Объединение одновременных одинаковых загрузок (single-flight).
+
+Первый запрос по ключу выполняет загрузку, остальные ждут ее результат
+(или ее ошибку). Если первый запрос отменили — например, клиент отключился, —
+ждущие не получают чужую отмену: один из них выполняет загрузку заново.
+"""
+import asyncio
+
+
+class _Abandoned(Exception):
+    """Ведущий запрос отменен, не закончив загрузку"""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}  # key -> asyncio.Future
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key) -> bool:
+        """Идет ли сейчас загрузка по ключу"""
+        return key in self._inflight
+
+    async def run(self, key, load):
+        """(результат load(), получен ли он из чужой загрузки)"""
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                return await self._lead(key, load), False
+            try:
+                return await asyncio.shield(inflight), True
+            except _Abandoned:
+                continue
+
+    async def _lead(self, key, load):
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            # Отменен только этот запрос: ждущие повторят загрузку сами
+            future.set_exception(_Abandoned())
+            future.exception()  # чтобы asyncio не ругался, если ждущих нет
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        return result
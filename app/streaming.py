@@ -0,0 +1,96 @@
+"""
+Потоковая выдача оценки ИИ на страницу тренировки (Server-Sent Events).
+
+Модель отвечает JSON-объектом, который приходит по кусочкам. Парсер
+вынимает из еще неполного текста оценку (как только число дописано)
+и растущий текст explanation, чтобы показать их ученику до конца ответа.
+"""
+import json
+import re
+
+_SCORE_RE = re.compile(r'(?<!\\)"score"\s*:\s*(-?\d+)\s*[,}\s]')
+_EXPLANATION_RE = re.compile(r'(?<!\\)"explanation"\s*:\s*"')
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class FeedbackStreamParser:
+    """Разбирает поток JSON-ответа модели: feed(текст) -> список событий"""
+
+    def __init__(self):
+        self.text = ""
+        self.score = None
+        self.explanation = ""
+        self._pos = None  # позиция в text, до которой explanation уже разобран
+        self._explanation_done = False
+
+    def feed(self, delta: str):
+        """
+        Добавляет кусок ответа. Возвращает новые события:
+        ("score", int) — один раз; ("delta", str) — продолжение explanation.
+        """
+        self.text += delta
+        events = []
+
+        if self.score is None:
+            match = _SCORE_RE.search(self.text)
+            if match:
+                self.score = max(0, min(100, int(match.group(1))))
+                events.append(("score", self.score))
+
+        if not self._explanation_done:
+            if self._pos is None:
+                match = _EXPLANATION_RE.search(self.text)
+                if match:
+                    self._pos = match.end()
+            if self._pos is not None:
+                try:
+                    piece = self._read_string()
+                except ValueError:
+                    # Битое экранирование: дальше текст не стримим, итог придет целиком
+                    self._explanation_done = True
+                    piece = ""
+                if piece:
+                    self.explanation += piece
+                    events.append(("delta", piece))
+        return events
+
+    def _read_string(self) -> str:
+        """Декодирует строку JSON от _pos до конца буфера или закрывающей кавычки"""
+        text, i, out = self.text, self._pos, []
+        while i < len(text):
+            ch = text[i]
+            if ch == '"':
+                self._explanation_done = True
+                i += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                i += 1
+                continue
+            # Экранирование может прийти разрезанным между кусками — ждем продолжения
+            if i + 1 >= len(text):
+                break
+            code = text[i + 1]
+            if code == 'u':
+                if i + 6 > len(text):
+                    break
+                code_point, size = int(text[i + 2:i + 6], 16), 6
+                if 0xD800 <= code_point < 0xDC00:
+                    # Символ вне BMP (например, эмодзи) приходит суррогатной парой — ждем вторую половину
+                    if i + 12 > len(text):
+                        break
+                    low = int(text[i + 8:i + 12], 16)
+                    code_point, size = 0x10000 + ((code_point - 0xD800) << 10) + (low - 0xDC00), 12
+                out.append(chr(code_point))
+                i += size
+            else:
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
+def sse_event(event: str, data) -> str:
+    """Одно событие Server-Sent Events с данными в JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -27,7 +27,12 @@ UI_TEXTS = {
                 # ... старые ...
         "mistakes_cleared_title": "Ошибки исправлены!",
         "mistakes_cleared_msg": "Вы отлично поработали и закрыли все слабые места.",
-        "btn_home": "На главную"
+        "btn_home": "На главную",
+        "exact_match": "Отлично! Перевод точный.",
+        "typo_found": "Почти верно, но есть опечатка: {typos}.",
+        "wrong_meaning": "Перевод не передает смысл фразы. Сравните с эталоном.",
+        "wrong_language": "Ответ написан не на том языке. Переведите фразу на нужный язык.",
+        "check_failed": "Проверка сейчас недоступна. Ответ не засчитан — попробуйте отправить еще раз."
     },
     "en": {
         "nav_login": "Login",
@@ -55,7 +60,12 @@ UI_TEXTS = {
         "no_mistakes": "No mistakes! Good job!",
         "mistakes_cleared_title": "Mistakes Cleared!",
         "mistakes_cleared_msg": "Great job! You fixed all your weak points.",
-        "btn_home": "Back to Dashboard"
+        "btn_home": "Back to Dashboard",
+        "exact_match": "Perfect! The translation is exact.",
+        "typo_found": "Almost right, but there is a typo: {typos}.",
+        "wrong_meaning": "The translation does not convey the meaning of the phrase. Compare it with the reference.",
+        "wrong_language": "The answer is in the wrong language. Translate the phrase into the target language.",
+        "check_failed": "Checking is unavailable right now. Your answer was not scored — please try again."
     },
     "uz": {
         "nav_login": "Kirish",
@@ -83,7 +93,12 @@ UI_TEXTS = {
         "no_mistakes": "Xatolar yo'q! Ofarin!",
         "mistakes_cleared_title": "Xatolar tuzatildi!",
         "mistakes_cleared_msg": "Ajoyib! Barcha kamchiliklarni to'g'irladingiz.",
-        "btn_home": "Bosh sahifaga"
+        "btn_home": "Bosh sahifaga",
+        "exact_match": "Barakalla! Tarjima aniq.",
+        "typo_found": "Deyarli to'g'ri. Xato: imlo xatosi — {typos}.",
+        "wrong_meaning": "Xato: tarjima iboraning ma'nosini bermaydi. To'g'ri variant bilan solishtiring.",
+        "wrong_language": "Xato: javob boshqa tilda yozilgan. Iborani kerakli tilga tarjima qiling.",
+        "check_failed": "Tekshirish hozircha ishlamayapti. Javob hisobga olinmadi — qaytadan yuboring."
     }
 }
 
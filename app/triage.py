@@ -0,0 +1,233 @@
+"""
+Локальная оценка ответа до вызова ИИ (триаж).
+
+Большая часть ответов либо совпадает с принятым вариантом (индекс принятых
+ответов), либо отличается от него опечаткой, либо не имеет с ним ничего
+общего. Такие случаи оцениваются здесь, по расстоянию редактирования
+и пересечению слов с эталоном и другими принятыми вариантами; в ИИ уходят
+только неоднозначные ответы (синонимы, грамматика, частичный смысл).
+
+Пороги консервативные: если хоть одно условие не выполнено, решает ИИ.
+Опечатка — только слово, которого нет ни в словаре языка, ни в принятых
+вариантах: house вместо horse — другое слово, а не опечатка.
+Насколько оценки совпадают с ИИ, показывает bench/triage_replay.py.
+"""
+import logging
+import re
+from difflib import SequenceMatcher
+from typing import Optional
+
+from app.ai_service import EvaluationResponse, ErrorType
+from app.answer_index import answer_index, accepted_result, normalize_answer
+from app.config import settings
+from app.metrics import triage_total
+from app.translations import UI_TEXTS
+
+logger = logging.getLogger(__name__)
+
+_MIN_CONTENT_WORD = 4
+# Сравнение длинных текстов дорогое, а опечаток в них все равно не оценить надежно
+_MAX_LENGTH = 300
+
+_CYRILLIC_RE = re.compile(r"[\u0400-\u04ff]")
+_LATIN_RE = re.compile(r"[a-z]")
+# Письменность эталона, по которой ответ на другом языке виден сразу.
+# Узбекский пишут и латиницей, и кириллицей, поэтому его не проверяем
+_TARGET_SCRIPTS = {"en": _LATIN_RE, "ru": _CYRILLIC_RE}
+
+SPELLING_SCORE = 90
+WRONG_MEANING_SCORE = 10
+
+# Кто оценил попытку (колонка user_attempts.graded_by): текст объяснения
+# для этого не годится — exact_match совпадает с ответом ИИ на оценку 100
+GRADED_LOCALLY = "local"
+GRADED_BY_LLM = "llm"
+
+
+def typo_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна (перестановка соседних букв — одна правка); больше limit — limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class Vocabulary:
+    """Словари языков (файл по слову в строке), загружаются при первом обращении"""
+
+    def __init__(self, path_template: str):
+        self.path_template = path_template
+        self._words = {}
+
+    def words(self, lang: str):
+        """Множество нормализованных слов или None, если словаря нет"""
+        if lang not in self._words:
+            path = self.path_template.format(lang=lang)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._words[lang] = frozenset(
+                        w for line in f for w in normalize_answer(line).split()
+                    )
+            except FileNotFoundError:
+                logger.warning(f"No word list {path}: spelling of {lang} answers is left to the LLM")
+                self._words[lang] = None
+        return self._words[lang]
+
+
+def _is_typo(word: str, reference: str) -> bool:
+    shorter = min(len(word), len(reference))
+    # Короче — служебные слова и формы (a/an, is/are): их замена — это грамматика
+    if shorter < settings.TRIAGE_TYPO_MIN_WORD or word[0] != reference[0]:
+        return False
+    # Разница только в последних буквах (book/books, walk/walked, there/their) —
+    # это скорее грамматика или другое слово, пусть решает ИИ
+    common = 0
+    while common < shorter and word[common] == reference[common]:
+        common += 1
+    if common >= shorter - 2:
+        return False
+    limit = 1 if shorter < settings.TRIAGE_TYPO_LONG_WORD else 2
+    return typo_distance(word, reference, limit) <= limit
+
+
+def _typos(answer: str, variant: str, is_word):
+    """
+    Пары (слово ответа, слово варианта), если ответ отличается от варианта только опечатками.
+    Слово, для которого is_word(слово) истинно, — настоящее слово (возможно, с другим смыслом), а не опечатка.
+    """
+    words, variant_words = answer.split(), variant.split()
+    if len(words) != len(variant_words):
+        return None
+    typos = [(w, v) for w, v in zip(words, variant_words) if w != v]
+    if not typos or len(typos) > max(1, len(variant_words) // 5):
+        return None
+    if not all(not is_word(w) and _is_typo(w, v) for w, v in typos):
+        return None
+    return typos
+
+
+def _content_words(text: str):
+    return [w for w in text.split() if len(w) >= _MIN_CONTENT_WORD]
+
+
+def _shares_words(words, variant_words) -> bool:
+    for v in variant_words:
+        for w in words:
+            if w == v or SequenceMatcher(None, w, v).ratio() >= 0.75:
+                return True
+    return False
+
+
+def _unrelated(answer: str, variant: str) -> bool:
+    """Ответ не имеет с вариантом ни общих значимых слов, ни заметного сходства строк"""
+    variant_words = _content_words(variant)
+    if len(variant_words) < settings.TRIAGE_WRONG_MIN_WORDS:
+        return False
+    if _shares_words(_content_words(answer), variant_words):
+        return False
+    return SequenceMatcher(None, answer, variant).ratio() <= settings.TRIAGE_WRONG_MAX_SIMILARITY
+
+
+def _result(score: int, deductions: str, explanation: str, error_type: ErrorType, reference: str) -> dict:
+    # Тот же формат, что отдает ИИ
+    return EvaluationResponse(
+        score=score,
+        deductions=deductions,
+        explanation=explanation,
+        ideal_translation=reference,
+        error_type=error_type,
+    ).model_dump(mode="json")
+
+
+class PreScorer:
+    def __init__(self, enabled: bool, vocabulary: Vocabulary):
+        self.enabled = enabled
+        self.vocabulary = vocabulary
+        self.decisions = {"exact": 0, "spelling": 0, "wrong_language": 0, "wrong_meaning": 0, "llm": 0}
+
+    def warm_up(self):
+        """Загружает словари заранее, чтобы первая проверка не читала файл в event loop"""
+        if self.enabled and settings.TRIAGE_SPELLING_ENABLED:
+            for lang in ("en", "ru", "uz"):
+                self.vocabulary.words(lang)
+
+    def _count(self, decision: str):
+        self.decisions[decision] += 1
+        triage_total.inc(decision)
+
+    def classify(self, answer: str, accepted, reference: str, direction: str, interface_lang: str):
+        """
+        (решение, результат) без ИИ; решение "llm" и результат None — случай неоднозначный.
+        accepted — нормализованные принятые варианты (эталон и ответы на 100 баллов).
+        """
+        norm = normalize_answer(answer)
+        if not self.enabled or not norm or not accepted or len(norm) > _MAX_LENGTH:
+            return "llm", None
+        ui = UI_TEXTS.get(interface_lang, UI_TEXTS["ru"])
+
+        target_lang = direction.lower().split("-")[-1]
+        script = _TARGET_SCRIPTS.get(target_lang)
+        if script and script.search(normalize_answer(reference)) and not script.search(norm):
+            return "wrong_language", _result(0, "Wrong language", ui["wrong_language"], ErrorType.CRITICAL, reference)
+
+        variants = [v for v in accepted if len(v) <= _MAX_LENGTH]
+        dictionary = self.vocabulary.words(target_lang) if settings.TRIAGE_SPELLING_ENABLED else None
+        # Без словаря не отличить опечатку от другого слова — решает ИИ
+        variant_words = {w for v in accepted for w in v.split()}
+
+        def is_word(word):
+            return word in dictionary or word in variant_words
+
+        for variant in variants if dictionary is not None else ():
+            typos = _typos(norm, variant, is_word)
+            if typos:
+                listed = ", ".join(f"{w} → {v}" for w, v in typos)
+                return "spelling", _result(
+                    max(SPELLING_SCORE - 5 * (len(typos) - 1), 80), f"Spelling: {listed}",
+                    ui["typo_found"].format(typos=listed), ErrorType.SPELLING, reference,
+                )
+
+        if variants and all(_unrelated(norm, v) for v in variants):
+            return "wrong_meaning", _result(
+                WRONG_MEANING_SCORE, "Meaning differs from the reference",
+                ui["wrong_meaning"], ErrorType.CRITICAL, reference,
+            )
+        return "llm", None
+
+    async def grade(self, phrase_id: int, direction: str, reference: str, answer: str, interface_lang: str) -> Optional[dict]:
+        """Результат проверки без ИИ (индекс принятых ответов, затем триаж) или None — нужен ИИ"""
+        if await answer_index.is_accepted(phrase_id, direction, reference, answer):
+            self._count("exact")
+            result = accepted_result(reference, interface_lang)
+        else:
+            accepted = await answer_index.accepted_answers(phrase_id, direction, reference)
+            decision, result = self.classify(answer, accepted, reference, direction, interface_lang)
+            self._count(decision)
+        if result is not None:
+            result["graded_by"] = GRADED_LOCALLY
+        return result
+
+    def stats(self) -> dict:
+        total = sum(self.decisions.values())
+        # Доля ответов без ИИ: всего и среди тех, что не нашлись в индексе
+        local = total - self.decisions["llm"]
+        triaged = total - self.decisions["exact"]
+        return {
+            **self.decisions,
+            "handled_locally": round(local / total, 4) if total else 0.0,
+            "triaged_locally": round((local - self.decisions["exact"]) / triaged, 4) if triaged else 0.0,
+        }
+
+
+pre_scorer = PreScorer(enabled=settings.TRIAGE_ENABLED, vocabulary=Vocabulary(settings.TRIAGE_WORDLISTS))
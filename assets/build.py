@@ -0,0 +1,143 @@
+"""
+Сборка статики для продакшена: CSS только с используемыми классами Tailwind
+и шрифт Inter с нужными подмножествами символов — все со своего домена.
+
+  python assets/build.py [--tailwind tailwindcss] [--no-fonts]
+
+1. Шрифты: CSS Google Fonts для Inter 400/600/700 разбирается на @font-face
+   подмножеств latin, latin-ext и cyrillic (узбекская латиница и русский),
+   файлы woff2 сохраняются в static/dist/fonts.
+2. Tailwind CLI (standalone-бинарник, Node не нужен) собирает assets/app.css
+   по классам из templates/ и минифицирует результат.
+3. В имени каждого файла — хэш содержимого (app.3f2a9c1b04.css), рядом лежат
+   .gz и .br. static/dist/manifest.json связывает логические имена
+   с хэшированными; такие файлы не меняются и отдаются с Cache-Control:
+   immutable (app/assets.py). В Docker сборка идет отдельным этапом.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаем только gzip
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS = os.path.join(ROOT, "assets")
+DIST = os.path.join(ROOT, "static", "dist")
+URL_PREFIX = "/static/dist/"
+
+FONTS_CSS_URL = "https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap"
+FONT_SUBSETS = ("latin", "latin-ext", "cyrillic")
+# С современным User-Agent Google Fonts отдает woff2, разбитые по unicode-range
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+_FACE_RE = re.compile(r"/\* ([\w-]+) \*/\s*(@font-face\s*\{[^}]*\})")
+_URL_RE = re.compile(r"url\((https://[^)]+)\)")
+_WEIGHT_RE = re.compile(r"font-weight:\s*(\d+)")
+
+
+def _fetch(url: str) -> bytes:
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def _hashed_name(name: str, data: bytes) -> str:
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(name: str, data: bytes, manifest: dict, compress: bool) -> str:
+    """Сохраняет файл под хэшированным именем (и сжатые копии); возвращает его URL"""
+    hashed = _hashed_name(name, data)
+    path = os.path.join(DIST, hashed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if compress:
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+    manifest[name] = hashed
+    return URL_PREFIX + hashed
+
+
+def build_fonts(manifest: dict) -> str:
+    """@font-face нужных подмножеств Inter с адресами файлов на нашем домене"""
+    css = _fetch(FONTS_CSS_URL).decode()
+    downloaded = {}  # URL Google -> наш URL (у вариативного шрифта один файл на все начертания)
+    faces = []
+    for subset, face in _FACE_RE.findall(css):
+        if subset not in FONT_SUBSETS:
+            continue
+        weight = (_WEIGHT_RE.search(face) or [None, "400"])[1]
+
+        def local_url(match):
+            url = match.group(1)
+            if url not in downloaded:
+                name = f"fonts/inter-{subset}-{weight}.woff2"
+                downloaded[url] = _write(name, _fetch(url), manifest, compress=False)
+            return f"url({downloaded[url]})"
+
+        faces.append(f"/* {subset} */\n" + _URL_RE.sub(local_url, face))
+    if not faces:
+        raise SystemExit(f"No {', '.join(FONT_SUBSETS)} faces in {FONTS_CSS_URL}")
+    return "\n".join(faces) + "\n"
+
+
+def build_css(tailwind: str, fonts_css: str) -> bytes:
+    with open(os.path.join(ASSETS, "app.css"), encoding="utf-8") as f:
+        source_css = fonts_css + f.read()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "app.css")
+        output = os.path.join(tmp, "app.min.css")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write(source_css)
+        # Пути content в конфиге считаются от корня проекта
+        subprocess.run([
+            tailwind, "-c", os.path.join(ASSETS, "tailwind.config.js"),
+            "-i", source, "-o", output, "--minify",
+        ], cwd=ROOT, check=True)
+        with open(output, "rb") as f:
+            return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build hashed, compressed CSS and font files into static/dist")
+    parser.add_argument("--tailwind", default=os.environ.get("TAILWIND_BIN", "tailwindcss"),
+                        help="Tailwind CLI executable (standalone binary)")
+    parser.add_argument("--no-fonts", action="store_true", help="skip downloading Inter (system fonts only)")
+    args = parser.parse_args()
+
+    # Старые хэшированные файлы не нужны: манифест собирается заново
+    shutil.rmtree(DIST, ignore_errors=True)
+    os.makedirs(DIST)
+
+    manifest = {}
+    fonts_css = "" if args.no_fonts else build_fonts(manifest)
+    css = build_css(args.tailwind, fonts_css)
+    _write("app.css", css, manifest, compress=True)
+
+    with open(os.path.join(DIST, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    for name, hashed in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(DIST, hashed))
+        compressed = [f"{ext[1:]} {os.path.getsize(os.path.join(DIST, hashed + ext)) / 1024:.1f} KiB"
+                      for ext in (".gz", ".br") if os.path.exists(os.path.join(DIST, hashed + ext))]
+        print(f"{hashed:<44}{size / 1024:>8.1f} KiB  {', '.join(compressed)}")
+
+
+if __name__ == "__main__":
+    main()
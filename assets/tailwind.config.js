@@ -0,0 +1,15 @@
+// Конфигурация Tailwind для сборки CSS (python assets/build.py).
+// Классы ищутся во всех шаблонах, включая строки в <script> (classList.add('...')),
+// поэтому имена классов в коде пишем целиком, без склейки из частей.
+const defaultTheme = require('tailwindcss/defaultTheme')
+
+module.exports = {
+  content: ['./templates/**/*.html'],
+  theme: {
+    extend: {
+      fontFamily: {
+        sans: ['Inter', ...defaultTheme.fontFamily.sans],
+      },
+    },
+  },
+}
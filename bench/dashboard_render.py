@@ -0,0 +1,84 @@
+"""
+Микробенчмарк рендера главной страницы: время на один запрос.
+
+  before - группировка тем вложенным проходом (уровни x темы) и рендер всей
+           страницы вместе с сеткой тем на каждый запрос (как было раньше)
+  after  - сгруппированные уровни из каталога и готовая сетка из кэша
+           фрагментов; на запрос рендерятся только навигация и статистика
+
+Каталог синтетический, БД не нужна.
+
+Запуск:  python -m bench.dashboard_render [--levels 6] [--topics 300] [--requests 2000]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+
+from app.catalog import catalog
+from app.main import render_topic_grid, templates
+from app.translations import UI_TEXTS
+
+LANGS = ("ru", "en", "uz")
+
+
+def make_catalog(levels: int, topics: int):
+    level_rows = [{"id": i, "slug": f"l{i}", "title": f"Level {i}", "order_index": i} for i in range(1, levels + 1)]
+    topic_rows = [{
+        "id": t, "slug": f"topic-{t}", "level_id": 1 + t % levels,
+        "title_ru": f"Тема {t}", "title_en": f"Topic {t}", "title_uz": f"Mavzu {t}",
+    } for t in range(topics)]
+    catalog._set_structure(level_rows, topic_rows, generation=0, cache=True)
+    return level_rows, topic_rows
+
+
+def page_context(lang: str) -> dict:
+    ctx = {"lang": lang, "ui": UI_TEXTS[lang], "dir": "RU-EN", "is_auth": True, "is_admin": False}
+    return {"ctx": ctx, "stats": {"total": 120, "avg": 87}, "mistakes_count": 3}
+
+
+async def before(levels, topics, lang: str) -> str:
+    grouped = []
+    for lvl in levels:
+        lvl_topics = [t for t in topics if t.get('level_id') == lvl['id']]
+        if lvl_topics:
+            grouped.append({**lvl, 'topics': lvl_topics})
+    grid = templates.get_template("topic_grid.html").render(levels=grouped, lang=lang, ui=UI_TEXTS[lang])
+    return templates.get_template("base.html").render(topic_grid=grid, **page_context(lang))
+
+
+async def after(levels, topics, lang: str) -> str:
+    grid = await render_topic_grid(lang)
+    return templates.get_template("base.html").render(topic_grid=grid, **page_context(lang))
+
+
+async def measure(render, levels, topics, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        await render(levels, topics, LANGS[i % len(LANGS)])
+    return (time.perf_counter() - started) / requests
+
+
+async def run(args):
+    levels, topics = make_catalog(args.levels, args.topics)
+    size = len(await after(levels, topics, "ru"))
+    print(f"{args.levels} levels, {args.topics} topics, page {size / 1024:.0f} KiB, {args.requests} requests")
+    for name, render in (("before", before), ("after", after)):
+        seconds = await measure(render, levels, topics, args.requests)
+        print(f"{name:<7}{seconds * 1e6:>10.0f} us per request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard render time per request")
+    parser.add_argument("--levels", type=int, default=6)
+    parser.add_argument("--topics", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
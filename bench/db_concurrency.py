@@ -0,0 +1,91 @@
+"""
+Бенчмарк: сколько запросов в секунду выдерживает один воркер,
+когда каждый запрос к Supabase занимает DB_LATENCY секунд.
+
+  before - запросы выполняются прямо в event loop (как было раньше)
+  after  - запросы уходят в пул потоков через app.database.run_db
+
+Нагрузка — страница темы в админке (/admin/topic/1): тема и страница фраз
+читаются из БД на каждый запрос. Главная (/) теперь почти всегда отдается
+из кэшей и пул потоков не нагружает.
+
+Запуск:  python -m bench.db_concurrency [concurrency] [requests]
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+
+import httpx
+from app import repository
+from app.auth import SESSION_COOKIE, issue_token
+from app.main import app
+
+DB_LATENCY = float(os.environ.get("DB_LATENCY", "0.02"))
+
+
+# Одна строка на любой запрос: годится и как профиль админа, и как тема, и как фраза
+ROW = {
+    "id": 1, "is_admin": True, "title": "Bench", "slug": "bench", "level_id": 1, "phrase_count": 1,
+    "order_index": 1, "text_ru": "Привет", "text_en": "Hello", "text_uz": "Salom",
+}
+
+
+class SlowQuery:
+    """Заглушка построителя запросов PostgREST: любой вызов цепочки возвращает себя"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(DB_LATENCY)  # имитируем сетевой round-trip
+        return SimpleNamespace(data=[dict(ROW)], count=1)
+
+
+async def _inline_run_db(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+async def measure(concurrency: int, total: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(concurrency)
+
+    cookies = {SESSION_COOKIE: issue_token("bench-admin", is_auth=True, is_admin=True)}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies=cookies) as client:
+        async def one():
+            async with sem:
+                r = await client.get("/admin/topic/1")
+                r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    slow_client = SlowQuery()
+    repository.get_client = lambda: slow_client
+    real_run_db = repository.run_db
+
+    repository.run_db = _inline_run_db
+    before = asyncio.run(measure(concurrency, total))
+
+    repository.run_db = real_run_db
+    after = asyncio.run(measure(concurrency, total))
+
+    print(f"DB latency {DB_LATENCY * 1000:.0f} ms, concurrency {concurrency}, {total} requests to /admin/topic/1")
+    print(f"  before (blocking): {before:8.1f} req/s")
+    print(f"  after  (pool):     {after:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
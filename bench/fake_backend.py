@@ -0,0 +1,606 @@
+"""
+Локальная замена Supabase и LLM-провайдера для нагрузочных тестов.
+
+Один HTTP-сервер отдает:
+  /rest/v1/...          - PostgREST в памяти: таблицы levels, topics, phrases,
+                          profiles, user_attempts и RPC из миграций 001 и 005
+  /v1/chat/completions  - OpenAI-совместимый чат (обычный и потоковый ответ)
+                          с настраиваемой задержкой и долей ошибок (провайдер llama)
+  /gemini/v1beta/openai/chat/completions
+                        - то же для провайдера gemini, со своими задержкой и ошибками
+  /bench/llm/{provider} - PATCH {"latency", "jitter", "error_rate"}: изменить
+                          поведение провайдера на ходу (замедление, авария)
+
+Поддерживается ровно то подмножество PostgREST, которым пользуется
+app/repository.py: select колонок, фильтры eq/neq/gt/gte/lt/lte/in/ilike/like/is,
+or=(...) с вложенными and(...), order, limit/offset, count=exact (в том числе HEAD),
+insert, upsert (resolution=merge-duplicates), update и delete.
+Как и Supabase, select и RPC отдают не больше --max-rows строк (1000):
+запрос без пагинации молча теряет остаток.
+
+Запуск:  python -m bench.fake_backend --port 8765 [--db-latency 0.005] [--llm-latency 0.4]
+Приложение направляется сюда переменными окружения:
+  SUPABASE_URL=http://127.0.0.1:8765  LLAMA_API_KEY=bench  LLAMA_BASE_URL=http://127.0.0.1:8765/v1
+  GEMINI_API_KEY=bench  GEMINI_BASE_URL=http://127.0.0.1:8765/gemini/v1beta/openai/
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+# Администратор из начальных данных: под ним нагрузочный тест ходит в админку
+ADMIN_USER_ID = "00000000-0000-0000-0000-00000000adad"
+# Тема, в которую сценарий админа импортирует файл (ученики ее не проходят)
+IMPORT_TOPIC_ID = 1_000_000
+IMPORT_TOPIC_SLUG = "bench-import"
+
+LEVELS = [("a1", "A1 Beginner"), ("a2", "A2 Elementary"), ("b1", "B1 Intermediate")]
+
+# Параметры запросов PostgREST, которые не являются фильтрами
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class LLMProfile:
+    def __init__(self, latency: float = 0.4, jitter: float = 0.2, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+
+class Config:
+    db_latency = 0.0
+    # db-max-rows PostgREST: больше строк один ответ не содержит (0 — без предела)
+    max_rows = 1000
+    llm_chunks = 12
+    llm_fail_ratio = 0.3
+
+    def __init__(self):
+        self.llm = {"llama": LLMProfile(), "gemini": LLMProfile()}
+
+
+config = Config()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- ДАННЫЕ ---
+
+class Database:
+    # Значения по умолчанию, которые в настоящей БД проставляет Postgres
+    DEFAULTS = {
+        "profiles": lambda: {"is_admin": False, "created_at": _now()},
+        "user_attempts": lambda: {"created_at": _now()},
+        "phrases": lambda: {"order_index": 0, "content_hash": None},
+    }
+    REQUIRED = {
+        "profiles": ("id",),
+        "phrases": ("topic_id",),
+        "user_attempts": ("user_id", "phrase_id", "ai_score"),
+    }
+
+    def __init__(self):
+        self.tables = {name: [] for name in ("levels", "topics", "phrases", "profiles", "user_attempts")}
+        self._next_id = {name: 1 for name in self.tables}
+
+    def seed(self, topics: int, phrases_per_topic: int, users: int):
+        for i, (slug, title) in enumerate(LEVELS, start=1):
+            self.insert("levels", {"id": i, "slug": slug, "title": title, "order_index": i})
+
+        phrase_id = 1
+        for t in range(1, topics + 1):
+            self.insert("topics", _topic_row(t, f"topic-{t}", (t - 1) % len(LEVELS) + 1))
+            for n in range(1, phrases_per_topic + 1):
+                self.insert("phrases", {
+                    "id": phrase_id, "topic_id": t, "order_index": n,
+                    **_phrase_texts(t, n)
+                })
+                phrase_id += 1
+        self.insert("topics", _topic_row(IMPORT_TOPIC_ID, IMPORT_TOPIC_SLUG, 1))
+
+        self.insert("profiles", {"id": ADMIN_USER_ID, "email": "admin@bench.local", "is_admin": True})
+        for u in range(users):
+            self.insert("profiles", {
+                "id": f"00000000-0000-0000-0001-{u:012d}",
+                "email": f"user{u}@bench.local",
+                "created_at": f"2025-01-01T00:00:{u % 60:02d}.{u:06d}+00:00",
+            })
+
+    def insert(self, table: str, row: dict) -> dict:
+        for column in self.REQUIRED.get(table, ()):
+            if row.get(column) is None:
+                raise PostgrestError(400, "23502", f'null value in column "{column}" of relation "{table}"')
+        full = self.DEFAULTS.get(table, dict)()
+        full.update(row)
+        if full.get("id") is None:
+            full["id"] = self._next_id[table]
+        if isinstance(full["id"], int):
+            self._next_id[table] = max(self._next_id[table], full["id"] + 1)
+        self.tables[table].append(full)
+        return full
+
+    def rows(self, table: str):
+        rows = self.tables[table]
+        if table == "topics":
+            # topics.phrase_count в настоящей БД поддерживают триггеры (миграция 003)
+            counts = {}
+            for p in self.tables["phrases"]:
+                counts[p["topic_id"]] = counts.get(p["topic_id"], 0) + 1
+            rows = [{**t, "phrase_count": counts.get(t["id"], 0)} for t in rows]
+        return rows
+
+
+def _topic_row(topic_id: int, slug: str, level_id: int) -> dict:
+    return {
+        "id": topic_id, "slug": slug, "level_id": level_id,
+        "title_ru": f"Тема {topic_id}", "title_en": f"Topic {topic_id}", "title_uz": f"Mavzu {topic_id}",
+    }
+
+
+def _phrase_texts(topic: int, n: int) -> dict:
+    return {
+        "text_ru": f"Это предложение номер {n} из темы {topic}.",
+        "text_en": f"This is sentence number {n} from topic {topic}.",
+        "text_uz": f"Bu {topic}-mavzudagi {n}-gap.",
+    }
+
+
+db = Database()
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def response(self):
+        return JSONResponse({"code": self.code, "message": self.message, "details": None, "hint": None},
+                            status_code=self.status)
+
+
+# --- ФИЛЬТРЫ POSTGREST ---
+
+def _split_top_level(text: str):
+    """Делит список условий по запятым верхнего уровня (с учетом скобок и кавычек)"""
+    parts, depth, quoted, start, i = [], 0, False, 0, 0
+    while i < len(text):
+        ch = text[i]
+        if quoted:
+            if ch == "\\":
+                i += 1
+            elif ch == '"':
+                quoted = False
+        elif ch == '"':
+            quoted = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return [p for p in parts if p]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _parse_logic(kind: str, body: str):
+    """Тело or=(...) / and(...) -> ("or" | "and", [условия])"""
+    conditions = []
+    for item in _split_top_level(body):
+        match = re.match(r"^(not\.)?(and|or)\((.*)\)$", item)
+        if match:
+            negate, sub_kind, sub_body = match.groups()
+            conditions.append(("not", _parse_logic(sub_kind, sub_body)) if negate else _parse_logic(sub_kind, sub_body))
+        else:
+            column, expression = item.split(".", 1)
+            conditions.append(_parse_filter(column, expression))
+    return kind, conditions
+
+
+def _parse_filter(column: str, expression: str):
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, value = expression.partition(".")
+    condition = ("filter", column, op, value)
+    return ("not", condition) if negate else condition
+
+
+def _coerce(sample, raw: str):
+    """Значение фильтра (строка из URL) к типу значения в строке таблицы"""
+    raw = _unquote(raw)
+    if isinstance(sample, bool):
+        return raw.lower() == "true"
+    if isinstance(sample, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return float(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _like_regex(pattern: str, flags=0):
+    out, i = [], 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        out.append(".*" if ch in "%*" else "." if ch == "_" else re.escape(ch))
+        i += 1
+    return re.compile("^" + "".join(out) + "$", flags | re.DOTALL)
+
+
+_COMPARE = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def _matches(row: dict, condition) -> bool:
+    kind = condition[0]
+    if kind == "not":
+        return not _matches(row, condition[1])
+    if kind == "and":
+        return all(_matches(row, c) for c in condition[1])
+    if kind == "or":
+        return any(_matches(row, c) for c in condition[1])
+
+    _, column, op, raw = condition
+    value = row.get(column)
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}[raw.lower()]
+        return value is expected
+    if value is None:
+        return False
+    if op in _COMPARE:
+        return _COMPARE[op](value, _coerce(value, raw))
+    if op == "in":
+        return value in {_coerce(value, v) for v in _split_top_level(raw.strip("()"))}
+    if op in ("like", "ilike"):
+        return bool(_like_regex(raw, re.IGNORECASE if op == "ilike" else 0).match(str(value)))
+    raise PostgrestError(400, "PGRST100", f'unsupported operator "{op}"')
+
+
+def _conditions(request: Request):
+    conditions = []
+    for key, value in request.query_params.multi_items():
+        if key in _RESERVED_PARAMS:
+            continue
+        if key in ("or", "and"):
+            conditions.append(_parse_logic(key, value[1:-1]))
+        elif key in ("not.or", "not.and"):
+            conditions.append(("not", _parse_logic(key[4:], value[1:-1])))
+        else:
+            conditions.append(_parse_filter(key, value))
+    return conditions
+
+
+def _filtered(table: str, request: Request, stored: bool = False):
+    """Строки, подходящие под фильтры запроса; stored=True — сами строки таблицы (для изменения)"""
+    conditions = _conditions(request)
+    rows = db.tables[table] if stored else db.rows(table)
+    return [r for r in rows if all(_matches(r, c) for c in conditions)]
+
+
+def _ordered(rows, order: str):
+    # Сортировки применяются с последней: sort в Python устойчивый
+    for item in reversed([o for o in order.split(",") if o]):
+        column, *modifiers = item.split(".")
+        desc = "desc" in modifiers
+        nulls_first = "nullsfirst" in modifiers or (desc and "nullslast" not in modifiers)
+        present = [r for r in rows if r.get(column) is not None]
+        missing = [r for r in rows if r.get(column) is None]
+        present.sort(key=lambda r: r[column], reverse=desc)
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+
+def _project(rows, select: str):
+    columns = [c.strip() for c in select.split(",") if c.strip()]
+    if not columns or "*" in columns:
+        return [dict(r) for r in rows]
+    return [{c: r.get(c) for c in columns} for r in rows]
+
+
+def _prefer(request: Request) -> str:
+    return request.headers.get("prefer", "")
+
+
+def _representation(request: Request, rows, status: int):
+    if "return=minimal" in _prefer(request):
+        return Response(status_code=status)
+    return JSONResponse(_project(rows, request.query_params.get("select", "*")), status_code=status)
+
+
+# --- POSTGREST ---
+
+async def rest_table(request: Request):
+    await asyncio.sleep(config.db_latency)
+    table = request.path_params["table"]
+    try:
+        if table not in db.tables:
+            raise PostgrestError(404, "42P01", f'relation "public.{table}" does not exist')
+        handler = {
+            "GET": _select, "HEAD": _select, "POST": _insert, "PATCH": _update, "DELETE": _delete
+        }[request.method]
+        return await handler(table, request)
+    except PostgrestError as e:
+        return e.response()
+
+
+async def _select(table: str, request: Request):
+    rows = _filtered(table, request)
+    total = len(rows)
+    rows = _ordered(rows, request.query_params.get("order", ""))
+    offset = int(request.query_params.get("offset", 0))
+    limit = request.query_params.get("limit")
+    rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+    if config.max_rows:
+        rows = rows[:config.max_rows]
+
+    headers = {}
+    if "count=exact" in _prefer(request):
+        headers["Content-Range"] = f"{offset}-{offset + len(rows) - 1}/{total}" if rows else f"*/{total}"
+    if request.method == "HEAD":
+        return Response(status_code=200, headers=headers)
+    return JSONResponse(_project(rows, request.query_params.get("select", "*")), headers=headers)
+
+
+async def _insert(table: str, request: Request):
+    body = await request.json()
+    items = body if isinstance(body, list) else [body]
+    upsert = "resolution=merge-duplicates" in _prefer(request)
+    key = request.query_params.get("on_conflict", "id")
+
+    result = []
+    for item in items:
+        existing = None
+        if upsert and item.get(key) is not None:
+            existing = next((r for r in db.tables[table] if r.get(key) == item[key]), None)
+        if existing is not None:
+            existing.update(item)
+            result.append(existing)
+        else:
+            result.append(db.insert(table, item))
+    return _representation(request, result, 201)
+
+
+async def _update(table: str, request: Request):
+    changes = await request.json()
+    ids = {id(r) for r in _filtered(table, request, stored=True)}
+    updated = []
+    for row in db.tables[table]:
+        if id(row) in ids:
+            row.update(changes)
+            updated.append(row)
+    return _representation(request, updated, 200)
+
+
+async def _delete(table: str, request: Request):
+    ids = {id(r) for r in _filtered(table, request, stored=True)}
+    removed = [r for r in db.tables[table] if id(r) in ids]
+    db.tables[table] = [r for r in db.tables[table] if id(r) not in ids]
+    if table == "topics":
+        # Фразы удаляются каскадно, как в настоящей схеме
+        topic_ids = {r["id"] for r in removed}
+        db.tables["phrases"] = [p for p in db.tables["phrases"] if p["topic_id"] not in topic_ids]
+    return _representation(request, removed, 200)
+
+
+# --- RPC (миграция 001) ---
+
+def _latest_attempts(user_id: str):
+    latest = {}
+    for a in db.tables["user_attempts"]:
+        if a["user_id"] != user_id:
+            continue
+        current = latest.get(a["phrase_id"])
+        if current is None or a["created_at"] >= current["created_at"]:
+            latest[a["phrase_id"]] = a
+    return latest
+
+
+def _user_progress_stats(p_user_id, p_threshold=90):
+    attempts = [a for a in db.tables["user_attempts"] if a["user_id"] == p_user_id]
+    failing = [a for a in _latest_attempts(p_user_id).values() if a["ai_score"] < p_threshold]
+    return [{
+        "attempts_count": len(attempts),
+        "score_sum": sum(a["ai_score"] for a in attempts),
+        "failing_count": len(failing),
+    }]
+
+
+def _failing_phrase_ids(p_user_id, p_threshold=90, p_limit=1000, p_offset=0):
+    failing = [a for a in _latest_attempts(p_user_id).values() if a["ai_score"] < p_threshold]
+    failing.sort(key=lambda a: a["phrase_id"])
+    failing.sort(key=lambda a: a["created_at"], reverse=True)
+    return [{"phrase_id": a["phrase_id"], "ai_score": a["ai_score"]} for a in failing[p_offset:p_offset + p_limit]]
+
+
+def _completed_phrase_ids(p_user_id, p_topic_id, p_min_score=40):
+    topic_phrases = {p["id"] for p in db.tables["phrases"] if p["topic_id"] == p_topic_id}
+    return sorted({
+        a["phrase_id"] for a in db.tables["user_attempts"]
+        if a["user_id"] == p_user_id and a["ai_score"] > p_min_score and a["phrase_id"] in topic_phrases
+    })
+
+
+RPC = {
+    "user_progress_stats": _user_progress_stats,
+    "failing_phrase_ids": _failing_phrase_ids,
+    "completed_phrase_ids": _completed_phrase_ids,
+}
+# Возвращают одно значение (массив), а не набор строк: max-rows к ним не применяется
+_SCALAR_RPC = {"completed_phrase_ids"}
+
+
+async def rest_rpc(request: Request):
+    await asyncio.sleep(config.db_latency)
+    fn_name = request.path_params["fn"]
+    fn = RPC.get(fn_name)
+    if fn is None:
+        return PostgrestError(404, "PGRST202", "Could not find the function").response()
+    result = fn(**(await request.json()))
+    if config.max_rows and fn_name not in _SCALAR_RPC:
+        result = result[:config.max_rows]
+    return JSONResponse(result)
+
+
+# --- LLM ---
+
+def _evaluation(prompt: str) -> str:
+    """Детерминированная «оценка»: один и тот же ответ всегда получает один и тот же балл"""
+    digest = int(hashlib.sha1(prompt.encode()).hexdigest()[:8], 16)
+    if digest % 100 < config.llm_fail_ratio * 100:
+        score, error_type = 30 + digest // 100 % 55, "Grammar"
+    else:
+        score, error_type = (100, "None") if digest % 3 else (95, "Vocabulary")
+    explanation = (
+        "Перевод передает смысл исходной фразы. "
+        + ("Порядок слов и время глагола выбраны верно." if score >= 90 else
+           "Обратите внимание на время глагола и порядок слов: в английском подлежащее стоит перед сказуемым.")
+    )
+    return json.dumps({
+        "score": score,
+        "deductions": "" if score == 100 else "-5 word choice",
+        "explanation": explanation,
+        "ideal_translation": "",
+        "error_type": error_type,
+    }, ensure_ascii=False)
+
+
+async def chat_completions(request: Request):
+    return await _chat_completions(request, config.llm["llama"])
+
+
+async def gemini_chat_completions(request: Request):
+    return await _chat_completions(request, config.llm["gemini"])
+
+
+async def _chat_completions(request: Request, profile: LLMProfile):
+    body = await request.json()
+    if random.random() < profile.error_rate:
+        await asyncio.sleep(profile.latency / 4)
+        return JSONResponse({"error": {"message": "Rate limit reached (bench)", "type": "rate_limit"}},
+                            status_code=429)
+
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []) if m.get("role") == "user")
+    content = _evaluation(prompt)
+    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    base = {"id": f"chatcmpl-bench-{random.getrandbits(32):08x}", "created": int(time.time()), "model": body.get("model")}
+    delay = profile.latency + random.uniform(0, profile.jitter)
+
+    if not body.get("stream"):
+        await asyncio.sleep(delay)
+        return JSONResponse({
+            **base, "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def events():
+        # Половина задержки до первого фрагмента, остальное — на генерацию текста
+        await asyncio.sleep(delay / 2)
+        size = max(1, len(content) // config.llm_chunks)
+        for i in range(0, len(content), size):
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": content[i:i + size]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(delay / 2 / config.llm_chunks)
+        last = {**base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        yield f"data: {json.dumps(last)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def llm_control(request: Request):
+    profile = config.llm.get(request.path_params["provider"])
+    if profile is None:
+        return JSONResponse({"error": "unknown provider"}, status_code=404)
+    for name, value in (await request.json()).items():
+        if name in ("latency", "jitter", "error_rate"):
+            setattr(profile, name, float(value))
+    return JSONResponse(vars(profile))
+
+
+async def health(request: Request):
+    return JSONResponse({"ok": True, "rows": {name: len(rows) for name, rows in db.tables.items()}})
+
+
+app = Starlette(routes=[
+    Route("/health", health),
+    Route("/rest/v1/rpc/{fn}", rest_rpc, methods=["POST"]),
+    Route("/rest/v1/{table}", rest_table, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+    Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+    Route("/gemini/v1beta/openai/chat/completions", gemini_chat_completions, methods=["POST"]),
+    Route("/bench/llm/{provider}", llm_control, methods=["PATCH"]),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory Supabase (PostgREST) and OpenAI stand-in for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="seconds added to every PostgREST call")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="base seconds per chat completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="random extra seconds per completion")
+    parser.add_argument("--llm-chunks", type=int, default=12, help="fragments per streamed completion")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of completions answered with 429")
+    parser.add_argument("--gemini-latency", type=float, help="base seconds per gemini completion (default: --llm-latency)")
+    parser.add_argument("--gemini-jitter", type=float, help="default: --llm-jitter")
+    parser.add_argument("--gemini-error-rate", type=float, help="default: --llm-error-rate")
+    parser.add_argument("--llm-fail-ratio", type=float, default=0.3, help="share of answers graded below 90")
+    parser.add_argument("--topics", type=int, default=30)
+    parser.add_argument("--phrases", type=int, default=50, help="phrases per topic")
+    parser.add_argument("--users", type=int, default=500, help="seeded profiles")
+    parser.add_argument("--max-rows", type=int, default=1000, help="rows per select/RPC response, like Supabase (0 = no cap)")
+    args = parser.parse_args()
+
+    config.db_latency = args.db_latency
+    config.max_rows = args.max_rows
+    config.llm["llama"] = LLMProfile(args.llm_latency, args.llm_jitter, args.llm_error_rate)
+    config.llm["gemini"] = LLMProfile(
+        args.llm_latency if args.gemini_latency is None else args.gemini_latency,
+        args.llm_jitter if args.gemini_jitter is None else args.gemini_jitter,
+        args.llm_error_rate if args.gemini_error_rate is None else args.gemini_error_rate,
+    )
+    config.llm_chunks = max(1, args.llm_chunks)
+    config.llm_fail_ratio = args.llm_fail_ratio
+    db.seed(args.topics, args.phrases, args.users)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Нагрузочный тест по сценариям пользователей без настоящего Supabase и LLM.
+
+Поднимает bench.fake_backend (PostgREST в памяти + OpenAI-совместимый чат)
+в отдельном процессе, направляет на него приложение и гоняет виртуальных
+пользователей по сценариям:
+
+  learner  - главная -> тема -> цикл «ответ / следующая фраза» (/check и /check_stream)
+  mistakes - работа над ошибками: /mistakes -> /check по очереди ошибок
+  admin    - админка: списки с поиском, страница темы, импорт CSV (sync)
+
+В конце печатает пропускную способность и p50/p95/p99 по маршрутам.
+Результат можно сохранить (--json) и сравнить с прошлым прогоном (--baseline):
+при росте p95 или падении пропускной способности больше --tolerance
+код выхода 1 — так регрессия ловится до деплоя.
+
+Запуск:
+  python -m bench.load_test [--users 20] [--duration 30] [--llm-latency 0.4] [--json out.json]
+  python -m bench.load_test --baseline out.json      # сравнить с сохраненным прогоном
+
+По умолчанию приложение работает в этом же процессе (httpx.ASGITransport).
+С --url запросы идут на уже запущенный сервер — его нужно самому направить
+на python -m bench.fake_backend (переменные окружения есть в его описании)
+и задать тот же SESSION_SECRET, что и здесь (по умолчанию "bench-secret"),
+а для сервера по http:// — SESSION_COOKIE_SECURE=false.
+"""
+import argparse
+import asyncio
+import html
+import io
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from bench.fake_backend import ADMIN_USER_ID, IMPORT_TOPIC_ID, IMPORT_TOPIC_SLUG
+
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "bench-secret")
+
+_TOPIC_LINK_RE = re.compile(r'href="/training/([^"]+)"')
+_HIDDEN_RE = re.compile(r'<input type="hidden" name="(\w+)" value="([^"]*)">')
+
+WORDS = "I you we they go read write speak learn every day today yesterday book school friend often".split()
+
+
+# --- СБОР РЕЗУЛЬТАТОВ ---
+
+class Recorder:
+    def __init__(self, first_event: bool = False):
+        self.latencies = defaultdict(list)  # маршрут -> [сек]
+        self.errors = defaultdict(int)
+        # ASGITransport отдает тело ответа целиком, время до первого события
+        # имеет смысл мерить только на настоящем сервере (--url)
+        self.first_event = first_event
+
+    def add(self, route: str, seconds: float, ok: bool):
+        self.latencies[route].append(seconds)
+        if not ok:
+            self.errors[route] += 1
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        """Запрос с замером; маршрут — шаблон (/training/{topic_slug}), а не конкретный URL"""
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.add(route, time.perf_counter() - started, False)
+            print(f"  {route}: {e!r}", file=sys.stderr)
+            return None
+        self.add(route, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    async def stream(self, client: httpx.AsyncClient, route: str, url: str, data: dict):
+        """Потоковая проверка: отдельно время до первого события и до конца ответа"""
+        started = time.perf_counter()
+        first = None
+        body = []
+        try:
+            async with client.stream("POST", url, data=data) as response:
+                async for text in response.aiter_text():
+                    if first is None and self.first_event:
+                        first = time.perf_counter() - started
+                        self.add(f"{route} [first event]", first, response.status_code < 400)
+                    body.append(text)
+                ok = response.status_code < 400
+        except httpx.HTTPError as e:
+            self.add(route, time.perf_counter() - started, False)
+            print(f"  {route}: {e!r}", file=sys.stderr)
+            return ""
+        body = "".join(body)
+        self.add(route, time.perf_counter() - started, ok and "event: error" not in body)
+        return body
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    routes = {}
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        routes[route] = {
+            "count": len(values),
+            "errors": recorder.errors[route],
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+    # Время до первого события — часть того же запроса, в общий счет не входит
+    total = sum(r["count"] for name, r in routes.items() if not name.endswith("[first event]"))
+    errors = sum(r["errors"] for name, r in routes.items() if not name.endswith("[first event]"))
+    return {"elapsed_s": elapsed, "requests": total, "errors": errors, "throughput_rps": total / elapsed, "routes": routes}
+
+
+def print_report(summary: dict):
+    print(f"\n{'route':<46}{'count':>7}{'err':>5}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for route, r in summary["routes"].items():
+        print(f"{route:<46}{r['count']:>7}{r['errors']:>5}{r['rps']:>8.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+    print(f"\n{summary['requests']} requests in {summary['elapsed_s']:.1f}s: "
+          f"{summary['throughput_rps']:.1f} req/s, {summary['errors']} errors")
+
+
+def compare(summary: dict, baseline: dict, tolerance: float, min_count: int = 20, floor_ms: float = 5.0):
+    """Список регрессий относительно сохраненного прогона"""
+    problems = []
+    if summary["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        problems.append(f"throughput {summary['throughput_rps']:.1f} req/s < baseline {baseline['throughput_rps']:.1f}")
+    for route, r in summary["routes"].items():
+        base = baseline["routes"].get(route)
+        if not base or r["count"] < min_count or base["count"] < min_count:
+            continue
+        # Небольшой абсолютный запас: быстрые маршруты шумят в пределах миллисекунд
+        if r["p95_ms"] > base["p95_ms"] * (1 + tolerance) + floor_ms:
+            problems.append(f"{route}: p95 {r['p95_ms']:.1f} ms > baseline {base['p95_ms']:.1f} ms")
+        if r["errors"] / r["count"] > base["errors"] / base["count"] + 0.01:
+            problems.append(f"{route}: {r['errors']} errors of {r['count']} (baseline {base['errors']} of {base['count']})")
+    return problems
+
+
+# --- СЦЕНАРИИ ---
+
+def _form(page: str) -> dict:
+    """Скрытые поля формы проверки на странице тренировки (пусто — фраз больше нет)"""
+    return {name: html.unescape(value) for name, value in _HIDDEN_RE.findall(page)}
+
+
+def _answer(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))).capitalize() + "."
+
+
+async def _check(rec: Recorder, client, form: dict, rng, stream_ratio: float):
+    data = {**form, "user_translation": _answer(rng)}
+    if rng.random() < stream_ratio:
+        await rec.stream(client, "POST /check_stream", "/check_stream", data)
+    else:
+        await rec.request(client, "POST /check", "POST", "/check", data=data)
+
+
+async def learner_journey(rec: Recorder, client, rng: random.Random, args):
+    page = await rec.request(client, "GET /", "GET", "/")
+    if page is None:
+        return
+    slugs = [s for s in _TOPIC_LINK_RE.findall(page.text) if s != IMPORT_TOPIC_SLUG]
+    if not slugs:
+        return
+    slug = rng.choice(slugs)
+    for _ in range(rng.randint(args.steps // 2 or 1, args.steps)):
+        page = await rec.request(client, "GET /training/{topic_slug}", "GET", f"/training/{slug}")
+        form = _form(page.text) if page is not None else {}
+        if "phrase_id" not in form:
+            break
+        await _check(rec, client, form, rng, args.stream_ratio)
+        await asyncio.sleep(rng.uniform(0, args.think_time))
+
+
+async def mistakes_journey(rec: Recorder, client, rng: random.Random, args):
+    for _ in range(rng.randint(args.steps // 2 or 1, args.steps)):
+        page = await rec.request(client, "GET /mistakes", "GET", "/mistakes")
+        form = _form(page.text) if page is not None else {}
+        if "phrase_id" not in form:
+            # Ошибок пока нет — сначала немного позанимаемся по теме
+            await learner_journey(rec, client, rng, args)
+            return
+        await _check(rec, client, form, rng, args.stream_ratio)
+        await asyncio.sleep(rng.uniform(0, args.think_time))
+
+
+def _import_file(rng: random.Random, rows: int) -> bytes:
+    """CSV для импорта: в основном те же строки, небольшая доля изменена"""
+    out = io.StringIO()
+    out.write("text_ru,text_en,text_uz\n")
+    for n in range(rows):
+        suffix = f" v{rng.randint(1, 3)}" if rng.random() < 0.05 else ""
+        out.write(f"Импорт {n}{suffix},Import {n}{suffix},Import {n}{suffix}\n")
+    return out.getvalue().encode()
+
+
+async def admin_journey(rec: Recorder, client, rng: random.Random, args):
+    await rec.request(client, "GET /admin", "GET", "/admin")
+    await rec.request(client, "GET /admin?topic_q&user_q", "GET", "/admin",
+                      params={"topic_q": str(rng.randint(1, 9)), "user_q": f"user{rng.randint(1, 9)}"})
+    await rec.request(client, "GET /admin/topic/{topic_id}", "GET", f"/admin/topic/{rng.randint(1, args.topics)}")
+    await rec.request(
+        client, "POST /admin/import_excel", "POST", "/admin/import_excel",
+        data={"topic_id": str(IMPORT_TOPIC_ID), "mode": "sync"},
+        files={"file": ("bench.csv", _import_file(rng, args.import_rows), "text/csv")},
+    )
+    await rec.request(client, "GET /admin/topic/{topic_id}", "GET", f"/admin/topic/{IMPORT_TOPIC_ID}")
+
+
+JOURNEYS = {"learner": learner_journey, "mistakes": mistakes_journey, "admin": admin_journey}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in JOURNEYS:
+            raise argparse.ArgumentTypeError(f"unknown journey '{name}' (known: {', '.join(JOURNEYS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def virtual_user(n: int, make_client, rec: Recorder, deadline: float, args):
+    from app.auth import SESSION_COOKIE, issue_token
+
+    rng = random.Random(args.seed * 1000 + n)
+    names, weights = zip(*args.mix.items())
+    # У каждого пользователя своя кука и история; админ входит подписанной сессией
+    async with make_client() as client:
+        async with make_client() as admin_client:
+            admin_client.cookies.set(SESSION_COOKIE, issue_token(ADMIN_USER_ID, is_auth=True, is_admin=True))
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                await JOURNEYS[name](rec, admin_client if name == "admin" else client, rng, args)
+
+
+async def run(args) -> dict:
+    rec = Recorder(first_event=bool(args.url))
+
+    if args.url:
+        def make_client():
+            return httpx.AsyncClient(base_url=args.url, timeout=60)
+        lifespan = None
+    else:
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+
+        def make_client():
+            return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+        lifespan = app.router.lifespan_context(app)
+
+    async def users():
+        started = time.monotonic()
+        deadline = started + args.duration
+        tasks = []
+        for n in range(args.users):
+            tasks.append(asyncio.create_task(virtual_user(n, make_client, rec, deadline, args)))
+            # Пользователи приходят постепенно, а не одним залпом
+            await asyncio.sleep(args.ramp_up / args.users)
+        await asyncio.gather(*tasks)
+        return time.monotonic() - started
+
+    if lifespan is None:
+        elapsed = await users()
+    else:
+        # Запуск и остановка приложения как в uvicorn (фоновая запись попыток и т.п.)
+        async with lifespan:
+            elapsed = await users()
+    return summarize(rec, elapsed)
+
+
+# --- ЗАГЛУШКИ ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_backend(args):
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "bench.fake_backend", "--port", str(port),
+        "--db-latency", str(args.db_latency), "--llm-latency", str(args.llm_latency),
+        "--llm-jitter", str(args.llm_jitter), "--llm-error-rate", str(args.llm_error_rate),
+        "--topics", str(args.topics), "--phrases", str(args.phrases), "--max-rows", str(args.max_rows),
+    ]
+    if args.gemini_latency is not None:
+        command += ["--gemini-latency", str(args.gemini_latency)]
+    if args.gemini_error_rate is not None:
+        command += ["--gemini-error-rate", str(args.gemini_error_rate)]
+    process = subprocess.Popen(command)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{url}/health", timeout=1).raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("fake backend did not start")
+
+
+def configure_app(backend_url: str, tmp_dir: str):
+    """Переменные окружения приложения — до первого импорта app.*"""
+    os.environ.update({
+        "SUPABASE_URL": backend_url,
+        "SUPABASE_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "LLAMA_API_KEY": "bench",
+        "LLAMA_BASE_URL": f"{backend_url}/v1",
+        "GEMINI_BASE_URL": f"{backend_url}/gemini/v1beta/openai/",
+        "SESSION_SECRET": SESSION_SECRET,
+        # Приложение в этом же процессе отвечает по http://bench
+        "SESSION_COOKIE_SECURE": "false",
+        "ATTEMPT_SPILL_PATH": os.path.join(tmp_dir, "attempts_spill.jsonl"),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scripted load test against local Supabase/LLM stand-ins")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--ramp-up", type=float, default=2, help="seconds to start all users")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("learner=6,mistakes=3,admin=1"),
+                        help="journey weights, e.g. learner=6,mistakes=3,admin=1")
+    parser.add_argument("--steps", type=int, default=10, help="max answers per learner/mistakes journey")
+    parser.add_argument("--stream-ratio", type=float, default=0.3, help="share of checks sent to /check_stream")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max pause between answers (s)")
+    parser.add_argument("--import-rows", type=int, default=300, help="rows in the admin import file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-latency", type=float, help="second provider latency (default: same as llama)")
+    parser.add_argument("--gemini-error-rate", type=float, help="second provider error rate (default: same as llama)")
+    parser.add_argument("--topics", type=int, default=30)
+    parser.add_argument("--phrases", type=int, default=50)
+    parser.add_argument("--max-rows", type=int, default=1000,
+                        help="rows per PostgREST response in the fake backend, like Supabase (0 = no cap)")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--json", help="write the summary to this file")
+    parser.add_argument("--baseline", help="compare against a summary saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown vs baseline")
+    args = parser.parse_args()
+
+    process = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            if not args.url:
+                process, backend_url = start_fake_backend(args)
+                configure_app(backend_url, tmp_dir)
+            else:
+                os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+                os.environ.setdefault("SUPABASE_KEY", "bench")
+                os.environ.setdefault("GEMINI_API_KEY", "bench")
+                os.environ["SESSION_SECRET"] = SESSION_SECRET
+            print(f"{args.users} users for {args.duration:.0f}s, mix {args.mix}, "
+                  f"LLM {args.llm_latency * 1000:.0f}+{args.llm_jitter * 1000:.0f} ms, DB {args.db_latency * 1000:.0f} ms")
+            summary = asyncio.run(run(args))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(summary, json.load(f), args.tolerance)
+        if problems:
+            print("\nREGRESSIONS:")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
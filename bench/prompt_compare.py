@@ -0,0 +1,192 @@
+"""
+Бенчмарк промптов проверки: прежний промпт (собирался f-строками при каждом
+вызове) против шаблонов app/prompts.py.
+
+Без сети сравнивает для каждой пары (направление, язык интерфейса):
+  - оценку токенов системного промпта и сообщения с данными ученика;
+  - общий префикс системных промптов всех пар (кэшируется у провайдера один раз);
+  - время сборки сообщений на один вызов.
+
+С --live N дополнительно отправляет по N запросов с каждым вариантом
+первому провайдеру из LLM_PROVIDERS и сравнивает
+задержку и prompt_tokens / cached_tokens из response.usage.
+
+Запуск:  python -m bench.prompt_compare [--live 10]
+"""
+import argparse
+import asyncio
+import os
+import os.path
+import statistics
+import time
+import timeit
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+
+from app.prompts import DIRECTIONS, INTERFACE_LANGS, estimate_tokens, prompt_registry
+
+SAMPLE = {
+    "original": "Я каждый день читаю книги в библиотеке.",
+    "reference_translation": "I read books in the library every day.",
+    "user_translation": "I am reading books in library every day.",
+}
+
+
+# Прежний промпт — копия app/ai_service._build_messages до перехода на шаблоны
+def legacy_messages(
+    original: str,
+    reference_translation: str,
+    user_translation: str,
+    direction: str,
+    interface_lang: str
+):
+    # Определение языков
+    lang_map = {"en": "English", "uz": "Uzbek", "ru": "Russian"}
+    try:
+        parts = direction.lower().split('-') # пример: ru-en
+        src_lang = lang_map.get(parts[0], "Russian")
+        tgt_lang = lang_map.get(parts[1], "English")
+    except: 
+        src_lang, tgt_lang = "Russian", "English"
+
+    # Настройка языка объяснения (Feedback Language)
+# Настройка языка объяснения (Feedback Language)
+    explain_instr = f"in {lang_map.get(interface_lang, 'English')}"
+    if "uz" in interface_lang.lower():
+        # Было: "Xato: ..."
+        # Стало: "Izoh: ..." (чтобы не пугать слово "Ошибка" при синонимах)
+        explain_instr = """
+        in UZBEK (Latin script).
+        Format: 
+        - If score is 100: "Barakalla! Tarjima aniq."
+        - If score is 90-99 (Synonym): "To'g'ri: [Reference]. Izoh: Sizning varianingiz ham to'g'ri (sinonim)."
+        - If score < 90: "To'g'ri: [Reference]. Xato: [Explain error]."
+        """
+
+    # Новый System Prompt для СРАВНЕНИЯ
+    system_prompt = f"""
+    You are a strict Language Examiner. 
+    Source Language: {src_lang}
+    Target Language: {tgt_lang}
+    
+    SPECIAL RULE FOR UZBEK SOURCE:
+    - The Uzbek word "U" implies both "He" and "She". 
+    - If Source is Uzbek and Reference uses "He", but Student uses "She" (or vice versa), ACCEPT IT as correct. Do not deduct points for gender mismatch unless context clearly defines it.
+    
+    TASK:
+    Compare the Student's translation against the OFFICIAL REFERENCE.
+
+    SCORING RULES:
+    1. EXACT MATCH: If Student == Reference (ignoring case/punctuation) -> Score 100.
+    2. SYNONYMS: If Student uses valid synonyms (e.g., 'car' vs 'automobile') AND grammar is perfect -> Score 95-100. Mention that the Reference uses a different word but Student is correct.
+    3. GRAMMAR ERROR: If meaning is close but grammar is wrong -> Score 60-80.
+    4. WRONG MEANING: If Student says something totally different from Reference -> Score 0-40.
+
+    OUTPUT INSTRUCTIONS:
+    - Provide feedback {explain_instr}.
+    - 'ideal_translation' field must contain the OFFICIAL REFERENCE provided below.
+    - 'deductions' field: Short summary of errors.
+
+    OUTPUT JSON FORMAT:
+    {{
+        "score": integer (0-100),
+        "deductions": "string",
+        "explanation": "string",
+        "ideal_translation": "string",
+        "error_type": "None | Grammar | Vocabulary | Spelling | Critical"
+    }}
+    """
+
+    # Данные для ИИ
+    user_prompt = f"""
+    Original Phrase ({src_lang}): "{original}"
+    OFFICIAL REFERENCE ({tgt_lang}): "{reference_translation}"
+    Student Translation: "{user_translation}"
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def new_messages(original, reference_translation, user_translation, direction, interface_lang):
+    return prompt_registry.messages(original, reference_translation, user_translation, direction, interface_lang)
+
+
+def common_prefix(texts) -> str:
+    return os.path.commonprefix(list(texts))
+
+
+def offline_report():
+    print(f"{'template':<10}{'legacy sys':>12}{'new sys':>10}{'legacy user':>13}{'new user':>10}{'saved/call':>12}")
+    legacy_systems, new_systems, saved = [], [], []
+    for direction in DIRECTIONS:
+        for lang in INTERFACE_LANGS:
+            old = legacy_messages(direction=direction, interface_lang=lang, **SAMPLE)
+            new = new_messages(direction=direction, interface_lang=lang, **SAMPLE)
+            old_sys, old_user = (estimate_tokens(m["content"]) for m in old)
+            new_sys, new_user = (estimate_tokens(m["content"]) for m in new)
+            legacy_systems.append(old[0]["content"])
+            new_systems.append(new[0]["content"])
+            saved.append(old_sys + old_user - new_sys - new_user)
+            print(f"{direction + '/' + lang:<10}{old_sys:>12}{new_sys:>10}{old_user:>13}{new_user:>10}{saved[-1]:>12}")
+
+    print(f"\nAverage saving: {statistics.mean(saved):.0f} estimated prompt tokens per call")
+    print(f"Prefix shared by all templates: legacy {estimate_tokens(common_prefix(legacy_systems))} tokens, "
+          f"new {estimate_tokens(common_prefix(new_systems))} tokens")
+
+    calls = 20000
+    for name, fn in (("legacy", legacy_messages), ("new", new_messages)):
+        seconds = timeit.timeit(lambda: fn(direction="UZ-EN", interface_lang="uz", **SAMPLE), number=calls)
+        print(f"Build messages ({name}): {seconds / calls * 1e6:.1f} us per call")
+
+
+async def live_report(calls: int):
+    from app.llm_router import llm_router
+
+    if not llm_router.providers:
+        print("\n--live: no LLM provider is configured, skipping")
+        return
+    # Оба варианта — одному провайдеру, без роутера: сравниваются только промпты
+    provider = llm_router.providers[0]
+    client = provider.client
+
+    async def run(fn, direction, lang):
+        started = time.perf_counter()
+        response = await client.chat.completions.create(
+            model=provider.model,
+            messages=fn(direction=direction, interface_lang=lang, **SAMPLE),
+            temperature=0.1,
+            response_format={"type": "json_object"},
+        )
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        return time.perf_counter() - started, usage.prompt_tokens, getattr(details, "cached_tokens", 0) or 0
+
+    print(f"\n{'variant':<8}{'calls':>7}{'p50 ms':>9}{'mean ms':>9}{'prompt tok':>12}{'cached tok':>12}")
+    for name, fn in (("legacy", legacy_messages), ("new", new_messages)):
+        results = []
+        # Чередуем пары, как в реальном трафике
+        for i in range(calls):
+            direction = DIRECTIONS[i % len(DIRECTIONS)]
+            lang = INTERFACE_LANGS[i % len(INTERFACE_LANGS)]
+            results.append(await run(fn, direction, lang))
+        latencies = [r[0] * 1000 for r in results]
+        print(f"{name:<8}{calls:>7}{statistics.median(latencies):>9.0f}{statistics.mean(latencies):>9.0f}"
+              f"{statistics.mean(r[1] for r in results):>12.0f}{statistics.mean(r[2] for r in results):>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy evaluation prompt with app/prompts.py templates")
+    parser.add_argument("--live", type=int, default=0, help="calls per variant against the configured provider")
+    args = parser.parse_args()
+
+    offline_report()
+    if args.live:
+        asyncio.run(live_report(args.live))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Холодный старт: сколько воркер грузится и когда отвечает на первый запрос.
+
+Fly.io останавливает машины без трафика, поэтому время старта — это задержка
+первого пользователя. Каждый замер в новом процессе:
+
+  import          - python -X importtime -c "import app.main": общее время
+                    и самые тяжелые пакеты (собственное время их модулей)
+  first response  - uvicorn с нуля до первого ответа GET /login (без БД и ИИ)
+  first page      - затем до первого GET / с данными из БД (bench.fake_backend),
+                    пока прогрев в фоне загружает клиентов
+
+После импорта app.main не должны быть загружены supabase, openai и pandas —
+они грузятся лениво или прогревом после старта (app/main.py, warm_up).
+Если модуль загружен или время (медиана по --runs) вышло за бюджет, код выхода
+1 — так регрессия старта ловится до деплоя.
+
+Запуск:  python -m bench.startup [--runs 5] [--import-budget 0.6] [--first-response-budget 1.5]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+# Не должны загружаться при импорте приложения
+LAZY_MODULES = ("supabase", "postgrest", "openai", "pandas", "numpy")
+
+_IMPORT_CODE = (
+    "import json, sys\n"
+    "import app.main\n"
+    f"print(json.dumps(sorted(m for m in {LAZY_MODULES!r} if m in sys.modules)))\n"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(port: int, path: str):
+    """Статус ответа или None, если сервер еще не слушает"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def _wait_ready(port: int, path: str, process, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        if _get(port, path) == 200:
+            return time.perf_counter()
+        if process.poll() is not None:
+            raise SystemExit(f"process exited with code {process.returncode} before answering {path}")
+        time.sleep(0.005)
+    raise SystemExit(f"no response from {path}")
+
+
+def measure_import(env: dict):
+    """(секунды, {пакет: собственное время}, загруженные тяжелые модули)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _IMPORT_CODE],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    packages = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not self_us.isdigit():
+            continue  # заголовок
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == "app.main":
+            total = int(cumulative_us) / 1e6
+    return total, packages, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_first_response(env: dict):
+    """(до первого ответа /login, до первой страницы / с данными) в секундах от запуска процесса"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        first = _wait_ready(port, "/login", process, started + 30) - started
+        page = _wait_ready(port, "/", process, started + 30) - started
+        return first, page
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def start_backend(env: dict):
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, "-m", "bench.fake_backend", "--port", str(port)], env=env)
+    try:
+        _wait_ready(port, "/health", process, time.perf_counter() + 30)
+    except BaseException:
+        process.kill()
+        raise
+    return process, f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start: import profile and time to first response, with budgets")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement (median is compared)")
+    parser.add_argument("--import-budget", type=float, default=0.6, help="seconds to import app.main")
+    parser.add_argument("--first-response-budget", type=float, default=1.5,
+                        help="seconds from process start to the first /login response")
+    parser.add_argument("--top", type=int, default=10, help="heaviest packages to print")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": root, "PYTHONDONTWRITEBYTECODE": "1"}
+    backend, backend_url = start_backend(env)
+    tmp_dir = tempfile.mkdtemp(prefix="startup-bench-")
+    env.update({
+        "SUPABASE_URL": backend_url,
+        "SUPABASE_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "LLAMA_API_KEY": "bench",
+        "LLAMA_BASE_URL": f"{backend_url}/v1",
+        "GEMINI_BASE_URL": f"{backend_url}/gemini/v1beta/openai/",
+        "SESSION_SECRET": "bench-secret",
+        "ATTEMPT_SPILL_PATH": os.path.join(tmp_dir, "attempts_spill.jsonl"),
+    })
+    try:
+        imports = [measure_import(env) for _ in range(args.runs)]
+        responses = [measure_first_response(env) for _ in range(args.runs)]
+    finally:
+        backend.terminate()
+        backend.wait()
+
+    import_seconds = statistics.median(total for total, _, _ in imports)
+    first_response = statistics.median(first for first, _ in responses)
+    first_page = statistics.median(page for _, page in responses)
+    loaded = sorted({m for *_, modules in imports for m in modules})
+
+    packages = defaultdict(list)
+    for _, per_package, _ in imports:
+        for name, seconds in per_package.items():
+            packages[name].append(seconds)
+    heaviest = sorted(((statistics.median(v), k) for k, v in packages.items()), reverse=True)[:args.top]
+    print(f"Import profile (median of {args.runs}, own time of the package's modules):")
+    for seconds, name in heaviest:
+        print(f"  {name:<24}{seconds * 1000:>8.1f} ms")
+
+    failures = []
+    print()
+    for label, value, budget in (
+        ("import app.main", import_seconds, args.import_budget),
+        ("first response (/login)", first_response, args.first_response_budget),
+        ("first page with data (/)", first_page, None),
+    ):
+        verdict = "" if budget is None else f"  budget {budget * 1000:.0f} ms"
+        if budget is not None and value > budget:
+            verdict += "  OVER BUDGET"
+            failures.append(label)
+        print(f"{label:<28}{value * 1000:>8.0f} ms{verdict}")
+    if loaded:
+        print(f"\nLoaded at import, should be lazy: {', '.join(loaded)}")
+        failures.append("lazy imports")
+
+    if failures:
+        print(f"\nFAIL: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nOK: startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Сверка локальной оценки (app/triage.py) с оценками ИИ на прошлых попытках.
+
+Берет последние попытки из user_attempts (или из файла JSONL) и для
+каждой, которую оценивал ИИ (graded_by = 'llm', миграция 004), решает,
+что сделал бы триаж. Принятые
+варианты собираются так же, как в индексе принятых ответов: эталон
+и ответы с оценкой 100 из того же набора.
+
+Показывает долю ответов, оцененных без ИИ, и как часто оценка триажа
+попадает в ту же зону, что и оценка ИИ:
+  не засчитано (<= PASS_SCORE), засчитано с ошибкой (< MISTAKE_THRESHOLD), без ошибки.
+
+Оценка опечаток по умолчанию выключена (TRIAGE_SPELLING_ENABLED): перед
+включением пороги сверяются здесь. --spelling включает ее для прогона,
+--sweep перебирает пороги длины слова и печатает для каждой пары, сколько
+ответов ушло бы в "spelling" и как часто ИИ поставил им ту же зону.
+
+Запуск:  python -m bench.triage_replay [--limit 5000] [--direction RU-EN]
+         python -m bench.triage_replay --spelling --wordlists 'dicts/{lang}.txt' --sweep
+         python -m bench.triage_replay --input attempts.jsonl
+Строка файла: {"phrase_id", "direction", "reference", "user_translation", "ai_score"}
+и необязательное "graded_by" (строки с "local" пропускаются).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+from collections import defaultdict
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+
+from app import repository as repo
+from app.answer_index import normalize_answer
+from app.config import settings
+from app.progress import MISTAKE_THRESHOLD
+from app.sessions import PASS_SCORE
+from app.triage import pre_scorer, Vocabulary, GRADED_BY_LLM
+
+
+def band(score: int) -> str:
+    if score <= PASS_SCORE:
+        return "failed"
+    return "mistake" if score < MISTAKE_THRESHOLD else "clean"
+
+
+async def load_from_db(limit: int, direction: str):
+    # Оценки без ИИ (индекс или триаж) — не вердикт модели
+    attempts = await repo.list_recent_attempts(limit, direction, graded_by=GRADED_BY_LLM)
+    phrases = {p["id"]: p for p in await repo.list_phrases_by_ids({a["phrase_id"] for a in attempts})}
+    rows = []
+    for a in attempts:
+        phrase = phrases.get(a["phrase_id"])
+        target = a["direction"].lower().split("-")[-1]
+        reference = phrase.get(f"text_{target}") if phrase else None
+        if reference:
+            rows.append({**a, "reference": reference})
+    return rows
+
+
+def load_from_file(path: str):
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [r for r in rows if r.get("graded_by", GRADED_BY_LLM) == GRADED_BY_LLM]
+
+
+def replay(rows):
+    accepted = defaultdict(set)
+    for r in rows:
+        key = (r["phrase_id"], r["direction"])
+        accepted[key].add(normalize_answer(r["reference"]))
+        if r["ai_score"] == 100:
+            accepted[key].add(normalize_answer(r["user_translation"]))
+
+    decisions = defaultdict(int)
+    agreed = defaultdict(int)
+    differences = defaultdict(list)
+    disagreements = []
+    for r in rows:
+        variants = accepted[r["phrase_id"], r["direction"]]
+        if normalize_answer(r["user_translation"]) in variants:
+            decisions["exact"] += 1
+            continue
+        decision, result = pre_scorer.classify(r["user_translation"], variants, r["reference"], r["direction"], "en")
+        decisions[decision] += 1
+        if result is None:
+            continue
+        differences[decision].append(abs(result["score"] - r["ai_score"]))
+        if band(result["score"]) == band(r["ai_score"]):
+            agreed[decision] += 1
+        else:
+            disagreements.append((decision, result["score"], r["ai_score"], r["reference"], r["user_translation"]))
+    return decisions, agreed, differences, disagreements
+
+
+def report(rows, show: int):
+    decisions, agreed, differences, disagreements = replay(rows)
+    total = sum(decisions.values())
+    if not total:
+        print("No LLM-graded attempts to replay")
+        return
+    triaged = total - decisions["exact"]
+    local = triaged - decisions["llm"]
+    print(f"{total} LLM-graded attempts, {decisions['exact']} already exact matches of accepted answers")
+    print(f"Triage graded {local} of the remaining {triaged} ({local / triaged if triaged else 0:.1%}) without the LLM\n")
+
+    print(f"{'decision':<16}{'count':>7}{'agree':>8}{'mean |diff|':>13}")
+    for decision in ("spelling", "wrong_language", "wrong_meaning"):
+        count = decisions[decision]
+        if count:
+            print(f"{decision:<16}{count:>7}{agreed[decision] / count:>8.1%}{statistics.mean(differences[decision]):>13.1f}")
+    print(f"{'llm':<16}{decisions['llm']:>7}")
+    if local:
+        print(f"\nAgreement with the LLM on triaged answers: {sum(agreed.values()) / local:.1%}")
+
+    for decision, score, ai_score, reference, answer in disagreements[:show]:
+        print(f"  {decision}: triage {score} vs LLM {ai_score} | {reference!r} <- {answer!r}")
+
+
+def sweep(rows):
+    """Оценка опечаток при разных порогах длины слова"""
+    print(f"{'min word':>9}{'long word':>10}{'spelling':>10}{'agree':>8}")
+    for min_word in (3, 4, 5, 6):
+        for long_word in (7, 8, 9, 10):
+            settings.TRIAGE_TYPO_MIN_WORD, settings.TRIAGE_TYPO_LONG_WORD = min_word, long_word
+            decisions, agreed, _, _ = replay(rows)
+            count = decisions["spelling"]
+            agree = f"{agreed['spelling'] / count:.1%}" if count else "-"
+            print(f"{min_word:>9}{long_word:>10}{count:>10}{agree:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay graded attempts through the local pre-scorer")
+    parser.add_argument("--input", help="JSONL file instead of the user_attempts table")
+    parser.add_argument("--limit", type=int, default=5000, help="recent attempts to load from the database")
+    parser.add_argument("--direction", help="only attempts in this direction, e.g. RU-EN")
+    parser.add_argument("--show", type=int, default=10, help="disagreements to print")
+    parser.add_argument("--spelling", action="store_true", help="grade typos locally even if TRIAGE_SPELLING_ENABLED is off")
+    parser.add_argument("--wordlists", help="word list path template, e.g. 'dicts/{lang}.txt' (TRIAGE_WORDLISTS)")
+    parser.add_argument("--sweep", action="store_true", help="compare typo word-length thresholds instead of one report")
+    args = parser.parse_args()
+
+    if args.spelling:
+        settings.TRIAGE_SPELLING_ENABLED = True
+    if args.wordlists:
+        pre_scorer.vocabulary = Vocabulary(args.wordlists)
+    rows = load_from_file(args.input) if args.input else asyncio.run(load_from_db(args.limit, args.direction))
+    if args.sweep:
+        sweep(rows)
+    else:
+        report(rows, args.show)
+
+
+if __name__ == "__main__":
+    main()
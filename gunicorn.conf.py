@@ -0,0 +1,79 @@
+"""
+Продакшен-запуск: gunicorn с воркерами uvicorn.
+
+  gunicorn app.main:app -c gunicorn.conf.py
+
+Воркеров — WEB_CONCURRENCY или по одному на ядро (у каждого свой event loop).
+Кэши воркеров согласуются через общий файл счетчиков (app/shared_state.py):
+мастер создает его при старте и передает путь воркерам в SHARED_STATE_PATH.
+Метрики тоже общие: воркеры сохраняют снимки в METRICS_DIR, и /metrics
+любого воркера отдает сумму по всем (app/metrics.py).
+Сессии тренировки и очередь записи попыток остаются в памяти воркера.
+gunicorn раздает соединения воркерам без привязки к пользователю, поэтому
+для тренировки без пересборок нужна липкая маршрутизация (например, один
+воркер на машину за балансировщиком с привязкой сессий); иначе другой
+воркер пересобирает очередь, дождавшись записи чужих попыток (app/sessions.py).
+
+Плавный перезапуск (новый код, без потери запросов): kill -HUP <pid мастера>.
+Мастер поднимает новые воркеры, старые дообслуживают текущие запросы
+и сбрасывают очередь попыток в БД (не дольше graceful_timeout).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", 0)) or multiprocessing.cpu_count()
+
+# Проверка ИИ с повторами может занять больше стандартных 30 секунд
+timeout = 90
+graceful_timeout = 30
+keepalive = 5
+
+# Приложение загружается в каждом воркере: свой event loop и пул потоков БД,
+# а HUP подхватывает новый код
+preload_app = False
+
+accesslog = "-"
+
+
+def _default_state_path() -> str:
+    # Путь зависит только от pid мастера: при HUP этот файл перечитывается заново
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"fluentedge-{os.getpid()}.state")
+
+
+def _default_metrics_dir() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"fluentedge-{os.getpid()}-metrics")
+
+
+def on_starting(server):
+    os.environ.setdefault("SHARED_STATE_PATH", _default_state_path())
+    # Снимки метрик воркеров: /metrics любого воркера отдает сумму по всем (app/metrics.py)
+    os.environ.setdefault("METRICS_DIR", _default_metrics_dir())
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+    # Незаписанные попытки: у каждого воркера свой файл (см. app/attempt_writer.py)
+    spill_path = os.environ.get("ATTEMPT_SPILL_PATH", "data/attempts_spill.jsonl")
+    if "{pid}" not in spill_path:
+        root, ext = os.path.splitext(spill_path)
+        os.environ["ATTEMPT_SPILL_PATH"] = f"{root}.{{pid}}{ext}"
+    server.log.info(f"Shared state: {os.environ['SHARED_STATE_PATH']}, {workers} workers")
+
+
+def child_exit(server, worker):
+    # Очередь попыток завершившегося воркера (в том числе убитого) больше никто
+    # не запишет из памяти: его счетчики не должны задерживать пересборку сессий
+    from app.shared_state import unsaved_channel
+    unsaved_channel.release(worker.pid)
+
+
+def on_exit(server):
+    path = _default_state_path()
+    if os.environ.get("SHARED_STATE_PATH") == path and os.path.exists(path):
+        os.remove(path)
+    metrics_dir = _default_metrics_dir()
+    if os.environ.get("METRICS_DIR") == metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,57 @@
+-- Последняя попытка пользователя по каждой фразе считается на стороне Postgres.
+-- Используется сводкой прогресса (app/progress.py) вместо выгрузки всей истории.
+--
+-- Применить: psql "$DATABASE_URL" -f migrations/001_latest_attempts.sql
+-- (или вставить в SQL Editor Supabase)
+
+-- Индекс под DISTINCT ON (phrase_id) ... ORDER BY created_at DESC для одного пользователя
+create index if not exists user_attempts_user_phrase_created_idx
+    on user_attempts (user_id, phrase_id, created_at desc);
+
+-- Последняя попытка для каждой пары (пользователь, фраза)
+create or replace view latest_user_attempts as
+select distinct on (user_id, phrase_id)
+    user_id, phrase_id, ai_score, created_at
+from user_attempts
+order by user_id, phrase_id, created_at desc;
+
+-- Фразы, последняя попытка по которым ниже порога, от самой свежей ошибки к старой
+create or replace function failing_phrase_ids(
+    p_user_id user_attempts.user_id%type,
+    p_threshold integer default 90,
+    p_limit integer default 1000,
+    p_offset integer default 0
+)
+returns table (phrase_id user_attempts.phrase_id%type, ai_score user_attempts.ai_score%type)
+language sql stable
+as $$
+    select l.phrase_id, l.ai_score
+    from (
+        select distinct on (a.phrase_id) a.phrase_id, a.ai_score, a.created_at
+        from user_attempts a
+        where a.user_id = p_user_id
+        order by a.phrase_id, a.created_at desc
+    ) l
+    where l.ai_score < p_threshold
+    order by l.created_at desc, l.phrase_id
+    limit p_limit offset p_offset;
+$$;
+
+-- Статистика для главной: число попыток, сумма баллов и число фраз с ошибкой
+create or replace function user_progress_stats(
+    p_user_id user_attempts.user_id%type,
+    p_threshold integer default 90
+)
+returns table (attempts_count bigint, score_sum bigint, failing_count bigint)
+language sql stable
+as $$
+    select
+        (select count(*) from user_attempts where user_id = p_user_id),
+        (select coalesce(sum(ai_score), 0) from user_attempts where user_id = p_user_id),
+        (select count(*) from (
+            select distinct on (phrase_id) ai_score
+            from user_attempts
+            where user_id = p_user_id
+            order by phrase_id, created_at desc
+        ) l where l.ai_score < p_threshold);
+$$;
@@ -0,0 +1,51 @@
+-- Проверка миграции 001 на локальном Postgres (ничего не оставляет после себя):
+--   psql "$LOCAL_DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/001_latest_attempts_check.sql
+begin;
+
+create schema fluent_check;
+set local search_path = fluent_check;
+
+create table user_attempts (
+    id bigserial primary key,
+    user_id uuid not null,
+    phrase_id bigint not null,
+    ai_score integer not null,
+    created_at timestamptz not null
+);
+
+\ir 001_latest_attempts.sql
+
+insert into user_attempts (user_id, phrase_id, ai_score, created_at) values
+    ('00000000-0000-0000-0000-000000000001', 1, 30,  '2025-01-01 10:00'),
+    ('00000000-0000-0000-0000-000000000001', 1, 95,  '2025-01-01 11:00'),  -- исправлена
+    ('00000000-0000-0000-0000-000000000001', 2, 100, '2025-01-01 10:00'),
+    ('00000000-0000-0000-0000-000000000001', 2, 50,  '2025-01-01 12:00'),  -- ошибка, свежая
+    ('00000000-0000-0000-0000-000000000001', 3, 10,  '2025-01-01 09:00'),  -- ошибка, старая
+    ('00000000-0000-0000-0000-000000000002', 4, 0,   '2025-01-01 09:00');  -- другой пользователь
+
+do $$
+declare
+    ids bigint[];
+    stats record;
+begin
+    select array_agg(phrase_id) into ids
+    from failing_phrase_ids('00000000-0000-0000-0000-000000000001');
+    if ids is distinct from array[2, 3]::bigint[] then
+        raise exception 'failing_phrase_ids: expected {2,3}, got %', ids;
+    end if;
+
+    select array_agg(phrase_id) into ids
+    from failing_phrase_ids('00000000-0000-0000-0000-000000000001', 90, 1, 1);
+    if ids is distinct from array[3]::bigint[] then
+        raise exception 'failing_phrase_ids limit/offset: expected {3}, got %', ids;
+    end if;
+
+    select * into stats from user_progress_stats('00000000-0000-0000-0000-000000000001');
+    if (stats.attempts_count, stats.score_sum, stats.failing_count) is distinct from (5::bigint, 285::bigint, 2::bigint) then
+        raise exception 'user_progress_stats: got %', stats;
+    end if;
+
+    raise notice 'migration 001: OK';
+end $$;
+
+rollback;
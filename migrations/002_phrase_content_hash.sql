@@ -0,0 +1,10 @@
+-- Отпечаток содержимого фразы для идемпотентного повторного импорта (app/importer.py).
+-- Хэш считает приложение: sha1 от нормализованных text_ru / text_en / text_uz.
+-- Старые фразы получают хэш при первом импорте в свою тему.
+--
+-- Применить: psql "$DATABASE_URL" -f migrations/002_phrase_content_hash.sql
+
+alter table phrases add column if not exists content_hash text;
+
+create index if not exists phrases_topic_content_hash_idx
+    on phrases (topic_id, content_hash);
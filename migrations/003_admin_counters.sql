@@ -0,0 +1,80 @@
+-- Счетчик фраз в теме и индексы под постраничные списки админки.
+-- Админка читает topics.phrase_count вместо выгрузки всех фраз;
+-- счетчик поддерживают триггеры на phrases (по одному обновлению темы на оператор,
+-- поэтому пакетный импорт не превращается в тысячи UPDATE).
+--
+-- Применить: psql "$DATABASE_URL" -f migrations/003_admin_counters.sql
+
+alter table topics add column if not exists phrase_count integer not null default 0;
+
+create or replace function phrases_count_on_insert() returns trigger
+language plpgsql as $$
+begin
+    update topics t set phrase_count = t.phrase_count + d.n
+    from (select topic_id, count(*) as n from new_rows group by topic_id) d
+    where t.id = d.topic_id;
+    return null;
+end $$;
+
+create or replace function phrases_count_on_delete() returns trigger
+language plpgsql as $$
+begin
+    update topics t set phrase_count = t.phrase_count - d.n
+    from (select topic_id, count(*) as n from old_rows group by topic_id) d
+    where t.id = d.topic_id;
+    return null;
+end $$;
+
+-- Фразу перенесли в другую тему
+create or replace function phrases_count_on_update() returns trigger
+language plpgsql as $$
+begin
+    update topics t set phrase_count = t.phrase_count + d.n
+    from (
+        select topic_id, sum(n) as n from (
+            select topic_id, 1 as n from new_rows
+            union all
+            select topic_id, -1 from old_rows
+        ) moves
+        group by topic_id
+        having sum(n) <> 0
+    ) d
+    where t.id = d.topic_id;
+    return null;
+end $$;
+
+drop trigger if exists phrases_count_insert on phrases;
+create trigger phrases_count_insert after insert on phrases
+    referencing new table as new_rows
+    for each statement execute function phrases_count_on_insert();
+
+drop trigger if exists phrases_count_delete on phrases;
+create trigger phrases_count_delete after delete on phrases
+    referencing old table as old_rows
+    for each statement execute function phrases_count_on_delete();
+
+drop trigger if exists phrases_count_update on phrases;
+create trigger phrases_count_update after update on phrases
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function phrases_count_on_update();
+
+-- Пересчет для уже существующих фраз
+update topics t set phrase_count = coalesce(
+    (select count(*) from phrases p where p.topic_id = t.id), 0
+);
+
+-- Keyset-пагинация: фразы темы по (order_index, id), пользователи по (created_at, id)
+create index if not exists phrases_topic_order_idx
+    on phrases (topic_id, order_index, id);
+create index if not exists profiles_created_at_id_idx
+    on profiles (created_at desc, id desc);
+
+-- Поиск по подстроке (ilike '%...%'); без pg_trgm поиск работает, но полным просмотром
+do $$
+begin
+    create extension if not exists pg_trgm;
+    create index if not exists topics_title_ru_trgm_idx on topics using gin (title_ru gin_trgm_ops);
+    create index if not exists profiles_email_trgm_idx on profiles using gin (email gin_trgm_ops);
+exception when others then
+    raise notice 'pg_trgm is unavailable, search indexes skipped: %', sqlerrm;
+end $$;
@@ -0,0 +1,52 @@
+-- Проверка миграции 003 на локальном Postgres (ничего не оставляет после себя):
+--   psql "$LOCAL_DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/003_admin_counters_check.sql
+begin;
+
+create schema fluent_check;
+set local search_path = fluent_check, public;
+
+create table topics (id bigserial primary key, title_ru text);
+create table phrases (
+    id bigserial primary key,
+    topic_id bigint references topics (id) on delete cascade,
+    order_index integer,
+    text_ru text
+);
+create table profiles (id uuid primary key, email text, created_at timestamptz default now());
+
+insert into topics (id, title_ru) values (1, 'Кафе'), (2, 'Аэропорт');
+insert into phrases (topic_id, order_index, text_ru) values (1, 1, 'a'), (1, 2, 'b');
+
+\ir 003_admin_counters.sql
+
+do $$
+declare
+    counts bigint[];
+begin
+    -- пересчет существующих фраз
+    select array_agg(phrase_count order by id) into counts from topics;
+    if counts is distinct from array[2, 0]::bigint[] then
+        raise exception 'backfill: expected {2,0}, got %', counts;
+    end if;
+
+    -- пакетная вставка, upsert, перенос и удаление
+    insert into phrases (topic_id, order_index, text_ru)
+    select 2, g, 'x' from generate_series(1, 5) g;
+    insert into phrases (id, topic_id, order_index, text_ru) values (1, 1, 1, 'a2'), (100, 2, 6, 'y')
+        on conflict (id) do update set text_ru = excluded.text_ru;
+    update phrases set topic_id = 2 where id = 2;
+    delete from phrases where topic_id = 2 and order_index = 1;
+
+    select array_agg(phrase_count order by id) into counts from topics;
+    if counts is distinct from array[1, 6]::bigint[] then
+        raise exception 'triggers: expected {1,6}, got %', counts;
+    end if;
+
+    if counts[2] <> (select count(*) from phrases where topic_id = 2) then
+        raise exception 'counter drifted from count(*)';
+    end if;
+
+    raise notice 'migration 003: OK';
+end $$;
+
+rollback;
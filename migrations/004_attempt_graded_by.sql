@@ -0,0 +1,10 @@
+-- Кто оценил попытку: 'llm' (модель) или 'local' (индекс принятых ответов
+-- или триаж, app/triage.py). bench/triage_replay.py сверяет триаж только
+-- с оценками модели; по тексту объяснения их не отличить.
+-- У старых попыток значение пустое: неизвестно, кто их оценил.
+--
+-- Применить до деплоя кода, который пишет graded_by:
+--   psql "$DATABASE_URL" -f migrations/004_attempt_graded_by.sql
+
+alter table user_attempts add column if not exists graded_by text
+    check (graded_by in ('llm', 'local'));
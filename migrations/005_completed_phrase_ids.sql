@@ -0,0 +1,23 @@
+-- Пройденные фразы темы для очереди тренировки (app/main.py, build_topic_queue).
+-- Выборка попыток без пагинации PostgREST обрезал до max-rows (1000 строк),
+-- и у активного пользователя пройденные фразы возвращались в очередь.
+-- Функция отдает массив одним значением: id различны и только из этой темы,
+-- а max-rows на скалярный результат не действует.
+--
+-- Применить: psql "$DATABASE_URL" -f migrations/005_completed_phrase_ids.sql
+
+create or replace function completed_phrase_ids(
+    p_user_id user_attempts.user_id%type,
+    p_topic_id phrases.topic_id%type,
+    p_min_score integer default 40
+)
+returns bigint[]
+language sql stable
+as $$
+    select coalesce(array_agg(distinct a.phrase_id), '{}')
+    from user_attempts a
+    join phrases p on p.id = a.phrase_id
+    where a.user_id = p_user_id
+      and p.topic_id = p_topic_id
+      and a.ai_score > p_min_score;
+$$;
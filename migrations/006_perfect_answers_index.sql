@@ -0,0 +1,14 @@
+-- Индекс под загрузку индекса принятых ответов (app/answer_index.py,
+-- repository.list_perfect_answers): ответы на 100 баллов по фразе и направлению.
+-- Индекс из миграции 001 начинается с user_id и этот запрос не покрывает,
+-- а он идет на /check при каждом промахе кэша в каждом воркере.
+-- Частичный: в нем только строки с ai_score = 100, поэтому он небольшой.
+--
+-- concurrently не блокирует запись попыток, но не работает внутри транзакции:
+-- применять отдельной командой (не в SQL Editor вместе с другими запросами)
+--   psql "$DATABASE_URL" -f migrations/006_perfect_answers_index.sql
+
+create index concurrently if not exists user_attempts_perfect_answers_idx
+    on user_attempts (phrase_id, direction)
+    include (user_translation)
+    where ai_score = 100;